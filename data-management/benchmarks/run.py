@@ -0,0 +1,264 @@
+# run.py
+"""
+Benchmarks for the fetch, parse and time-series paths.
+
+Everything runs offline: parsing benchmarks use the bundled fixtures, and
+every request goes to a local `stand_in.StandIn` serving a synthetic league
+(with `--latency` seconds added to each response). The client's rate limiter
+is lifted for the stand-in, so the fetch benchmarks measure our own overhead.
+
+    cd benchmarks
+    python run.py --save                # record baseline.json
+    python run.py                       # compare against it
+    python run.py --latency 0.02 --only fetch series
+
+Each benchmark reports the median time of `--repeat` runs (after one warm-up
+run). When comparing, a benchmark that is more than `--threshold` (a fraction,
+default 0.25) slower than its baseline counts as a regression, and the script
+exits with status 1.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+# time_series and format_data find the data-collection modules relative to the
+# working directory, as they do in the notebooks
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(HERE, '..', 'data-extraction'), os.path.join(HERE, '..', 'data-collection')]
+os.chdir(os.path.join(HERE, '..', 'data-extraction'))
+import time_series
+from events import parseEvents
+from format_data import parseBoxScorePlayers
+from schedule_table import GameTable
+from api_client import getClient
+from json_decode import decode, loads
+from nhlAPI import getSchedule
+from rate_limit import RateLimiter
+os.chdir(HERE)
+from stand_in import StandIn, FIXTURES
+
+
+BENCHMARKS = {}
+
+
+def benchmark(name, unit):
+    """
+    Registers a benchmark. The decorated function takes the `Context` and
+    returns a function that runs the benchmark once and returns the number of
+    items (`unit`s) it processed.
+    """
+    def register(setup):
+        BENCHMARKS[name] = (setup, unit)
+        return setup
+    return register
+
+
+class Context:
+    """
+    Shared inputs of the benchmarks: the stand-in API and the fixtures.
+    """
+
+    def __init__(self, api):
+        self.api = api
+        self.base_url = api.base_url
+        self.season = api.season
+        with open(os.path.join(FIXTURES, 'liveData.json'), 'rb') as f:
+            self.raw_live_data = f.read()
+        self.live_data = json.loads(self.raw_live_data)
+        self.game_pks = sorted(api.games)
+
+
+@benchmark('decode.live_data', 'bytes')
+def _decodeLiveData(context):
+    def run():
+        loads(context.raw_live_data)
+        return len(context.raw_live_data)
+    return run
+
+
+@benchmark('decode.all_plays', 'bytes')
+def _decodeAllPlays(context):
+    def run():
+        decode(context.raw_live_data, 'plays.allPlays')
+        return len(context.raw_live_data)
+    return run
+
+
+@benchmark('parse.events', 'events')
+def _parseEvents(context):
+    return lambda: len(parseEvents(context.live_data))
+
+
+@benchmark('parse.boxscore_players', 'players')
+def _parseBoxScorePlayers(context):
+    def run():
+        skaters, goalies = parseBoxScorePlayers(0, context.live_data['boxscore'])
+        return len(skaters) + len(goalies)
+    return run
+
+
+@benchmark('parse.schedule_table', 'games')
+def _parseScheduleTable(context):
+    return lambda: len(GameTable.fromSchedule(context.api.dates))
+
+
+@benchmark('fetch.schedule', 'requests')
+def _fetchSchedule(context):
+    def run():
+        getSchedule(1, season=context.season, base_url=context.base_url)
+        return 1
+    return run
+
+
+@benchmark('fetch.boxscores', 'requests')
+def _fetchBoxScores(context):
+    endpoints = [f'/game/{game_pk}/boxscore' for game_pk in context.game_pks[:256]]
+    client = getClient(context.base_url)
+    return lambda: len(client.get_many(endpoints, max_workers=16))
+
+
+@benchmark('series.team', 'teams')
+def _teamSeries(context):
+    def run():
+        time_series.goalDiff(1, season=context.season, base_url=context.base_url)
+        return 1
+    return run
+
+
+@benchmark('series.league_per_team', 'teams')
+def _leaguePerTeam(context):
+    def run():
+        for team_id in range(1, context.api.n_teams + 1):
+            time_series.goalDiff(team_id, season=context.season, base_url=context.base_url)
+        return context.api.n_teams
+    return run
+
+
+@benchmark('series.league', 'teams')
+def _leagueSeries(context):
+    def run():
+        series = time_series.LeagueSeries(season=context.season, base_url=context.base_url)
+        return len(series.team_ids)
+    return run
+
+
+@benchmark('boxscores.team', 'teams')
+def _teamBoxScores(context):
+    def run():
+        time_series.getTeamBoxScores(1, season=context.season, base_url=context.base_url,
+                                     bulk=True, max_workers=16)
+        return 1
+    return run
+
+
+@benchmark('boxscores.league', 'teams')
+def _leagueBoxScores(context):
+    def run():
+        team_ids, *_ = time_series.getLeagueBoxScores(season=context.season,
+                                                      base_url=context.base_url,
+                                                      max_workers=16)
+        return len(team_ids)
+    return run
+
+
+def runBenchmarks(names=None, repeat=5, latency=0.0, n_teams=32):
+    """
+    Runs the benchmarks whose names start with any of `names` (all if None).
+
+    Returns
+    -------
+        results : dict
+            Run information and, under 'results', each benchmark's median
+            seconds, items per run and items per second.
+    """
+    results = {}
+    with StandIn(n_teams=n_teams, latency=latency) as api:
+        client = getClient(api.base_url)
+        client.limiter = RateLimiter(rate=1e6, max_rate=1e6)
+        context = Context(api)
+
+        for name, (setup, unit) in BENCHMARKS.items():
+            if names and not any(name.startswith(prefix) for prefix in names):
+                continue
+            run = setup(context)
+            items = run()
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                items = run()
+                times.append(time.perf_counter() - start)
+            seconds = statistics.median(times)
+            results[name] = {'seconds': seconds, 'items': items, 'unit': unit,
+                             'per_second': items / seconds if seconds else None}
+            print(f'{name:28s} {seconds * 1e3:10.3f} ms   {items / seconds:14,.1f} {unit}/s')
+
+        client.close()
+
+    return {'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'machine': platform.node(), 'python': platform.python_version(),
+            'params': {'repeat': repeat, 'latency': latency, 'n_teams': n_teams},
+            'results': results}
+
+
+def compare(results, baseline, threshold=0.25):
+    """
+    Compares `results` to `baseline` (both as returned by `runBenchmarks`).
+
+    Returns
+    -------
+        regressions : list(str)
+            Benchmarks more than `threshold` slower than their baseline. Runs
+            with different parameters (latency, etc.) are not compared.
+    """
+    if baseline.get('params') != results['params']:
+        print(f'not comparing: baseline was run with {baseline.get("params")}')
+        return []
+
+    regressions = []
+    for name, result in results['results'].items():
+        if name not in baseline['results']:
+            continue
+        ratio = result['seconds'] / baseline['results'][name]['seconds']
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f'{name:28s} {ratio:6.2f}x baseline{flag}')
+
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the benchmarks against a local stand-in API.')
+    parser.add_argument('--only', nargs='*', help='benchmark name prefixes to run')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds added to every stand-in response')
+    parser.add_argument('--teams', type=int, default=32)
+    parser.add_argument('--baseline', default='baseline.json')
+    parser.add_argument('--save', action='store_true', help='save the results as the baseline')
+    parser.add_argument('--output', help='also write the results to this file')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed slowdown (fraction) before a regression is reported')
+    args = parser.parse_args()
+
+    results = runBenchmarks(args.only, repeat=args.repeat, latency=args.latency,
+                            n_teams=args.teams)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
@@ -0,0 +1,296 @@
+# stand_in.py
+"""
+Local stand-in for the NHL API, serving a synthetic league built from the
+bundled fixtures (data-extraction/liveData.json and gameData.json).
+
+Serves /seasons/current, /teams, /schedule (season, teamId, startDate/endDate
+and expand=schedule.linescore), /game/{id}/boxscore, /game/{id}/feed/live and
+/game/{id}/feed/live/diffPatch under /api/v1, with an optional fixed latency
+added to every response.
+
+    with StandIn(n_teams=32, latency=0.01) as api:
+        getLeagueSchedule(season='20192020', base_url=api.base_url)
+
+A game can also be replayed live (see `goLive`): its feed then holds the
+fixture's plays up to some point, and every diffPatch request releases the
+next few as a patch, until the game goes Final.
+"""
+import copy
+import datetime
+import json
+import os
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from nhlAPI import _playTime
+
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data-extraction')
+
+_LIVE_STATUS = {'abstractGameState': 'Live', 'codedGameState': '3',
+                'detailedState': 'In Progress', 'statusCode': '3', 'startTimeTBD': False}
+
+
+def leagueSchedule(n_teams=32, games_per_team=82, season='20192020', seed=0, final_days=None):
+    """
+    Builds a synthetic regular season in the form of a schedule request's
+    'dates' list: one round-robin round per day, so every team plays on every
+    day (`games_per_team` days in all, with an odd team count leaving one team
+    idle per day).
+
+    Parameters
+    ----------
+        n_teams : int (default: 32)
+            Number of teams (ids 1 to n_teams).
+
+        games_per_team : int (default: 82)
+            Number of days (rounds) in the season.
+
+        season : str (default: '20192020')
+            Season id the games are labelled with.
+
+        seed : int (default: 0)
+            Seed for the scores.
+
+        final_days : int (default: None)
+            Number of days already played; later games are 'Scheduled'. If None,
+            every game is Final.
+    """
+    rng = np.random.default_rng(seed)
+    start = datetime.date(int(season[:4]), 10, 1)
+    teams = list(range(1, n_teams + 1)) + ([None] if n_teams % 2 else [])
+    final_days = games_per_team if final_days is None else final_days
+
+    dates, game_pk = [], int(season[:4]) * 1000000 + 20000
+    for day in range(games_per_team):
+        # circle method: rotate every team but the first
+        rotation = day % (len(teams) - 1)
+        order = [teams[0]] + teams[1:][rotation:] + teams[1:][:rotation]
+        games = []
+        for i in range(len(order) // 2):
+            home, away = order[i], order[-1 - i]
+            if home is None or away is None:
+                continue
+            if day % 2:
+                home, away = away, home
+            game_pk += 1
+            final = day < final_days
+            state = 'Final' if final else 'Scheduled'
+            scores = rng.integers(0, 7, size=2) if final else (0, 0)
+            games.append({
+                'gamePk': game_pk,
+                'gameType': 'R',
+                'season': season,
+                'gameDate': f'{start + datetime.timedelta(days=day)}T23:00:00Z',
+                'status': {'abstractGameState': 'Final' if final else 'Preview',
+                           'detailedState': state},
+                'teams': {'home': {'team': {'id': home, 'name': f'Team {home}'},
+                                   'score': int(scores[0])},
+                          'away': {'team': {'id': away, 'name': f'Team {away}'},
+                                   'score': int(scores[1])}},
+            })
+        dates.append({'date': str(start + datetime.timedelta(days=day)), 'games': games})
+
+    return dates
+
+
+class StandIn:
+    """
+    Threaded HTTP server playing the NHL API for a synthetic league.
+
+    Parameters
+    ----------
+        n_teams, games_per_team, season, seed, final_days
+            See `leagueSchedule`.
+
+        latency : float (default: 0)
+            Seconds added to every response.
+
+    Attributes
+    ----------
+        base_url : str
+            Base url to pass to nhlAPI/time_series functions (set by `start`).
+
+        requests : int
+            Number of requests served.
+    """
+
+    def __init__(self, n_teams=32, games_per_team=82, season='20192020', seed=0,
+                 final_days=None, latency=0.0):
+        self.season = season
+        self.latency = latency
+        self.dates = leagueSchedule(n_teams, games_per_team, season, seed, final_days)
+        self.games = {game['gamePk']: game for date in self.dates for game in date['games']}
+        self.n_teams = n_teams
+        self.requests = 0
+        self.base_url = None
+
+        with open(os.path.join(FIXTURES, 'liveData.json')) as f:
+            self.live_data = json.load(f)
+        with open(os.path.join(FIXTURES, 'gameData.json')) as f:
+            self.game_data = json.load(f)
+
+        self.live = {}
+
+        self._server = None
+        self._lock = threading.Lock()
+
+    @lru_cache(maxsize=None)
+    def boxscore(self, game_pk):
+        """
+        Serialized boxscore of game `game_pk`: the fixture's boxscore with the
+        game's teams and goals filled in.
+        """
+        game = self.games[game_pk]
+        boxscore = copy.deepcopy(self.live_data['boxscore'])
+        for side in ('home', 'away'):
+            team = boxscore['teams'][side]
+            team['team']['id'] = game['teams'][side]['team']['id']
+            team['team']['name'] = game['teams'][side]['team']['name']
+            team['teamStats']['teamSkaterStats']['goals'] = game['teams'][side]['score']
+        return json.dumps(boxscore).encode()
+
+    def goLive(self, game_pk, played=0, step=50):
+        """
+        Replays game `game_pk` live: its feed holds the fixture's first `played`
+        plays, and each diffPatch request adds the next `step` plays, finishing
+        the game once every play is out.
+        """
+        with self._lock:
+            self.live[game_pk] = [played, step]
+
+    def feed(self, game_pk):
+        """
+        Serialized live feed of game `game_pk`, as far as it has been played.
+        """
+        plays = self.live_data['plays']['allPlays']
+        with self._lock:
+            played = self.live[game_pk][0] if game_pk in self.live else len(plays)
+        game_data, live_data = self.game_data, self.live_data
+        if played < len(plays):
+            game_data = dict(game_data, status=_LIVE_STATUS)
+            live_data = dict(live_data, plays=dict(live_data['plays'], allPlays=plays[:played]))
+        return json.dumps({'gamePk': game_pk, 'gameData': game_data, 'liveData': live_data,
+                           'metaData': {'timeStamp': _playTime(plays[max(played, 1) - 1])}}).encode()
+
+    def diffPatch(self, game_pk):
+        """
+        Serialized patches from the feed as last served to the next `step` plays
+        of a live game; an empty list once the game is Final.
+        """
+        plays = self.live_data['plays']['allPlays']
+        with self._lock:
+            if game_pk not in self.live or self.live[game_pk][0] >= len(plays):
+                return b'[]'
+            played, step = self.live[game_pk]
+            self.live[game_pk][0] = min(len(plays), played + step)
+            new = plays[played:played + step]
+
+        diff = [{'op': 'add', 'path': '/liveData/plays/allPlays/-', 'value': play} for play in new]
+        diff.append({'op': 'replace', 'path': '/metaData/timeStamp',
+                     'value': _playTime(plays[played + len(new) - 1])})
+        if played + len(new) >= len(plays):
+            diff.append({'op': 'replace', 'path': '/gameData/status',
+                         'value': self.game_data['status']})
+        return json.dumps([{'diff': diff}]).encode()
+
+    def schedule(self, query):
+        teams = {int(team) for team in query['teamId'].split(',')} if 'teamId' in query else None
+        linescore = 'schedule.linescore' in query.get('expand', '')
+
+        dates = []
+        for date in self.dates:
+            if 'startDate' in query and not query['startDate'] <= date['date'] <= query['endDate']:
+                continue
+            games = []
+            for game in date['games']:
+                ids = {game['teams'][side]['team']['id'] for side in ('home', 'away')}
+                if teams is not None and not ids & teams:
+                    continue
+                if linescore:
+                    game = dict(game, linescore={'teams': {
+                        side: {'team': game['teams'][side]['team'],
+                               'goals': game['teams'][side]['score'], 'shotsOnGoal': 30}
+                        for side in ('home', 'away')}})
+                games.append(game)
+            if games:
+                dates.append({'date': date['date'], 'games': games})
+
+        return json.dumps({'totalGames': sum(len(date['games']) for date in dates),
+                           'dates': dates}).encode()
+
+    def respond(self, path, query):
+        """
+        Returns (status, body) for a request of `path` (relative to /api/v1).
+        """
+        if path == '/seasons/current':
+            return 200, json.dumps({'seasons': [{'seasonId': self.season}]}).encode()
+        if path == '/teams':
+            return 200, json.dumps({'teams': [{'id': i, 'name': f'Team {i}', 'active': True}
+                                              for i in range(1, self.n_teams + 1)]}).encode()
+        if path == '/schedule':
+            return 200, self.schedule(query)
+
+        parts = path.strip('/').split('/')
+        if parts[0] == 'game' and len(parts) >= 3 and parts[1].isdigit() \
+                and int(parts[1]) in self.games:
+            if parts[2:] == ['boxscore']:
+                return 200, self.boxscore(int(parts[1]))
+            if parts[2:] == ['feed', 'live']:
+                return 200, self.feed(int(parts[1]))
+            if parts[2:] == ['feed', 'live', 'diffPatch']:
+                return 200, self.diffPatch(int(parts[1]))
+
+        return 404, json.dumps({'messageNumber': 10, 'message': 'Object not found'}).encode()
+
+    def start(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep connections open, as the real API does
+            protocol_version = 'HTTP/1.1'
+            # headers and body go out in separate writes; with Nagle's algorithm
+            # the body waits for the client's delayed ack (~40 ms per request)
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                path = url.path[len('/api/v1'):] if url.path.startswith('/api/v1') else url.path
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                status, body = stand_in.respond(path, query)
+                with stand_in._lock:
+                    stand_in.requests += 1
+                if stand_in.latency:
+                    time.sleep(stand_in.latency)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self._server.server_address[1]}/api/v1'
+        return self.base_url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
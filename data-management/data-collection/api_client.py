@@ -0,0 +1,290 @@
+# api_client.py
+import asyncio
+import atexit
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import metrics
+from json_decode import extract, loads
+from rate_limit import RateLimiter
+from response_cache import ResponseCache, isImmutable
+from transport import HTTPTransport, RecordingTransport, ReplayTransport
+
+
+BASE_URL = 'https://statsapi.web.nhl.com/api/v1'
+
+
+class NHLClient:
+    """
+    Connection-pooled client for the NHL API.
+
+    A single transport (by default a `requests.Session`) is shared by every
+    request made through the client, so repeated calls reuse open TCP/TLS
+    connections instead of negotiating a new one per call. Batches of
+    requests can be made either with a thread pool (`get_many`) or from an
+    asyncio event loop (`aget`, `aget_many`); both run on top of the same
+    transport.
+
+    Parameters
+    ----------
+        base_url : str (default: 'https://statsapi.web.nhl.com/api/v1')
+            Base url to the NHL API.
+
+        pool_size : int (default: 32)
+            Maximum number of connections kept open to the API host.
+
+        max_workers : int (default: 16)
+            Number of worker threads used by `get_many` and the asyncio API.
+
+        timeout : float (default: 30)
+            Seconds to wait for the API before giving up on a request.
+
+        cache : ResponseCache (default: None)
+            If given, responses are served from/stored in this on-disk cache.
+
+        limiter : RateLimiter (default: None)
+            Paces and retries every request sent to the API (cache hits are not
+            limited). If None, a new `RateLimiter()` with default settings is
+            used, or one that never waits when the transport is local.
+
+        transport : transport (default: None)
+            Sends the requests (see the transport module), e.g. a
+            `ReplayTransport` to serve them from a recorded archive. If None,
+            an `HTTPTransport` with `pool_size` connections is used.
+    """
+
+    def __init__(self, base_url=BASE_URL, pool_size=32, max_workers=16, timeout=30,
+                 cache=None, limiter=None, transport=None):
+        self.base_url = base_url
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.cache = cache
+        self.transport = transport if transport is not None else HTTPTransport(pool_size)
+        if limiter is None:
+            limiter = RateLimiter(rate=1e9, max_rate=1e9) if self.transport.local else RateLimiter()
+        self.limiter = limiter
+
+        self._lock = threading.RLock()
+        self._executor = None
+        self._current_season = None
+
+    def url(self, endpoint, params=None):
+        """
+        Builds the full url for `endpoint`, appending `params` (if any) as a
+        query string with its keys in sorted order.
+        """
+        if params:
+            sep = '&' if '?' in endpoint else '?'
+            endpoint += sep + urlencode(sorted(params.items()))
+        return self.base_url + endpoint
+
+    def get(self, endpoint, params=None, immutable=None, path=None, raw=False):
+        """
+        Requests `endpoint` (e.g. '/teams/10/roster') and returns the decoded json.
+
+        Parameters
+        ----------
+            endpoint : str
+                Path (and optionally query string) relative to `base_url`.
+
+            params : dict (default: None)
+                Additional query parameters.
+
+            immutable : bool (default: None)
+                Whether the response can never change (e.g. the game is known to
+                be Final) and so can be cached forever. If None, this is decided
+                by `response_cache.isImmutable`. Ignored when there is no cache.
+
+            path : str, tuple or list (default: None)
+                Return only this part of the response (e.g. 'stats.0.splits'), or
+                a list of parts for a list of paths; see `json_decode.decode`.
+                Raises KeyError if the response does not have it.
+
+            raw : bool (default: False)
+                Return the undecoded response body (bytes) instead.
+
+        Returns
+        -------
+            data : dict (json-like)
+                Decoded response body (or the part of it at `path`).
+        """
+        url = self.url(endpoint, params)
+        endpoint = url[len(self.base_url):]
+
+        body = None
+        if self.cache is not None:
+            body = self.cache.get(endpoint, raw=True)
+            if body is not None and metrics.ENABLED:
+                metrics.REGISTRY.cacheHit(endpoint)
+
+        data = None
+        if body is None:
+            response = self._send(url, endpoint)
+            body = response.content
+
+            # only successful responses are cached; error messages are not data.
+            # The body is cached as it came, without being encoded again
+            if self.cache is not None and response.ok:
+                if immutable is None:
+                    if not raw:
+                        data = self._decode(body, endpoint)
+                    immutable = isImmutable(endpoint, body if data is None else data,
+                                            self.current_season)
+                self.cache.put(endpoint, body, immutable=immutable)
+
+        if raw:
+            return body
+        if data is None:
+            data = self._decode(body, endpoint)
+        if path is None:
+            return data
+        if isinstance(path, list):
+            return [extract(data, p) for p in path]
+        return extract(data, path)
+
+    def _decode(self, body, endpoint):
+        if not metrics.ENABLED:
+            return loads(body)
+        start = time.perf_counter()
+        data = loads(body)
+        metrics.REGISTRY.decode(endpoint, time.perf_counter() - start)
+        return data
+
+    def _send(self, url, endpoint):
+        # every request to the API goes through the rate limiter
+        return self.limiter.request(lambda: self.transport.get(url, timeout=self.timeout),
+                                    endpoint)
+
+    def get_many(self, endpoints, max_workers=None, immutable=None, path=None, raw=False):
+        """
+        Requests every endpoint in `endpoints` concurrently using a thread pool.
+
+        Parameters
+        ----------
+            endpoints : iterable(str)
+                Endpoints to request; see `get`.
+
+            max_workers : int (default: None)
+                Overrides the client's pool size for this batch.
+
+            immutable, path, raw
+                Passed on to `get` for every endpoint. A response without `path`
+                (e.g. the API's error message for a missing game) comes back as
+                an empty dictionary, so one missing game does not fail the batch.
+
+        Returns
+        -------
+            data : list(dicts)
+                Decoded responses, in the same order as `endpoints`.
+        """
+        endpoints = list(endpoints)
+
+        def get(endpoint):
+            try:
+                return self.get(endpoint, immutable=immutable, path=path, raw=raw)
+            except KeyError:
+                if path is None:
+                    raise
+                return {}
+
+        if max_workers is None:
+            return list(self._pool().map(get, endpoints))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(get, endpoints))
+
+    async def aget(self, endpoint, params=None):
+        """
+        Asyncio version of `get`. The request is run on the client's worker
+        threads, so many `aget` calls can be awaited concurrently from a single
+        event loop while still sharing the connection pool.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool(), self.get, endpoint, params)
+
+    async def aget_many(self, endpoints):
+        """
+        Asyncio version of `get_many`; results are in the same order as `endpoints`.
+        """
+        return await asyncio.gather(*(self.aget(endpoint) for endpoint in endpoints))
+
+    def current_season(self, refresh=False):
+        """
+        Returns the current season id ('YYYYYYYY'). The result of the
+        `/seasons/current` request is remembered, so it is made at most once per
+        client unless `refresh` is True.
+        """
+        with self._lock:
+            if self._current_season is None or refresh:
+                seasons = self.get('/seasons/current')['seasons']
+                self._current_season = seasons[0]['seasonId']
+            return self._current_season
+
+    def close(self):
+        """
+        Shuts down the worker threads and closes the transport (and with it all
+        pooled connections).
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+        self.transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _pool(self):
+        # the executor is created lazily so that clients that are only used
+        # serially never start any threads
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def getClient(base_url=BASE_URL):
+    """
+    Returns the shared `NHLClient` for `base_url`, creating it on first use.
+
+    Every function in nhlAPI goes through this, so all of them share one
+    connection pool (per base url) and one cached current-season lookup.
+
+    If the environment variable NHL_API_CACHE is set, new clients use an
+    on-disk `ResponseCache` in that directory; setting NHL_API_OFFLINE=1 as
+    well serves everything from that cache without touching the network.
+    A cache can also be attached directly, e.g.
+
+        getClient().cache = ResponseCache('~/.cache/nhl')
+
+    Setting NHL_API_RECORD to a path appends every response to that archive;
+    setting NHL_API_REPLAY instead serves every request from that archive
+    (with NHL_API_REPLAY_LATENCY seconds added to each), see the transport
+    module.
+    """
+    with _clients_lock:
+        if base_url not in _clients:
+            cache = None
+            if os.environ.get('NHL_API_CACHE'):
+                offline = os.environ.get('NHL_API_OFFLINE', '') not in ('', '0')
+                cache = ResponseCache(os.environ['NHL_API_CACHE'], offline=offline)
+            transport = None
+            if os.environ.get('NHL_API_REPLAY'):
+                latency = float(os.environ.get('NHL_API_REPLAY_LATENCY') or 0)
+                transport = ReplayTransport(os.environ['NHL_API_REPLAY'], latency=latency)
+            elif os.environ.get('NHL_API_RECORD'):
+                transport = RecordingTransport(os.environ['NHL_API_RECORD'])
+                # shared clients are never closed, so finish the archive at exit
+                atexit.register(transport.flush)
+            _clients[base_url] = NHLClient(base_url, cache=cache, transport=transport)
+        return _clients[base_url]
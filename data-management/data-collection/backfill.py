@@ -0,0 +1,324 @@
+# backfill.py
+"""
+Resumable, parallel crawl that (re)builds the data/ tree:
+
+    <dst>/basic/<season>/       player_ids, team_ids, player_id_to_name,
+                                player_name_to_id, player_id_to_team,
+                                team_id_to_name, team_name_to_id,
+                                team_id_to_players
+    <dst>/stats/<season>/SingleSeason/
+                                skater_stats, goalie_stats
+
+for every season in a range, with seasons named 'YYYY-YYYY'. Each season is
+crawled with `getTeamIDs(active=False)`, `getTeamRoster(season=...)` and
+`getPlayerStats(season=...)`, with the roster and player requests of a season
+spread over a bounded thread pool (and paced by the client's rate limiter).
+
+Progress is journaled under <dst>/.backfill/: every roster and player result
+is appended to <season>.jsonl as it arrives, and a season is recorded in
+journal.jsonl once all of its files have been written. A killed run therefore
+resumes where it stopped, only requesting what it has not seen yet. Seasons
+whose files are all present and hold data for the right season are skipped;
+a season journaled as done is crawled again if its files have since gone
+missing or bad. Every file is written atomically.
+
+    python backfill.py 1980 2019 --dst data --workers 16
+"""
+import argparse
+import json
+import os
+import pickle
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from nhlAPI import getPlayerStats, getTeamIDs, getTeamRoster
+
+
+BASIC_FILES = ('player_ids', 'team_ids', 'player_id_to_name', 'player_name_to_id',
+               'player_id_to_team', 'team_id_to_name', 'team_name_to_id',
+               'team_id_to_players')
+STATS_FILES = ('skater_stats', 'goalie_stats')
+
+
+def seasonName(start_year):
+    # 1980 -> '1980-1981'
+    return f'{start_year}-{start_year + 1}'
+
+
+def _seasonId(name):
+    # '1980-1981' -> '19801981'
+    return name.replace('-', '')
+
+
+def _atomicPickle(obj, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as f:
+        pickle.dump(obj, f)
+    os.replace(tmp, path)
+
+
+class Journal:
+    """
+    Append-only record of a backfill's progress (see the module docstring).
+    """
+
+    def __init__(self, dst):
+        self.path = os.path.join(dst, '.backfill')
+        os.makedirs(self.path, exist_ok=True)
+
+    def _append(self, filename, record):
+        line = json.dumps(record) + '\n'
+        with open(os.path.join(self.path, filename), 'a+b') as f:
+            # start on a new line after a line cut short by a killed run
+            if f.seek(0, os.SEEK_END):
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    line = '\n' + line
+            f.write(line.encode())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _read(self, filename):
+        records = []
+        try:
+            with open(os.path.join(self.path, filename)) as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # a line cut short by a killed run
+                        continue
+        except FileNotFoundError:
+            pass
+        return records
+
+    def done(self):
+        """
+        Returns the set of seasons journaled as complete.
+        """
+        return {record['season'] for record in self._read('journal.jsonl')}
+
+    def finish(self, season, **info):
+        self._append('journal.jsonl', dict(info, season=season, time=time.time()))
+        try:
+            os.remove(os.path.join(self.path, f'{season}.jsonl'))
+        except FileNotFoundError:
+            pass
+
+    def record(self, season, kind, key, value):
+        self._append(f'{season}.jsonl', {'kind': kind, 'key': key, 'value': value})
+
+    def partial(self, season):
+        """
+        Returns the roster and player results already fetched for `season`, as
+        {'roster': {team_id: roster}, 'stats': {player_id: splits}}.
+        """
+        results = {'roster': {}, 'stats': {}}
+        for record in self._read(f'{season}.jsonl'):
+            results[record['kind']][record['key']] = record['value']
+        return results
+
+
+def isComplete(dst, season):
+    """
+    Checks that every file of `season` exists, can be loaded, and that the
+    stats tables hold data for that season.
+    """
+    season_id = _seasonId(season)
+    try:
+        for name in BASIC_FILES:
+            with open(os.path.join(dst, 'basic', season, name), 'rb') as f:
+                pickle.load(f)
+        for name in STATS_FILES:
+            table = pd.read_pickle(os.path.join(dst, 'stats', season, 'SingleSeason', name))
+            if len(table) and not (table['season'].astype(str) == season_id).all():
+                return False
+    except Exception:
+        return False
+    return True
+
+
+def _fetch(pool, journal, season, kind, keys, request, results):
+    # requests every key not in `results` yet, journaling each result as it
+    # arrives; returns the number of failed requests
+    failed = 0
+    futures = {pool.submit(request, key): key for key in keys if key not in results}
+    for future in as_completed(futures):
+        key = futures[future]
+        try:
+            value = future.result()
+        except KeyError:
+            # e.g. a team that did not exist in this season
+            value = None
+        except Exception as error:
+            print(f'{season} {kind} {key} failed: {error!r}')
+            failed += 1
+            continue
+        results[key] = value
+        journal.record(season, kind, key, value)
+    return failed
+
+
+def crawlSeason(season, pool, journal, teams, base_url='https://statsapi.web.nhl.com/api/v1'):
+    """
+    Crawls one season and returns (basic, stats): dictionaries mapping each
+    file name of BASIC_FILES and STATS_FILES to its contents. If any request
+    failed (after the client's retries), returns None instead; the results that
+    did arrive stay in the journal for the next run.
+
+    Parameters
+    ----------
+        season : str ('YYYY-YYYY')
+            Season to crawl.
+
+        pool : ThreadPoolExecutor
+            Pool the requests are made on.
+
+        journal : Journal
+            Journal to record (and resume) results in.
+
+        teams : dict
+            {team_name: team_id} of every team to try (active or not).
+
+        base_url : str
+            URL to the NHL API base.
+    """
+    season_id = _seasonId(season)
+    partial = journal.partial(season)
+    # json object keys are strings
+    rosters = {int(key): value for key, value in partial['roster'].items()}
+    splits = {int(key): value for key, value in partial['stats'].items()}
+
+    if _fetch(pool, journal, season, 'roster', teams.values(),
+              lambda team_id: getTeamRoster(team_id, season=season_id, base_url=base_url),
+              rosters):
+        return None
+
+    basic = {name: {} for name in BASIC_FILES}
+    basic['player_ids'], basic['team_ids'] = [], []
+    goalies = set()
+    for team_name, team_id in teams.items():
+        roster = rosters.get(team_id)
+        if not roster:
+            continue
+        basic['team_ids'].append(team_id)
+        basic['team_id_to_name'][team_id] = team_name
+        basic['team_name_to_id'][team_name] = team_id
+        basic['team_id_to_players'][team_id] = []
+        for player in roster:
+            player_id = player['person']['id']
+            name = player['person']['fullName']
+            if player_id not in basic['player_id_to_name']:
+                basic['player_ids'].append(player_id)
+            basic['player_id_to_name'][player_id] = name
+            basic['player_name_to_id'][name] = player_id
+            basic['player_id_to_team'][player_id] = team_id
+            basic['team_id_to_players'][team_id].append(player_id)
+            if player['position']['code'] == 'G':
+                goalies.add(player_id)
+
+    if _fetch(pool, journal, season, 'stats', basic['player_ids'],
+              lambda player_id: getPlayerStats(player_id, season=season_id, base_url=base_url),
+              splits):
+        return None
+
+    rows = {'skater_stats': {}, 'goalie_stats': {}}
+    for player_id in basic['player_ids']:
+        if not splits.get(player_id):
+            # no recorded stats for the season
+            continue
+        split = splits[player_id][0]
+        kind = 'goalie_stats' if player_id in goalies else 'skater_stats'
+        rows[kind][player_id] = dict(split['stat'], season=split['season'])
+
+    stats = {}
+    for kind, table in rows.items():
+        frame = pd.DataFrame.from_dict(table, orient='index')
+        frame.index.name = 'player_id'
+        columns = sorted(frame.columns.drop('season', errors='ignore'))
+        stats[kind] = frame.reindex(columns=['season'] + columns)
+
+    return basic, stats
+
+
+def backfill(first, last, dst='data', max_workers=16, force=False,
+             base_url='https://statsapi.web.nhl.com/api/v1'):
+    """
+    Crawls the seasons `first`-(`first`+1) through `last`-(`last`+1) into `dst`.
+
+    Parameters
+    ----------
+        first, last : int
+            Starting years of the first and last seasons (inclusive).
+
+        dst : str (default: 'data')
+            Root of the data/ tree.
+
+        max_workers : int (default: 16)
+            Number of requests in flight at once.
+
+        force : bool (default: False)
+            If True, re-crawl seasons that are already complete.
+
+        base_url : str
+            URL to the NHL API base.
+
+    Returns
+    -------
+        crawled : list(str)
+            Seasons that were crawled completely (rather than skipped or left
+            incomplete).
+    """
+    journal = Journal(dst)
+    teams = None
+    crawled = []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for year in range(first, last + 1):
+            season = seasonName(year)
+            # the journal only resumes partial work; the files are what count
+            if not force and isComplete(dst, season):
+                continue
+
+            if teams is None:
+                teams = getTeamIDs(base_url=base_url, active=False)
+
+            start = time.perf_counter()
+            result = crawlSeason(season, pool, journal, teams, base_url=base_url)
+            if result is None:
+                print(f'{season}: incomplete, rerun to resume')
+                continue
+            basic, stats = result
+
+            for name, obj in basic.items():
+                _atomicPickle(obj, os.path.join(dst, 'basic', season, name))
+            for name, frame in stats.items():
+                _atomicPickle(frame, os.path.join(dst, 'stats', season, 'SingleSeason', name))
+
+            journal.finish(season, teams=len(basic['team_ids']),
+                           players=len(basic['player_ids']))
+            crawled.append(season)
+            print(f'{season}: {len(basic["team_ids"])} teams, {len(basic["player_ids"])} '
+                  f'players ({time.perf_counter() - start:.1f}s)')
+
+    return crawled
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Crawl the NHL API into the data/basic and data/stats trees.')
+    parser.add_argument('first', type=int, help='starting year of the first season')
+    parser.add_argument('last', type=int, help='starting year of the last season')
+    parser.add_argument('--dst', default='data')
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--force', action='store_true',
+                        help='re-crawl seasons that are already complete')
+    parser.add_argument('--base-url', default='https://statsapi.web.nhl.com/api/v1')
+    args = parser.parse_args()
+
+    backfill(args.first, args.last, dst=args.dst, max_workers=args.workers,
+             force=args.force, base_url=args.base_url)
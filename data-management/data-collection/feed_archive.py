@@ -0,0 +1,436 @@
+# feed_archive.py
+"""
+Append-only archive of compressed game feeds (the /game/{id}/feed/live
+responses, i.e. 'gameData', 'liveData' and 'metaData'), with random access
+by gamePk.
+
+Layout:
+
+    header      b'NHLFEED1', codec (1 byte: 0 = zlib, 1 = zstd),
+                dictionary length (uint32), dictionary
+    blocks      per game: b'BLK1', gamePk (int64), compressed length (uint32),
+                raw length (uint32), crc32 of the compressed feed (uint32),
+                compressed feed
+    index       per game: gamePk, block offset, compressed length, raw length
+                (int64 each)
+    footer      index offset (uint64), number of games (uint64), b'NHLFEEDX'
+
+Each feed is compressed on its own (with zstd when the zstandard package is
+installed, zlib otherwise), optionally against a dictionary trained on sample
+feeds (see `trainDictionary`), so any game can be read without touching the
+others. Readers memory-map the file and look games up in the index at the
+tail. Appending truncates the index, writes new blocks and writes a new index;
+an archive left without a valid footer by an interrupted append is repaired
+from the block headers the next time it is opened for writing, keeping the
+blocks up to the first one whose marker or checksum does not match (a torn
+block, or the index of an interrupted `close`).
+
+    with FeedWriter('20192020.feeds') as writer:
+        writer.add(2019020970, feed)
+
+    archive = FeedArchive('20192020.feeds')
+    plays = archive.get(2019020970, 'liveData.plays.allPlays')
+    for game_pk, feed in archive.iterFeeds(max_workers=8):
+        ...
+
+Archives listed in the NHL_FEED_ARCHIVES environment variable (separated by
+os.pathsep) or registered with `addArchive` are used by nhlAPI.getGameFeed
+and LiveFeed instead of the network for every game they contain.
+
+    python feed_archive.py build 20192020.feeds --season 20192020
+    python feed_archive.py info 20192020.feeds
+"""
+import argparse
+import mmap
+import os
+import struct
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from json_decode import decode, dumps
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+MAGIC = b'NHLFEED1'
+BLOCK_MAGIC = b'BLK1'
+FOOTER_MAGIC = b'NHLFEEDX'
+ZLIB, ZSTD = 0, 1
+
+_HEADER = struct.Struct('<8sBI')
+_BLOCK = struct.Struct('<4sqIII')
+_FOOTER = struct.Struct('<QQ8s')
+_INDEX = np.dtype([('game_pk', '<i8'), ('offset', '<i8'), ('length', '<i8'),
+                   ('raw_length', '<i8')])
+
+# zlib only uses the last 32 KB of a preset dictionary
+_ZLIB_WINDOW = 32 * 1024
+
+
+def trainDictionary(samples, size=112640):
+    """
+    Builds a compression dictionary from sample feeds (bytes); a few dozen
+    games are plenty. With zstd this is a trained dictionary of `size` bytes;
+    with zlib it is the last 32 KB of the samples, which zlib uses as a preset
+    window.
+    """
+    if zstandard is not None:
+        return zstandard.train_dictionary(size, list(samples)).as_bytes()
+    return b''.join(samples)[-_ZLIB_WINDOW:]
+
+
+class _Codec:
+    # compressors are not thread-safe, so each thread gets its own
+
+    def __init__(self, codec, dictionary, level):
+        self.codec = codec
+        self.dictionary = dictionary
+        self.level = level
+        self._local = threading.local()
+
+    def compress(self, data):
+        if self.codec == ZSTD:
+            compressor = getattr(self._local, 'compressor', None)
+            if compressor is None:
+                dictionary = zstandard.ZstdCompressionDict(self.dictionary) if self.dictionary else None
+                compressor = zstandard.ZstdCompressor(level=self.level or 9, dict_data=dictionary)
+                self._local.compressor = compressor
+            return compressor.compress(data)
+
+        if self.dictionary:
+            compressor = zlib.compressobj(self.level or 9, zdict=self.dictionary)
+            return compressor.compress(data) + compressor.flush()
+        return zlib.compress(data, self.level or 9)
+
+    def decompress(self, data, raw_length):
+        if self.codec == ZSTD:
+            decompressor = getattr(self._local, 'decompressor', None)
+            if decompressor is None:
+                dictionary = zstandard.ZstdCompressionDict(self.dictionary) if self.dictionary else None
+                decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+                self._local.decompressor = decompressor
+            return decompressor.decompress(data, max_output_size=raw_length)
+
+        if self.dictionary:
+            decompressor = zlib.decompressobj(zdict=self.dictionary)
+            return decompressor.decompress(data) + decompressor.flush()
+        return zlib.decompress(data, bufsize=raw_length)
+
+
+def _readHeader(buffer):
+    magic, codec, dict_length = _HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError('not a feed archive')
+    if codec == ZSTD and zstandard is None:
+        raise ValueError('archive is zstd-compressed but the zstandard package is not installed')
+    start = _HEADER.size
+    return codec, bytes(buffer[start:start + dict_length]), start + dict_length
+
+
+def _readIndex(buffer):
+    # returns the index array and where it starts, or None without a valid footer
+    if len(buffer) < _FOOTER.size:
+        return None
+    index_offset, n_games, magic = _FOOTER.unpack_from(buffer, len(buffer) - _FOOTER.size)
+    if magic != FOOTER_MAGIC or index_offset + n_games * _INDEX.itemsize + _FOOTER.size != len(buffer):
+        return None
+    return np.frombuffer(buffer, dtype=_INDEX, count=n_games, offset=index_offset), index_offset
+
+
+def _scanBlocks(buffer, start):
+    # rebuilds the index from the block headers, stopping at the first block
+    # that is cut short or is not a block at all
+    entries, offset = [], start
+    while offset + _BLOCK.size <= len(buffer):
+        magic, game_pk, length, raw_length, crc = _BLOCK.unpack_from(buffer, offset)
+        end = offset + _BLOCK.size + length
+        if (magic != BLOCK_MAGIC or end > len(buffer)
+                or zlib.crc32(buffer[offset + _BLOCK.size:end]) != crc):
+            break
+        entries.append((game_pk, offset, length, raw_length))
+        offset += _BLOCK.size + length
+    return np.array(entries, dtype=_INDEX), offset
+
+
+class FeedWriter:
+    """
+    Appends game feeds to an archive, creating it if needed.
+
+    Parameters
+    ----------
+        path : str
+            Archive file.
+
+        dictionary : bytes (default: None)
+            Compression dictionary (see `trainDictionary`) for a new archive;
+            an existing archive keeps its own.
+
+        codec : str (default: None)
+            'zstd' or 'zlib' for a new archive; zstd if it is installed.
+
+        level : int (default: None)
+            Compression level; 9 if None.
+
+    The index is written by `close` (or on leaving a `with` block). Adding a
+    game that is already in the archive replaces it.
+    """
+
+    def __init__(self, path, dictionary=None, codec=None, level=None):
+        self.path = path
+        self._lock = threading.Lock()
+
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                codec, dictionary, start = _readHeader(buffer)
+                found = _readIndex(buffer)
+                if found is None:
+                    index, end = _scanBlocks(buffer, start)
+                else:
+                    index, end = found
+                self._entries = {int(game_pk): (int(offset), int(length), int(raw_length))
+                                 for game_pk, offset, length, raw_length in index.tolist()}
+                # the index may be a view of the map, which cannot be closed while it exists
+                del index, found
+            self._file = open(path, 'r+b')
+            self._file.truncate(end)
+            self._file.seek(end)
+        else:
+            if codec is None:
+                codec = 'zstd' if zstandard is not None else 'zlib'
+            if codec not in ('zstd', 'zlib'):
+                raise ValueError(f'unknown codec {codec!r}')
+            if codec == 'zstd' and zstandard is None:
+                raise ValueError('the zstandard package is not installed')
+            codec = ZSTD if codec == 'zstd' else ZLIB
+            dictionary = dictionary or b''
+            self._entries = {}
+            self._file = open(path, 'wb')
+            self._file.write(_HEADER.pack(MAGIC, codec, len(dictionary)) + dictionary)
+
+        self._codec = _Codec(codec, dictionary, level)
+
+    def __contains__(self, game_pk):
+        return int(game_pk) in self._entries
+
+    def compress(self, feed):
+        """
+        Compresses a feed (json-like or bytes) for `addCompressed`; can be called
+        from many threads at once.
+        """
+        raw = feed if isinstance(feed, bytes) else dumps(feed)
+        return self._codec.compress(raw), len(raw)
+
+    def addCompressed(self, game_pk, data, raw_length):
+        with self._lock:
+            offset = self._file.tell()
+            self._file.write(_BLOCK.pack(BLOCK_MAGIC, int(game_pk), len(data), raw_length,
+                                         zlib.crc32(data)) + data)
+            self._entries[int(game_pk)] = (offset, len(data), raw_length)
+
+    def add(self, game_pk, feed):
+        """
+        Appends the feed (json-like or the response bytes) of game `game_pk`.
+        """
+        self.addCompressed(game_pk, *self.compress(feed))
+
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            index = np.array(sorted((game_pk,) + entry for game_pk, entry in self._entries.items()),
+                             dtype=_INDEX)
+            index_offset = self._file.tell()
+            self._file.write(index.tobytes())
+            self._file.write(_FOOTER.pack(index_offset, len(index), FOOTER_MAGIC))
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FeedArchive:
+    """
+    Read-only, memory-mapped view of an archive written by `FeedWriter`.
+
+    Parameters
+    ----------
+        path : str
+            Archive file.
+
+    Examples
+    --------
+        >>> archive = FeedArchive('20192020.feeds')
+        >>> 2019020970 in archive
+        >>> archive.get(2019020970, 'liveData.plays.allPlays')
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        codec, dictionary, _ = _readHeader(self._mmap)
+        found = _readIndex(self._mmap)
+        if found is None:
+            raise ValueError(f'{path} has no index (interrupted write?); '
+                             'open it with FeedWriter to repair it')
+        index, _ = found
+        self._codec = _Codec(codec, dictionary, None)
+        self.game_pks = index['game_pk'].copy()
+        self._index = {game_pk: (offset, length, raw_length)
+                       for game_pk, offset, length, raw_length in index.tolist()}
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, game_pk):
+        return int(game_pk) in self._index
+
+    def raw(self, game_pk):
+        """
+        Returns the feed of game `game_pk` as json bytes (KeyError if it is not
+        in the archive).
+        """
+        offset, length, raw_length = self._index[int(game_pk)]
+        start = offset + _BLOCK.size
+        return self._codec.decompress(self._mmap[start:start + length], raw_length)
+
+    def get(self, game_pk, path=None):
+        """
+        Returns the decoded feed of game `game_pk`, or only the part at `path`
+        (see `json_decode.decode`).
+        """
+        return decode(self.raw(game_pk), path)
+
+    def iterFeeds(self, game_pks=None, path=None, raw=False, max_workers=None, chunk_size=64):
+        """
+        Yields (game_pk, feed) for `game_pks` (every game if None) in order,
+        decompressing and decoding up to `max_workers` games at once.
+
+        Parameters
+        ----------
+            path : str or list (default: None)
+                Only decode this part of each feed; see `get`.
+
+            raw : bool (default: False)
+                Yield the json bytes instead of decoding them.
+
+            max_workers : int (default: None)
+                Number of threads (decompression releases the GIL); the number
+                of CPUs if None.
+
+            chunk_size : int (default: 64)
+                Games handed to the pool at once, bounding how many decoded
+                feeds are held in memory.
+        """
+        game_pks = self.game_pks if game_pks is None else list(game_pks)
+        max_workers = max_workers or os.cpu_count()
+
+        def load(game_pk):
+            return self.raw(game_pk) if raw else self.get(game_pk, path)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for start in range(0, len(game_pks), chunk_size):
+                chunk = [int(game_pk) for game_pk in game_pks[start:start + chunk_size]]
+                yield from zip(chunk, pool.map(load, chunk))
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_archives = None
+_archives_lock = threading.Lock()
+
+
+def addArchive(path):
+    """
+    Makes the games of the archive at `path` available to `findFeed` (and so to
+    nhlAPI.getGameFeed and LiveFeed).
+    """
+    archives = _openArchives()
+    with _archives_lock:
+        archives.append(FeedArchive(path))
+
+
+def _openArchives():
+    global _archives
+    with _archives_lock:
+        if _archives is None:
+            paths = os.environ.get('NHL_FEED_ARCHIVES', '')
+            _archives = [FeedArchive(path) for path in paths.split(os.pathsep) if path]
+        return _archives
+
+
+def findFeed(game_pk):
+    """
+    Returns the registered archive containing game `game_pk`, or None.
+    """
+    for archive in _openArchives():
+        if game_pk in archive:
+            return archive
+    return None
+
+
+def buildArchive(path, season, base_url='https://statsapi.web.nhl.com/api/v1', max_workers=16,
+                 chunk_size=64):
+    """
+    Adds the feed of every Final game of `season` that is not already in the
+    archive at `path`, requesting them from the API. The responses are
+    compressed as they come, without being decoded.
+    """
+    from api_client import getClient
+    from nhlAPI import getLeagueSchedule
+
+    game_pks = [game['gamePk'] for date in getLeagueSchedule(season, base_url=base_url)
+                for game in date['games'] if game['status']['detailedState'] == 'Final']
+
+    client = getClient(base_url)
+    with FeedWriter(path) as writer, ThreadPoolExecutor(max_workers=max_workers) as pool:
+        game_pks = [game_pk for game_pk in game_pks if game_pk not in writer]
+        for start in range(0, len(game_pks), chunk_size):
+            chunk = game_pks[start:start + chunk_size]
+            bodies = client.get_many([f'/game/{game_pk}/feed/live' for game_pk in chunk],
+                                     max_workers=max_workers, immutable=True, raw=True)
+            # the API answers a missing game with a short error message
+            found = [(game_pk, body) for game_pk, body in zip(chunk, bodies)
+                     if b'"messageNumber"' not in body[:32]]
+            for (game_pk, _), block in zip(found, pool.map(writer.compress,
+                                                           [body for _, body in found])):
+                writer.addCompressed(game_pk, *block)
+
+    return len(game_pks)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build or inspect a game feed archive.')
+    parser.add_argument('command', choices=('build', 'info'))
+    parser.add_argument('archive')
+    parser.add_argument('--season', help="season to add, e.g. '20192020' (build)")
+    parser.add_argument('--workers', type=int, default=16)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        if not args.season:
+            parser.error('build needs --season')
+        print(f'added {buildArchive(args.archive, args.season, max_workers=args.workers)} games')
+    else:
+        with FeedArchive(args.archive) as archive:
+            size = os.path.getsize(args.archive)
+            raw = sum(raw_length for _, _, raw_length in archive._index.values())
+            print(f'{len(archive)} games, {size / 1e6:.1f} MB '
+                  f'({raw / max(1, size):.1f}x compression)')
@@ -0,0 +1,76 @@
+# json_decode.py
+"""
+JSON decoding for API responses.
+
+Uses orjson when it is installed (several times faster than the standard
+library on the large game feeds) and the json module otherwise. Responses are
+kept as raw bytes until something needs them decoded, and `decode` can return
+only the parts of a response that are wanted, e.g.
+
+    decode(body, 'stats.0.splits')
+    decode(body, ['liveData.plays.allPlays', 'gameData.teams'])
+
+so the rest of a 200+ KB feed is released right away instead of being held
+(and cached) alongside the part that is used.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(body):
+    """
+    Decodes the json document `body` (bytes or str).
+    """
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def dumps(data):
+    """
+    Encodes `data` as json bytes.
+    """
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data).encode()
+
+
+def _keys(path):
+    return path.split('.') if isinstance(path, str) else path
+
+
+def extract(data, path):
+    """
+    Returns the part of the decoded document `data` at `path`: a dotted string
+    ('stats.0.splits', where numbers index lists) or a tuple of keys. Raises
+    KeyError if the path does not exist, as indexing `data` would.
+    """
+    for key in _keys(path):
+        if isinstance(data, list):
+            try:
+                data = data[int(key)]
+            except (IndexError, ValueError):
+                raise KeyError(key) from None
+        elif isinstance(data, dict):
+            data = data[key]
+        else:
+            raise KeyError(key)
+    return data
+
+
+def decode(body, path=None):
+    """
+    Decodes `body`, returning only the part at `path` (see `extract`), or a
+    list with the part at each path when `path` is a list of paths. The whole
+    document is returned if `path` is None.
+    """
+    data = loads(body)
+    if path is None:
+        return data
+    if isinstance(path, list):
+        return [extract(data, p) for p in path]
+    return extract(data, path)
@@ -0,0 +1,326 @@
+# metrics.py
+"""
+Instrumentation for the API client and the extraction functions.
+
+Nothing is recorded until `enable()` is called. While disabled, every hook
+costs a single module attribute check (`metrics.ENABLED`), so the
+instrumentation can stay in the hot paths.
+
+Recorded per endpoint (ids replaced, see `endpointKey`): request
+count, latency histogram, bytes received, json decode time histogram, cache
+hits, retries and failed requests. Recorded per stage: call count and timing
+histogram. Stages are marked with `stage`, either as a decorator or a context
+manager:
+
+    @stage('time_series.getTeamBoxScores')
+    def getTeamBoxScores(...):
+        ...
+        with stage('time_series.getTeamBoxScores.dataframe'):
+            ...
+
+Usage:
+
+    import metrics
+    metrics.enable(profile={'time_series.getTeamBoxScores'})
+    getTeamBoxScores(10, '20192020')
+    print(metrics.toPrometheus())
+    metrics.dumpJSON('metrics.json')
+    metrics.profileStats('time_series.getTeamBoxScores').sort_stats('cumtime').print_stats(20)
+"""
+import bisect
+import cProfile
+import functools
+import json
+import pstats
+import re
+import threading
+import time
+
+
+ENABLED = False
+
+# histogram bucket upper bounds (seconds), as in the Prometheus client defaults
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf'))
+
+
+_ID = re.compile(r'/\d+')
+
+
+def endpointKey(endpoint):
+    """
+    Groups endpoints for statistics by dropping the query string and
+    replacing ids, e.g. '/game/2019020970/boxscore' -> '/game/{id}/boxscore'.
+    """
+    return _ID.sub('/{id}', endpoint.split('?', 1)[0])
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram of durations (seconds).
+    """
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def toDict(self):
+        return {'count': self.count, 'sum': self.sum,
+                'buckets': {str(bound): count for bound, count in zip(BUCKETS, self.counts)}}
+
+
+class _Endpoint:
+
+    def __init__(self):
+        self.requests = 0
+        self.bytes = 0
+        self.cache_hits = 0
+        self.retries = 0
+        self.failures = 0
+        self.latency = Histogram()
+        self.decode = Histogram()
+
+
+class Registry:
+    """
+    Thread-safe store of everything recorded while instrumentation is enabled.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.endpoints = {}
+            self.stages = {}
+            self.profiles = {}
+
+    def _endpoint(self, endpoint):
+        key = endpointKey(endpoint)
+        if key not in self.endpoints:
+            self.endpoints[key] = _Endpoint()
+        return self.endpoints[key]
+
+    def request(self, endpoint, seconds, n_bytes):
+        with self._lock:
+            entry = self._endpoint(endpoint)
+            entry.requests += 1
+            entry.bytes += n_bytes
+            entry.latency.observe(seconds)
+
+    def decode(self, endpoint, seconds):
+        with self._lock:
+            self._endpoint(endpoint).decode.observe(seconds)
+
+    def cacheHit(self, endpoint):
+        with self._lock:
+            self._endpoint(endpoint).cache_hits += 1
+
+    def retry(self, endpoint):
+        with self._lock:
+            self._endpoint(endpoint).retries += 1
+
+    def failure(self, endpoint):
+        with self._lock:
+            self._endpoint(endpoint).failures += 1
+
+    def stage(self, name, seconds):
+        with self._lock:
+            if name not in self.stages:
+                self.stages[name] = Histogram()
+            self.stages[name].observe(seconds)
+
+    def profile(self, name, profiler):
+        with self._lock:
+            if name in self.profiles:
+                self.profiles[name].add(profiler)
+            else:
+                self.profiles[name] = pstats.Stats(profiler)
+
+
+REGISTRY = Registry()
+_profile = set()
+_profiling = threading.local()
+
+
+def enable(profile=None, reset=False):
+    """
+    Turns instrumentation on.
+
+    Parameters
+    ----------
+        profile : set(str) or True (default: None)
+            Stages to run under cProfile (True for every stage). Profiles of
+            repeated calls are accumulated; see `profileStats`.
+
+        reset : bool (default: False)
+            Whether to discard everything recorded so far.
+    """
+    global ENABLED, _profile
+    if reset:
+        REGISTRY.reset()
+    _profile = profile if profile is True else set(profile or ())
+    ENABLED = True
+
+
+def disable():
+    """
+    Turns instrumentation off; what was recorded is kept.
+    """
+    global ENABLED
+    ENABLED = False
+
+
+class _NullStage:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+
+    def __init__(self, name):
+        self.name = name
+        self.profiler = None
+
+    def __enter__(self):
+        # cProfile cannot be nested, so only the outermost profiled stage
+        # of a thread is captured
+        if (_profile is True or self.name in _profile) and \
+                not getattr(_profiling, 'active', False):
+            _profiling.active = True
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        REGISTRY.stage(self.name, time.perf_counter() - self.start)
+        if self.profiler is not None:
+            self.profiler.disable()
+            _profiling.active = False
+            REGISTRY.profile(self.name, self.profiler)
+        return False
+
+
+class stage:
+    """
+    Times a block of code (context manager) or every call of a function
+    (decorator) under the stage `name`. Does nothing while disabled.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._active = None
+
+    def __enter__(self):
+        self._active = _Stage(self.name) if ENABLED else _NULL_STAGE
+        return self._active.__enter__()
+
+    def __exit__(self, *exc):
+        return self._active.__exit__(*exc)
+
+    def __call__(self, func):
+        name = self.name
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with _Stage(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+
+def toJSON():
+    """
+    Returns everything recorded as a json-serializable dictionary.
+    """
+    with REGISTRY._lock:
+        return {
+            'endpoints': {key: {'requests': entry.requests, 'bytes': entry.bytes,
+                                'cache_hits': entry.cache_hits, 'retries': entry.retries,
+                                'failures': entry.failures,
+                                'latency': entry.latency.toDict(),
+                                'decode': entry.decode.toDict()}
+                          for key, entry in REGISTRY.endpoints.items()},
+            'stages': {name: histogram.toDict() for name, histogram in REGISTRY.stages.items()},
+        }
+
+
+def dumpJSON(path):
+    with open(path, 'w') as f:
+        json.dump(toJSON(), f, indent=2)
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _histogramLines(metric, labels, histogram):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(BUCKETS, histogram.counts):
+        cumulative += count
+        le = '+Inf' if bound == float('inf') else repr(bound)
+        lines.append(f'{metric}_bucket{{{labels},le="{le}"}} {cumulative}')
+    lines.append(f'{metric}_sum{{{labels}}} {histogram.sum}')
+    lines.append(f'{metric}_count{{{labels}}} {histogram.count}')
+    return lines
+
+
+def toPrometheus():
+    """
+    Returns everything recorded in the Prometheus text exposition format.
+    """
+    counters = (('nhl_api_requests_total', 'requests', 'Requests sent to the API.'),
+                ('nhl_api_response_bytes_total', 'bytes', 'Response bytes received.'),
+                ('nhl_api_cache_hits_total', 'cache_hits', 'Requests served from the cache.'),
+                ('nhl_api_retries_total', 'retries', 'Requests retried.'),
+                ('nhl_api_failures_total', 'failures', 'Requests that failed after retries.'))
+    histograms = (('nhl_api_request_seconds', 'latency', 'Request latency.'),
+                  ('nhl_api_decode_seconds', 'decode', 'JSON decode time.'))
+
+    with REGISTRY._lock:
+        endpoints = sorted(REGISTRY.endpoints.items())
+        stages = sorted(REGISTRY.stages.items())
+
+        lines = []
+        for metric, attribute, description in counters:
+            lines += [f'# HELP {metric} {description}', f'# TYPE {metric} counter']
+            lines += [f'{metric}{{endpoint="{_label(key)}"}} {getattr(entry, attribute)}'
+                      for key, entry in endpoints]
+        for metric, attribute, description in histograms:
+            lines += [f'# HELP {metric} {description}', f'# TYPE {metric} histogram']
+            for key, entry in endpoints:
+                lines += _histogramLines(metric, f'endpoint="{_label(key)}"',
+                                         getattr(entry, attribute))
+
+        metric = 'nhl_stage_seconds'
+        lines += [f'# HELP {metric} Time spent in extraction stages.',
+                  f'# TYPE {metric} histogram']
+        for name, histogram in stages:
+            lines += _histogramLines(metric, f'stage="{_label(name)}"', histogram)
+
+    return '\n'.join(lines) + '\n'
+
+
+def profileStats(name):
+    """
+    Returns the accumulated `pstats.Stats` of stage `name` (None if it was not
+    profiled).
+    """
+    return REGISTRY.profiles.get(name)
@@ -0,0 +1,156 @@
+# mongo_store.py
+import os
+
+from pymongo import ASCENDING, MongoClient, UpdateOne
+
+
+_databases = {}
+
+
+def getDatabase(uri=None, name='nhl'):
+    """
+    Returns the `nhl` database, connecting on first use and creating the
+    collections' indexes.
+
+    Parameters
+    ----------
+        uri : str (default: None)
+            MongoDB connection string. Defaults to the environment variable
+            NHL_MONGO_URI, or a local mongod if that is not set.
+
+        name : str (default: 'nhl')
+            Name of the database.
+
+    Returns
+    -------
+        db : pymongo.database.Database
+    """
+    if uri is None:
+        uri = os.environ.get('NHL_MONGO_URI', 'mongodb://localhost:27017')
+
+    if (uri, name) not in _databases:
+        db = MongoClient(uri)[name]
+        ensureIndexes(db)
+        _databases[uri, name] = db
+
+    return _databases[uri, name]
+
+
+def ensureIndexes(db):
+    """
+    Creates the indexes used by the read paths (a no-op if they exist).
+
+    nhl.schedule is indexed on gamePk (unique) and on (season, teamIds, date),
+    which serves "a team's games in a season, in order" from the index alone.
+    """
+    db.schedule.create_index([('gamePk', ASCENDING)], unique=True)
+    db.schedule.create_index([('season', ASCENDING), ('teamIds', ASCENDING),
+                              ('date', ASCENDING)])
+
+
+def gameDocument(game, date):
+    """
+    Builds the nhl.schedule document of one game from a schedule request.
+
+    The document is the game dictionary itself (see the note at the end of
+    nhlAPI.py), keyed by gamePk, plus the schedule date and a `teamIds` array
+    holding the home and away team ids for indexing.
+    """
+    document = dict(game)
+    document['_id'] = game['gamePk']
+    document['date'] = date
+    document['teamIds'] = [game['teams']['home']['team']['id'],
+                           game['teams']['away']['team']['id']]
+    return document
+
+
+def ingestSchedule(dates, db=None, batch_size=500):
+    """
+    Upserts the games of a schedule request into nhl.schedule.
+
+    Games are written with batched, unordered `bulk_write` calls, one upsert
+    per game, so re-ingesting a schedule only rewrites the games themselves
+    and never a whole team's season.
+
+    Parameters
+    ----------
+        dates : list(dicts)
+            The 'dates' list of a schedule request (e.g. from
+            `nhlAPI.getLeagueSchedule`).
+
+        db : pymongo.database.Database (default: None)
+            Database to write to; defaults to `getDatabase()`.
+
+        batch_size : int (default: 500)
+            Number of upserts sent per bulk_write.
+
+    Returns
+    -------
+        n_games : int
+            Number of games written.
+    """
+    if db is None:
+        db = getDatabase()
+
+    n_games = 0
+    batch = []
+    for date in dates:
+        for game in date['games']:
+            document = gameDocument(game, date['date'])
+            batch.append(UpdateOne({'_id': document['_id']}, {'$set': document}, upsert=True))
+            if len(batch) == batch_size:
+                db.schedule.bulk_write(batch, ordered=False)
+                n_games += len(batch)
+                batch = []
+
+    if batch:
+        db.schedule.bulk_write(batch, ordered=False)
+        n_games += len(batch)
+
+    return n_games
+
+
+def loadSchedule(team_id, season, db=None, fields=None):
+    """
+    Reads a team's schedule for a season from nhl.schedule.
+
+    Parameters
+    ----------
+        team_id : str or int
+            Team's NHL API id number.
+
+        season : str ('YYYYYYYY')
+            Season to read.
+
+        db : pymongo.database.Database (default: None)
+            Database to read from; defaults to `getDatabase()`.
+
+        fields : list(str) (default: None)
+            Game fields to return (e.g. ['gamePk', 'status', 'teams']); only
+            these are sent back by the server. If None, the whole game is returned.
+
+    Returns
+    -------
+        schedule : list(dicts)
+            Same form as the 'dates' list returned by `nhlAPI.getSchedule`.
+    """
+    if db is None:
+        db = getDatabase()
+
+    projection = {'_id': False, 'teamIds': False}
+    if fields is not None:
+        projection = {field: True for field in set(fields) | {'date'}}
+        projection['_id'] = False
+
+    cursor = db.schedule.find({'season': str(season), 'teamIds': int(team_id)},
+                              projection=projection).sort([('date', ASCENDING),
+                                                           ('gamePk', ASCENDING)])
+
+    dates = []
+    for game in cursor:
+        date = game.pop('date')
+        if not dates or dates[-1]['date'] != date:
+            dates.append({'date': date, 'games': []})
+        dates[-1]['games'].append(game)
+
+    return dates
@@ -1,5 +1,6 @@
 # collect_data.py
-import requests
+import asyncio
+import copy
 from pymongo import MongoClient
 import pickle
 import progressbar
@@ -7,7 +8,13 @@ import time
 import pandas as pd
 import os
 
+from api_client import getClient
+from feed_archive import findFeed
+from metrics import stage
+from mongo_store import loadSchedule
 
+
+@stage('nhlAPI.getTeamIDs')
 def getTeamIDs(base_url='https://statsapi.web.nhl.com/api/v1', active=True):
     """
     Queries the NHL API for (team_name, team_id) pairs.
@@ -21,7 +28,7 @@ def getTeamIDs(base_url='https://statsapi.web.nhl.com/api/v1', active=True):
             for all (active) teams
     """
     # request teams data
-    all_teams = requests.get(base_url + '/teams').json()['teams']
+    all_teams = getClient(base_url).get('/teams', path='teams')
 
     # extract team names and ids
     if active:
@@ -32,6 +39,7 @@ def getTeamIDs(base_url='https://statsapi.web.nhl.com/api/v1', active=True):
     return teams
 
 
+@stage('nhlAPI.getTeamRoster')
 def getTeamRoster(team_id, season=None, wait=0,
                     base_url='https://statsapi.web.nhl.com/api/v1'):
     """
@@ -44,9 +52,9 @@ def getTeamRoster(team_id, season=None, wait=0,
         season (str): season to request roster; defaults to using active roster
 
         wait : float (nonnegative, default=0)
-            Specifies the amount of time (in seconds) to wait before making the
-            request to the API; not necessary unless making more then ~500+ requests
-            a second.
+            Deprecated. Seconds to sleep before making the request. Requests are
+            already paced (and retried when the API pushes back) by the client's
+            `rate_limit.RateLimiter`, so this should be left at 0.
 
     Returns
     -------
@@ -64,10 +72,11 @@ def getTeamRoster(team_id, season=None, wait=0,
             }
         }
     """
+    client = getClient(base_url)
+
     # if season is not specified, assume it is the current season
     if season is None:
-        season = requests.get(base_url + '/seasons/current').json()['seasons']
-        season = season[0]['seasonId']
+        season = client.current_season()
 
     if wait:
         # wait a moment to request additional data
@@ -80,13 +89,11 @@ def getTeamRoster(team_id, season=None, wait=0,
         # if we want data from a specific season
         endpoint_url += '?expand=team.roster&season={}'.format(season)
 
-    # get team roster
-    team_roster = requests.get(base_url + endpoint_url).json()
-
-    # extract player information
-    return team_roster['roster']
+    # get team roster, keeping only the player information
+    return client.get(endpoint_url, path='roster')
 
 
+@stage('nhlAPI.getPlayerStats')
 def getPlayerStats(player_id, season=None, report_type='statsSingleSeason',
                     wait=0, base_url='https://statsapi.web.nhl.com/api/v1'):
     """
@@ -106,9 +113,9 @@ def getPlayerStats(player_id, season=None, report_type='statsSingleSeason',
             current season.
 
         wait : float (nonnegative, default=0)
-            Specifies the amount of time (in seconds) to wait before making the
-            request to the API; not necessary unless making more then ~500+ requests
-            a second.
+            Deprecated. Seconds to sleep before making the request. Requests are
+            already paced (and retried when the API pushes back) by the client's
+            `rate_limit.RateLimiter`, so this should be left at 0.
 
         base_url : str (default: 'https://statsapi.web.nhl.com/api/v1')
             Base url to the NHL API
@@ -205,24 +212,26 @@ def getPlayerStats(player_id, season=None, report_type='statsSingleSeason',
             onPaceRegularSeason         -   a single dictionary
     """
 
+    client = getClient(base_url)
+
     # if season is not specified, assume it is the current season
     if season is None:
-        season = requests.get(base_url + '/seasons/current').json()['seasons']
-        season = season[0]['seasonId']
+        season = client.current_season()
 
-    time.sleep(wait)
+    if wait:
+        # wait a moment to request additional data
+        time.sleep(wait)
 
     # endpoint to query
     endpoint_url = f'/people/{player_id}/stats?stats={report_type}&season={season}'
 
-    # request player statistics
-    player_stats = requests.get(base_url + endpoint_url).json()
+    # request player statistics, keeping only the requested stats splits
+    return client.get(endpoint_url, path='stats.0.splits')
 
-    # return the requested stats splits
-    return player_stats['stats'][0]['splits']
 
-
-def getSchedule(team_id, season=None, base_url='https://statsapi.web.nhl.com/api/v1'):
+@stage('nhlAPI.getSchedule')
+def getSchedule(team_id, season=None, base_url='https://statsapi.web.nhl.com/api/v1',
+                start_date=None, end_date=None, expand=None, mongodb=False, fields=None):
     """
     Queries the NHL API for a team's schedule.
 
@@ -233,26 +242,84 @@ def getSchedule(team_id, season=None, base_url='https://statsapi.web.nhl.com/api
 
     season : str ('YYYYYYYY', default: None)
         Season to request data from (e.g. '20192020'). If None, defaults to the
-        current season.
+        current season. Ignored if `start_date` and `end_date` are given.
+
+    start_date, end_date : str ('YYYY-MM-DD', default: None)
+        Request only games played between these dates (inclusive).
+
+    expand : list(str) (default: None)
+        Schedule modifiers used to hydrate each game with extra data, e.g.
+        ['schedule.linescore'] adds each game's linescore (goals and shots on
+        goal for both teams) under game['linescore'].
+
+    mongodb : bool (default: False)
+        If True, read the schedule from the nhl.schedule MongoDB collection
+        (see mongo_store.py) instead of the API. `start_date`, `end_date` and
+        `expand` are not supported in this mode.
+
+    fields : list(str) (default: None)
+        With `mongodb`, only these game fields are read (e.g. ['gamePk',
+        'status', 'teams']). If None, whole games are returned.
 
     Returns
     -------
     schedule : list(dicts)
         List containing one dictionary per scheduled game for the entire season.
     """
+    client = getClient(base_url)
+
+    if mongodb:
+        if season is None:
+            season = client.current_season()
+        return loadSchedule(team_id, season, fields=fields)
+
+    if start_date is not None and end_date is not None:
+        endpoint_url = f'/schedule?startDate={start_date}&endDate={end_date}&teamId={team_id}'
+    else:
+        # if season is not specified, assume it is the current season
+        if season is None:
+            season = client.current_season()
+        endpoint_url = f'/schedule?season={season}&teamId={team_id}'
+
+    if expand:
+        endpoint_url += '&expand=' + ','.join(expand)
+
+    # request schedule information, keeping only the useful part
+    return client.get(endpoint_url, path='dates')
+
+
+@stage('nhlAPI.getLeagueSchedule')
+def getLeagueSchedule(season=None, base_url='https://statsapi.web.nhl.com/api/v1'):
+    """
+    Queries the NHL API for the schedule of every team in the league.
+
+    This is a single request; every game appears once, rather than once for
+    each of the two teams playing it as when calling `getSchedule` per team.
+
+    Parameters
+    ----------
+    season : str ('YYYYYYYY', default: None)
+        Season to request data from (e.g. '20192020'). If None, defaults to the
+        current season.
+
+    Returns
+    -------
+    schedule : list(dicts)
+        List containing one dictionary per date with scheduled games; each
+        has the same form as for `getSchedule`.
+    """
+    client = getClient(base_url)
+
     # if season is not specified, assume it is the current season
     if season is None:
-        season = requests.get(base_url + '/seasons/current').json()['seasons']
-        season = season[0]['seasonId']
-
-    # request schedule information
-    schedule = requests.get(base_url + f'/schedule?season={season}&teamId={team_id}')
+        season = client.current_season()
 
-    # extract/return useful information
-    return schedule.json()['dates']
+    # request schedule information, without restricting it to one team
+    return client.get(f'/schedule?season={season}', path='dates')
 
 
-def getBoxScore(game_id, base_url='https://statsapi.web.nhl.com/api/v1'):
+@stage('nhlAPI.getBoxScore')
+def getBoxScore(game_id, base_url='https://statsapi.web.nhl.com/api/v1', final=None):
     """
     Queries the NHL API for the boxscore for game `game_id`.
 
@@ -264,6 +331,11 @@ def getBoxScore(game_id, base_url='https://statsapi.web.nhl.com/api/v1'):
     base_url : str
         URL to the base of the NHL API
 
+    final : bool (default: None)
+        Set to True if the game is known to be Final, so that the response
+        cache (if one is in use) keeps the boxscore forever. If None, only
+        boxscores from past seasons are kept forever.
+
     Returns
     -------
     home : dict
@@ -272,14 +344,64 @@ def getBoxScore(game_id, base_url='https://statsapi.web.nhl.com/api/v1'):
     away : dict
         dictionary containing away team information
     """
-    boxscore = requests.get(base_url + f'/game/{game_id}/boxscore').json()
+    teams = getClient(base_url).get(f'/game/{game_id}/boxscore', immutable=final, path='teams')
 
-    return boxscore['teams']['home'], boxscore['teams']['away']
+    return teams['home'], teams['away']
 
 
-def getLiveData(game_id, start_time=None):
+@stage('nhlAPI.getGameFeed')
+def getGameFeed(game_id, path=None, base_url='https://statsapi.web.nhl.com/api/v1', final=None):
     """
-    Queries the NHL API for the live data feed of a game.
+    Queries the NHL API for the full feed ('gameData', 'liveData' and
+    'metaData') of game `game_id`, or only part of it.
+
+    Parameters
+    ----------
+    game_id : str or int
+        NHL API game_id number for the desired game.
+
+    path : str or list(str) (default: None)
+        Part of the feed to return, e.g. 'liveData.plays.allPlays', or a list
+        of parts (see `json_decode.decode`). The rest of the feed (200+ KB for
+        a full game) is dropped as soon as it is decoded. If None, the whole
+        feed is returned.
+
+    base_url : str
+        URL to the base of the NHL API
+
+    final : bool (default: None)
+        Set to True if the game is known to be Final, so that the response
+        cache (if one is in use) keeps the feed forever.
+
+    Returns
+    -------
+    feed : dict
+        The feed, or the part of it at `path`; see `getLiveData` for the
+        layout of feed['liveData']. Games in a feed archive registered with
+        feed_archive (see `feed_archive.findFeed`) are read from the archive.
+    """
+    # games in a registered feed archive are read from disk
+    archive = findFeed(game_id)
+    if archive is not None:
+        return archive.get(game_id, path)
+
+    return getClient(base_url).get(f'/game/{game_id}/feed/live', immutable=final, path=path)
+
+
+async def getLiveData(game_id, start_time=None, interval=10,
+                      base_url='https://statsapi.web.nhl.com/api/v1'):
+    """
+    Streams the live data feed of a game, yielding new plays as they happen.
+
+    The full feed is requested once; after that, only the changes since the
+    last update are requested (`/feed/live/diffPatch`) every `interval`
+    seconds and patched into the feed in place. The generator finishes once the
+    game is Final.
+
+    Use as
+
+        async for plays in getLiveData(game_id):
+            ...
 
     Parameters
     ----------
@@ -288,16 +410,28 @@ def getLiveData(game_id, start_time=None):
         the final six are unique to this game.
 
     start_time : str (yyyymmdd_hhmmss, default: None)
-        If `start_time` is specified, this will query for data updates since
-        the given `start_time` time. Use when streaming game data to reduce
-        overhead.
+        If `start_time` is specified, only plays since the given `start_time`
+        time are yielded. Otherwise the first item yielded contains every play
+        already in the feed.
 
-    Returns
-    -------
-    live_data : dict (json-like)
-        Dictionary containing data for the specified game. The high level outline
-        of the returned dictionary is given here. See the Additional Information
-        section for a more detailed breakdown of each category.
+    interval : float (default: 10)
+        Seconds to wait between requests for updates.
+
+    base_url : str
+        URL to the base of the NHL API
+
+    Yields
+    ------
+    plays : list(dicts)
+        New plays since the previous update; each has the same form as the
+        entries of live_data['plays']['allPlays'] (see below). The whole feed,
+        kept up to date, is available through `LiveFeed`.
+
+    Additional Information
+    ----------------------
+    The feed's live_data is a dictionary containing data for the specified
+    game. The high level outline of the dictionary is given here. See below
+    for a more detailed breakdown of each category.
 
         The top level of the dictionary has four keys:
             plays       -   play by play data (typically 10K+ lines)
@@ -339,6 +473,233 @@ def getLiveData(game_id, start_time=None):
 
 
     """
+    feed = LiveFeed(game_id, base_url=base_url)
+    await feed.load()
+
+    # a copy, as the feed's list grows with every update
+    plays = list(feed.plays)
+    while True:
+        if start_time is not None:
+            plays = [play for play in plays if _playTime(play) >= start_time]
+        if plays:
+            yield plays
+
+        if feed.final:
+            break
+
+        await asyncio.sleep(interval)
+        plays = await feed.update()
+
+
+class LiveFeed:
+    """
+    Live feed of a single game, kept up to date by applying diff patches.
+
+    Parameters
+    ----------
+    game_id : str or int
+        NHL API game_id.
+
+    base_url : str
+        URL to the base of the NHL API
+
+    Attributes
+    ----------
+    feed : dict (json-like)
+        The full feed ('gameData', 'liveData' and 'metaData'), patched in place
+        by every `update`.
+    """
+
+    def __init__(self, game_id, base_url='https://statsapi.web.nhl.com/api/v1'):
+        self.game_id = game_id
+        self.client = getClient(base_url)
+        self.feed = None
+
+    @property
+    def live_data(self):
+        return self.feed['liveData']
+
+    @property
+    def plays(self):
+        return self.feed['liveData']['plays']['allPlays']
+
+    @property
+    def timestamp(self):
+        # yyyymmdd_hhmmss of the last change included in the feed
+        return self.feed['metaData']['timeStamp']
+
+    @property
+    def final(self):
+        return self.feed['gameData']['status']['abstractGameState'] == 'Final'
+
+    async def load(self):
+        """
+        Requests the full feed (or reads it from a registered feed archive).
+        """
+        archive = findFeed(self.game_id)
+        if archive is not None:
+            self.feed = archive.get(self.game_id)
+            return
+        self.feed = await self.client.aget(f'/game/{self.game_id}/feed/live')
+
+    async def update(self):
+        """
+        Requests the changes since the last update, applies them to `feed` and
+        returns the plays that were added.
+        """
+        n_plays = len(self.plays)
+        patches = await self.client.aget(f'/game/{self.game_id}/feed/live/diffPatch'
+                                         f'?startTimecode={self.timestamp}')
+
+        # the endpoint returns a list of {'diff': [operations]}; an up to date
+        # feed gets an empty list
+        for patch in patches or []:
+            _applyPatch(self.feed, patch['diff'])
+
+        return self.plays[n_plays:]
+
+
+async def followGames(game_ids, interval=10, base_url='https://statsapi.web.nhl.com/api/v1'):
+    """
+    Streams the live feeds of many games at once from a single event loop.
+
+    Parameters
+    ----------
+    game_ids : list
+        NHL API game_ids of the games to follow.
+
+    interval : float (default: 10)
+        Seconds to wait between requests for updates, per game.
+
+    base_url : str
+        URL to the base of the NHL API
+
+    Yields
+    ------
+    (game_id, plays) : tuple
+        The game and its new plays (see `getLiveData`), as soon as any game has
+        an update. Finishes once every game is Final.
+    """
+    queue = asyncio.Queue()
+    done = object()
+
+    async def follow(game_id):
+        try:
+            async for plays in getLiveData(game_id, interval=interval, base_url=base_url):
+                await queue.put((game_id, plays))
+        finally:
+            await queue.put((game_id, done))
+
+    tasks = [asyncio.create_task(follow(game_id)) for game_id in game_ids]
+    remaining = len(tasks)
+    try:
+        while remaining:
+            game_id, plays = await queue.get()
+            if plays is done:
+                remaining -= 1
+            else:
+                yield game_id, plays
+    finally:
+        for task in tasks:
+            task.cancel()
+        # surface errors (other than cancellation) from the per-game tasks
+        for result in await asyncio.gather(*tasks, return_exceptions=True):
+            if isinstance(result, Exception):
+                raise result
+
+
+async def followNight(date=None, interval=10, base_url='https://statsapi.web.nhl.com/api/v1'):
+    """
+    Streams the live feeds of every game on `date` (see `followGames`).
+
+    Parameters
+    ----------
+    date : str ('YYYY-MM-DD', default: None)
+        Date of the games to follow; defaults to today.
+    """
+    endpoint_url = '/schedule' if date is None else f'/schedule?date={date}'
+    schedule = await getClient(base_url).aget(endpoint_url)
+    game_ids = [game['gamePk'] for day in schedule['dates'] for game in day['games']]
+
+    async for update in followGames(game_ids, interval=interval, base_url=base_url):
+        yield update
+
+
+def _playTime(play):
+    # play's dateTime ('2020-02-26T00:09:19Z') in the feed's yyyymmdd_hhmmss format
+    stamp = play['about']['dateTime']
+    return stamp[0:4] + stamp[5:7] + stamp[8:10] + '_' + stamp[11:13] + stamp[14:16] + stamp[17:19]
+
+
+def _applyPatch(document, operations):
+    """
+    Applies a list of JSON patch (RFC 6902) operations to `document` in place.
+    Supports the add, replace, remove, copy, move and test operations; a
+    failed test or an unknown operation raises ValueError. Operations on the
+    whole document ('' path) replace its contents.
+    """
+    def parse(path):
+        return [part.replace('~1', '/').replace('~0', '~') for part in path.split('/')[1:]]
+
+    def resolve(parts):
+        parent = document
+        for part in parts[:-1]:
+            parent = parent[int(part)] if isinstance(parent, list) else parent[part]
+        return parent, parts[-1]
+
+    def get(parts):
+        if not parts:
+            return document
+        parent, key = resolve(parts)
+        return parent[int(key)] if isinstance(parent, list) else parent[key]
+
+    def remove(parts):
+        if not parts:
+            raise ValueError('cannot remove the whole document')
+        parent, key = resolve(parts)
+        return parent.pop(int(key)) if isinstance(parent, list) else parent.pop(key)
+
+    def add(parts, value):
+        if not parts:
+            # the document is patched in place, so only its contents can change
+            if isinstance(document, dict) and isinstance(value, dict):
+                document.clear()
+                document.update(value)
+            elif isinstance(document, list) and isinstance(value, list):
+                document[:] = value
+            else:
+                raise ValueError('cannot replace the document with a different type')
+            return
+        parent, key = resolve(parts)
+        if isinstance(parent, list):
+            if key == '-':
+                parent.append(value)
+            else:
+                parent.insert(int(key), value)
+        else:
+            parent[key] = value
+
+    for operation in operations:
+        op, path = operation['op'], parse(operation['path'])
+        if op == 'add':
+            add(path, operation['value'])
+        elif op == 'replace':
+            if not path:
+                add(path, operation['value'])
+                continue
+            parent, key = resolve(path)
+            parent[int(key) if isinstance(parent, list) else key] = operation['value']
+        elif op == 'remove':
+            remove(path)
+        elif op == 'copy':
+            add(path, copy.deepcopy(get(parse(operation['from']))))
+        elif op == 'move':
+            add(path, remove(parse(operation['from'])))
+        elif op == 'test':
+            if get(path) != operation['value']:
+                raise ValueError(f'patch test failed at {operation["path"]!r}')
+        else:
+            raise ValueError(f'unsupported patch operation {op!r}')
 
 """
 A schedule request returns json of the form
@@ -0,0 +1,254 @@
+# player_index.py
+"""
+Compact cross-season player/team index.
+
+Replaces the eight lookup pickles kept in every data/basic/<season>/ directory
+with one set of NumPy arrays covering all seasons:
+
+    <index>/
+        seasons.npy                 sorted season keys (e.g. 19801981)
+        player_ids.npy              sorted ids of every player seen
+        player_names.npy            name of each player in player_ids
+        names_sorted.npy            distinct player names, sorted
+        names_sorted_ids.npy        player id for each entry of names_sorted
+        team_names.npy              distinct team names (interned)
+
+        season_team_ptr.npy         CSR: teams of season i are
+        season_team_ids.npy              season_team_ids[ptr[i]:ptr[i+1]] (sorted)
+        season_team_name.npy             with names team_names[season_team_name[...]]
+        roster_ptr.npy              CSR: players of the jth (season, team) pair are
+        roster_players.npy               roster_players[roster_ptr[j]:roster_ptr[j+1]]
+
+        season_player_ptr.npy       CSR: players of season i are
+        season_player_ids.npy            season_player_ids[ptr[i]:ptr[i+1]] (sorted)
+        season_player_team.npy           on team season_player_team[...]
+
+Every lookup is a binary search into memory-mapped arrays, so opening the
+index does not read (let alone unpickle) anything up front.
+"""
+import argparse
+import glob
+import os
+import pickle
+
+import numpy as np
+
+
+_ARRAYS = ('seasons', 'player_ids', 'player_names', 'names_sorted', 'names_sorted_ids',
+           'team_names', 'season_team_ptr', 'season_team_ids', 'season_team_name',
+           'roster_ptr', 'roster_players', 'season_player_ptr', 'season_player_ids',
+           'season_player_team')
+
+
+def seasonKey(season):
+    """
+    Normalizes a season given as '1980-1981', '19801981' or 19801981 to the
+    integer key 19801981.
+    """
+    return int(str(season).replace('-', ''))
+
+
+def buildIndex(src='data/basic', dst='data/index'):
+    """
+    Builds the index from the per-season lookup pickles.
+
+    Parameters
+    ----------
+        src : str (default: 'data/basic')
+            Directory containing one <season>/ directory of lookup pickles per season.
+
+        dst : str (default: 'data/index')
+            Directory to write the index arrays to.
+    """
+    seasons = []
+    for directory in sorted(glob.glob(os.path.join(src, '*-*'))):
+        with open(os.path.join(directory, 'player_id_to_name'), 'rb') as f:
+            player_names = pickle.load(f)
+        with open(os.path.join(directory, 'team_id_to_name'), 'rb') as f:
+            team_names = pickle.load(f)
+        with open(os.path.join(directory, 'team_id_to_players'), 'rb') as f:
+            team_players = pickle.load(f)
+        with open(os.path.join(directory, 'player_id_to_team'), 'rb') as f:
+            player_team = pickle.load(f)
+        seasons.append((seasonKey(os.path.basename(directory)), player_names, team_names,
+                        team_players, player_team))
+
+    seasons.sort(key=lambda season: season[0])
+
+    # later seasons win when a player's name is spelled differently
+    names = {}
+    for _, player_names, *_ in seasons:
+        names.update(player_names)
+    player_ids = np.array(sorted(names), dtype=np.int64)
+    player_names = np.array([names[pid] for pid in player_ids], dtype=str)
+
+    order = np.argsort(player_names, kind='stable')
+    team_names = sorted({name for _, _, team_names, *_ in seasons for name in team_names.values()})
+    team_name_index = {name: i for i, name in enumerate(team_names)}
+
+    season_team_ptr, season_team_ids, season_team_name = [0], [], []
+    roster_ptr, roster_players = [0], []
+    season_player_ptr, season_player_ids, season_player_team = [0], [], []
+    for _, _, names_, team_players, player_team in seasons:
+        for team_id in sorted(team_players):
+            season_team_ids.append(team_id)
+            season_team_name.append(team_name_index[names_[team_id]])
+            roster = sorted(team_players[team_id])
+            roster_players.extend(roster)
+            roster_ptr.append(len(roster_players))
+        season_team_ptr.append(len(season_team_ids))
+
+        for player_id in sorted(player_team):
+            season_player_ids.append(player_id)
+            season_player_team.append(player_team[player_id])
+        season_player_ptr.append(len(season_player_ids))
+
+    arrays = {
+        'seasons': np.array([season[0] for season in seasons], dtype=np.int64),
+        'player_ids': player_ids,
+        'player_names': player_names,
+        'names_sorted': player_names[order],
+        'names_sorted_ids': player_ids[order],
+        'team_names': np.array(team_names, dtype=str),
+        'season_team_ptr': np.array(season_team_ptr, dtype=np.int64),
+        'season_team_ids': np.array(season_team_ids, dtype=np.int64),
+        'season_team_name': np.array(season_team_name, dtype=np.int32),
+        'roster_ptr': np.array(roster_ptr, dtype=np.int64),
+        'roster_players': np.array(roster_players, dtype=np.int64),
+        'season_player_ptr': np.array(season_player_ptr, dtype=np.int64),
+        'season_player_ids': np.array(season_player_ids, dtype=np.int64),
+        'season_player_team': np.array(season_player_team, dtype=np.int64),
+    }
+
+    os.makedirs(dst, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(dst, f'{name}.npy'), array)
+
+
+class PlayerIndex:
+    """
+    Read-only, memory-mapped view of an index written by `buildIndex`.
+
+    Parameters
+    ----------
+        path : str (default: 'data/index')
+            Directory containing the index arrays.
+
+    Examples
+    --------
+        >>> index = PlayerIndex('data/index')
+        >>> index.team(8471233, '2010-2011')
+        >>> index.roster(10, 20192020)
+    """
+
+    def __init__(self, path='data/index'):
+        for name in _ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r'))
+
+    @staticmethod
+    def _find(array, value):
+        # position of `value` in the sorted `array`, or -1 if it is missing
+        i = int(np.searchsorted(array, value))
+        if i < len(array) and array[i] == value:
+            return i
+        return -1
+
+    def _season(self, season):
+        i = self._find(self.seasons, seasonKey(season))
+        if i < 0:
+            raise KeyError(f'season {season} is not in the index')
+        return i
+
+    def playerName(self, player_id):
+        """
+        Returns the full name of player `player_id`.
+        """
+        i = self._find(self.player_ids, player_id)
+        if i < 0:
+            raise KeyError(player_id)
+        return str(self.player_names[i])
+
+    def playerId(self, name):
+        """
+        Returns the id of the player named `name` (e.g. 'Auston Matthews').
+        """
+        i = self._find(self.names_sorted, name)
+        if i < 0:
+            raise KeyError(name)
+        return int(self.names_sorted_ids[i])
+
+    def team(self, player_id, season):
+        """
+        Returns the id of the team player `player_id` was on in `season`.
+        """
+        s = self._season(season)
+        start, stop = self.season_player_ptr[s], self.season_player_ptr[s + 1]
+        i = self._find(self.season_player_ids[start:stop], player_id)
+        if i < 0:
+            raise KeyError(f'player {player_id} is not on a roster in {season}')
+        return int(self.season_player_team[start + i])
+
+    def playerTeams(self, player_ids, season):
+        """
+        Vectorized `team`: returns the team id of each player in `player_ids` in
+        `season`, with -1 for players that are not on a roster that season.
+        """
+        s = self._season(season)
+        start, stop = self.season_player_ptr[s], self.season_player_ptr[s + 1]
+        ids = self.season_player_ids[start:stop]
+        player_ids = np.asarray(player_ids)
+        if not len(ids):
+            return np.full(player_ids.shape, -1)
+
+        i = np.minimum(np.searchsorted(ids, player_ids), len(ids) - 1)
+        return np.where(ids[i] == player_ids, self.season_player_team[start:stop][i], -1)
+
+    def teams(self, season):
+        """
+        Returns the ids of every team in `season`.
+        """
+        s = self._season(season)
+        return np.array(self.season_team_ids[self.season_team_ptr[s]:self.season_team_ptr[s + 1]])
+
+    def _seasonTeam(self, team_id, season):
+        s = self._season(season)
+        start, stop = self.season_team_ptr[s], self.season_team_ptr[s + 1]
+        i = self._find(self.season_team_ids[start:stop], team_id)
+        if i < 0:
+            raise KeyError(f'team {team_id} is not in season {season}')
+        return start + i
+
+    def roster(self, team_id, season):
+        """
+        Returns the (sorted) ids of the players on team `team_id` in `season`.
+        """
+        j = self._seasonTeam(team_id, season)
+        return np.array(self.roster_players[self.roster_ptr[j]:self.roster_ptr[j + 1]])
+
+    def teamName(self, team_id, season):
+        """
+        Returns the name of team `team_id` in `season`.
+        """
+        return str(self.team_names[self.season_team_name[self._seasonTeam(team_id, season)]])
+
+    def teamId(self, name, season):
+        """
+        Returns the id of the team named `name` in `season`.
+        """
+        s = self._season(season)
+        start, stop = self.season_team_ptr[s], self.season_team_ptr[s + 1]
+        name_id = self._find(self.team_names, name)
+        matches = np.flatnonzero(self.season_team_name[start:stop] == name_id)
+        if name_id < 0 or not matches.size:
+            raise KeyError(f'no team named {name!r} in season {season}')
+        return int(self.season_team_ids[start + matches[0]])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Build the cross-season player/team index from the lookup pickles.')
+    parser.add_argument('--src', default='data/basic')
+    parser.add_argument('--dst', default='data/index')
+    args = parser.parse_args()
+
+    buildIndex(args.src, args.dst)
@@ -0,0 +1,197 @@
+# rate_limit.py
+import asyncio
+import random
+import threading
+import time
+
+import requests
+
+import metrics
+from metrics import endpointKey
+
+
+# status codes worth retrying; 429 and 503 also mean the API wants us to slow down
+RETRY_STATUS = {429, 500, 502, 503, 504}
+THROTTLE_STATUS = {429, 503}
+
+
+class TokenBucket:
+    """
+    Token bucket allowing `rate` requests per second with bursts of up to
+    `burst` requests. Safe to share between threads; `aacquire` waits without
+    blocking the event loop.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1, rate))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        # take a token, returning how long the caller has to wait for it
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        delay = self._reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def aacquire(self):
+        delay = self._reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class RateLimiter:
+    """
+    Shared, adaptive rate limiter with retries for NHL API requests.
+
+    Every request takes a token from a `TokenBucket`. Requests that time out,
+    fail to connect or get a retryable status (429/5xx) are retried with
+    exponential backoff and full jitter, honouring Retry-After when given.
+    The rate adapts to the API: it is halved when the API pushes back
+    (429/503) and grows again slowly while requests succeed.
+
+    Parameters
+    ----------
+        rate : float (default: 50)
+            Initial requests per second.
+
+        max_rate : float (default: 200)
+            Upper bound for the adapted rate.
+
+        min_rate : float (default: 1)
+            Lower bound for the adapted rate.
+
+        retries : int (default: 5)
+            Maximum number of retries per request.
+
+        backoff : float (default: 0.5)
+            Base delay (seconds) of the exponential backoff.
+
+        max_backoff : float (default: 30)
+            Upper bound for a single backoff delay.
+    """
+
+    def __init__(self, rate=50, max_rate=200, min_rate=1, retries=5, backoff=0.5,
+                 max_backoff=30):
+        self.bucket = TokenBucket(rate, burst=max(1, rate))
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._last_decrease = 0.0
+
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+    def _adapt(self, throttled):
+        with self._lock:
+            if throttled:
+                # multiplicative decrease, at most once a second so that a burst
+                # of concurrent rejections only counts once ...
+                now = time.monotonic()
+                if now - self._last_decrease < 1:
+                    return
+                self._last_decrease = now
+                rate = max(self.min_rate, self.bucket.rate / 2)
+            else:
+                # ... additive increase (about +1 request/s per second of successes)
+                rate = min(self.max_rate, self.bucket.rate + 1 / max(1, self.bucket.rate))
+            self.bucket.rate = rate
+            self.bucket.burst = max(1.0, rate)
+
+    def _record(self, endpoint, **counts):
+        key = endpointKey(endpoint)
+        with self._lock:
+            stats = self._stats.setdefault(key, {'requests': 0, 'retries': 0, 'throttled': 0,
+                                                 'failures': 0, 'seconds': 0.0})
+            for name, value in counts.items():
+                stats[name] += value
+
+    def delay(self, attempt, response=None):
+        """
+        Seconds to wait before retry number `attempt` (starting at 0).
+        """
+        if response is not None and response.headers.get('Retry-After', '').isdigit():
+            return float(response.headers['Retry-After'])
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+    def request(self, send, endpoint):
+        """
+        Calls `send()` (which makes the HTTP request and returns a
+        `requests.Response`) under the rate limit, retrying as described above.
+
+        Returns the final response; if every attempt raised, the last exception
+        is raised.
+        """
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            start = time.perf_counter()
+            try:
+                response = send()
+            except (requests.Timeout, requests.ConnectionError):
+                seconds = time.perf_counter() - start
+                self._record(endpoint, requests=1, seconds=seconds)
+                if metrics.ENABLED:
+                    metrics.REGISTRY.request(endpoint, seconds, 0)
+                if attempt == self.retries:
+                    self._failed(endpoint)
+                    raise
+                self._retry(endpoint)
+                time.sleep(self.delay(attempt))
+                continue
+
+            seconds = time.perf_counter() - start
+            self._record(endpoint, requests=1, seconds=seconds)
+            if metrics.ENABLED:
+                metrics.REGISTRY.request(endpoint, seconds, len(response.content))
+            throttled = response.status_code in THROTTLE_STATUS
+            self._adapt(throttled)
+            if throttled:
+                self._record(endpoint, throttled=1)
+
+            if response.status_code not in RETRY_STATUS:
+                return response
+            if attempt == self.retries:
+                self._failed(endpoint)
+                return response
+
+            self._retry(endpoint)
+            time.sleep(self.delay(attempt, response))
+
+    def _retry(self, endpoint):
+        self._record(endpoint, retries=1)
+        if metrics.ENABLED:
+            metrics.REGISTRY.retry(endpoint)
+
+    def _failed(self, endpoint):
+        self._record(endpoint, failures=1)
+        if metrics.ENABLED:
+            metrics.REGISTRY.failure(endpoint)
+
+    def stats(self):
+        """
+        Returns per-endpoint statistics: number of requests (including
+        retries), retries, throttled responses, failures and mean latency, plus
+        the current rate under the key 'rate'.
+        """
+        with self._lock:
+            stats = {key: dict(value, mean_seconds=value['seconds'] / max(1, value['requests']))
+                     for key, value in self._stats.items()}
+            stats['rate'] = self.bucket.rate
+        return stats
@@ -0,0 +1,219 @@
+# response_cache.py
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from json_decode import dumps, loads
+
+
+class CacheMiss(KeyError):
+    """
+    Raised in offline mode when a response is not in the cache.
+
+    Subclasses KeyError so that callers which already skip games with missing
+    data (e.g. `time_series.getTeamBoxScores`) treat it the same way.
+    """
+
+
+class ResponseCache:
+    """
+    Persistent, content-addressed on-disk cache of NHL API responses.
+
+    Each response is stored in its own file, named by the sha256 of the
+    endpoint and its (sorted) query string. Responses that can no longer change
+    (finished games, past seasons) are kept forever; everything else expires
+    after `ttl` seconds. When the cache grows beyond `max_bytes`, the least
+    recently used entries are evicted.
+
+    Parameters
+    ----------
+        path : str
+            Directory to store cached responses in; created if needed.
+
+        max_bytes : int (default: 2 GB)
+            Size bound for the cache directory.
+
+        ttl : float (default: 3600)
+            Seconds before a response for current/in-progress data expires.
+
+        offline : bool (default: False)
+            If True, never touch the network. Expired entries are still served,
+            and a request that is not cached raises `CacheMiss`.
+
+    Attributes
+    ----------
+        hits, misses : int
+            Number of lookups served from / not found in the cache.
+    """
+
+    def __init__(self, path, max_bytes=2 * 1024**3, ttl=3600, offline=False):
+        self.path = os.path.expanduser(path)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.offline = offline
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+        self._size = sum(entry.stat().st_size for entry in self._entries())
+
+    @staticmethod
+    def key(endpoint):
+        """
+        Returns the cache key of `endpoint`; query parameters are sorted, so
+        '/schedule?teamId=1&season=20192020' and
+        '/schedule?season=20192020&teamId=1' share an entry.
+        """
+        parts = urlsplit(endpoint)
+        query = urlencode(sorted(parse_qsl(parts.query)))
+        canonical = parts.path + ('?' + query if query else '')
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def get(self, endpoint, raw=False):
+        """
+        Returns the cached response for `endpoint` (decoded, or the json bytes
+        if `raw`), or None if it is not cached (or has expired).
+        """
+        filename = self._filename(self.key(endpoint))
+        try:
+            with open(filename, 'rb') as f:
+                expires = json.loads(f.readline())
+                if expires is not None and expires < time.time() and not self.offline:
+                    raise FileNotFoundError
+                data = f.read()
+                if not raw:
+                    data = loads(data)
+        except (FileNotFoundError, ValueError):
+            with self._lock:
+                self.misses += 1
+            if self.offline:
+                raise CacheMiss(endpoint)
+            return None
+
+        # mark the entry as recently used for eviction purposes
+        try:
+            os.utime(filename)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, endpoint, data, immutable=False):
+        """
+        Stores `data` (json-like, or the json response body as bytes) as the
+        response for `endpoint`. Immutable responses never expire; all others
+        expire after `ttl` seconds.
+        """
+        expires = None if immutable else time.time() + self.ttl
+        if not isinstance(data, bytes):
+            data = dumps(data)
+        body = json.dumps(expires).encode() + b'\n' + data
+
+        filename = self._filename(self.key(endpoint))
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+        # write to a temporary file first so readers never see a partial entry
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(filename))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(body)
+        try:
+            old_size = os.path.getsize(filename)
+        except FileNotFoundError:
+            old_size = 0
+        os.replace(tmp, filename)
+
+        with self._lock:
+            self._size += len(body) - old_size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def clear(self):
+        """
+        Removes every entry from the cache.
+        """
+        with self._lock:
+            for entry in self._entries():
+                os.remove(entry.path)
+            self._size = 0
+
+    def stats(self):
+        """
+        Returns a dictionary of the cache's hit/miss counters and size in bytes.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'bytes': self._size}
+
+    def _filename(self, key):
+        # shard by the first two hex characters to keep directories small
+        return os.path.join(self.path, key[:2], key)
+
+    def _entries(self):
+        for shard in os.scandir(self.path):
+            if shard.is_dir():
+                for entry in os.scandir(shard.path):
+                    if entry.is_file():
+                        yield entry
+
+    def _evict(self):
+        # drop least recently used entries until we are back under 90% of the bound
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        target = 0.9 * self.max_bytes
+        for entry in entries:
+            if self._size <= target:
+                break
+            size = entry.stat().st_size
+            os.remove(entry.path)
+            self._size -= size
+
+
+_BOXSCORE = re.compile(r'^/game/(\d{4})\d+/boxscore')
+_SEASON = re.compile(r'[?&]season=(\d{8})')
+
+
+def isImmutable(endpoint, data, current_season):
+    """
+    Decides whether the response `data` for `endpoint` can be cached forever.
+
+    Parameters
+    ----------
+        endpoint : str
+            Endpoint (with query string) the data was requested from.
+
+        data : dict (json-like) or bytes
+            Response, decoded or not (it is only decoded if needed).
+
+        current_season : callable
+            Returns the current season id ('YYYYYYYY'); only called for
+            endpoints that are tied to a season.
+
+    Returns
+    -------
+        immutable : bool
+            True for schedules in which every game is Final, and for box scores,
+            rosters and player stats from past seasons.
+    """
+    if endpoint.startswith('/schedule'):
+        if isinstance(data, bytes):
+            data = loads(data)
+        games = [game for date in data.get('dates', []) for game in date['games']]
+        return bool(games) and all(game['status']['detailedState'] == 'Final'
+                                   for game in games)
+
+    match = _BOXSCORE.match(endpoint)
+    if match:
+        year = int(match.group(1))
+        return f'{year}{year + 1}' < current_season()
+
+    if endpoint.startswith('/people/') or endpoint.startswith('/teams/'):
+        match = _SEASON.search(endpoint)
+        return match is not None and match.group(1) < current_season()
+
+    return False
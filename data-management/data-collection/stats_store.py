@@ -0,0 +1,206 @@
+# stats_store.py
+"""
+Columnar store for the per-season skater/goalie stats tables.
+
+The pickled DataFrames under data/stats/<season>/SingleSeason/ are converted
+into one directory per table kind, holding one memory-mapped NumPy file per
+column:
+
+    <store>/<kind>/
+        meta.json           column names, dtypes and partition information
+        season.npy          season partition key of each row (e.g. 19801981)
+        player_id.npy       NHL API player id of each row
+        <column>.npy        one file per stat column
+
+Rows are sorted by season and then player_id, and meta.json records the row
+range of each season, so a season-range filter reads a single contiguous
+slice of each requested column and nothing else.
+"""
+import argparse
+import glob
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+
+KINDS = ('skater_stats', 'goalie_stats')
+
+_TIME = re.compile(r'^\d+:\d\d$')
+
+
+def toiToSeconds(values):
+    """
+    Converts an array of 'MM:SS' strings (minutes may exceed 59) to integer
+    seconds in one vectorized pass; empty strings become 0.
+    """
+    values = np.asarray(values, dtype=str)
+    if not values.size:
+        return np.zeros(0, dtype=np.int64)
+    values = np.where(values == '', '0:00', values)
+    parts = np.char.partition(values, ':')
+    return parts[:, 0].astype(np.int64) * 60 + parts[:, 2].astype(np.int64)
+
+
+def _seasonKey(directory):
+    # '1980-1981' -> 19801981
+    return int(os.path.basename(directory).replace('-', ''))
+
+
+def _columnArray(series):
+    """
+    Returns (array, encoding) for one DataFrame column. Numeric columns are
+    kept as they are, 'MM:SS' time columns are stored as integer seconds and
+    anything else as fixed-width unicode.
+    """
+    if series.dtype != object:
+        return series.to_numpy(), 'raw'
+
+    values = series.astype(str).to_numpy()
+    if values.size and all(_TIME.match(value) for value in values):
+        return toiToSeconds(values).astype(np.int32), 'seconds'
+
+    numeric = pd.to_numeric(series, errors='coerce')
+    if not numeric.isna().any():
+        return numeric.to_numpy(), 'raw'
+
+    return values.astype(str), 'raw'
+
+
+def convertStats(src='data/stats', dst='data/stats-columnar', kinds=KINDS):
+    """
+    Converts the pickled per-season stats DataFrames into the columnar store.
+
+    Parameters
+    ----------
+        src : str (default: 'data/stats')
+            Directory containing one <season>/SingleSeason/ directory per season.
+
+        dst : str (default: 'data/stats-columnar')
+            Directory to write the store to; existing tables are replaced.
+
+        kinds : tuple(str) (default: ('skater_stats', 'goalie_stats'))
+            Which tables to convert.
+    """
+    for kind in kinds:
+        frames = []
+        for filename in sorted(glob.glob(os.path.join(src, '*', 'SingleSeason', kind))):
+            frame = pd.read_pickle(filename).reset_index()
+            # the season directory is the partition key
+            frame['season'] = _seasonKey(os.path.dirname(os.path.dirname(filename)))
+            frames.append(frame)
+
+        if not frames:
+            continue
+
+        table = pd.concat(frames, ignore_index=True)
+        table = table.sort_values(['season', 'player_id'], kind='stable', ignore_index=True)
+
+        out = os.path.join(dst, kind)
+        os.makedirs(out, exist_ok=True)
+
+        meta = {'rows': len(table), 'columns': {}, 'partitions': {}}
+        for column in table.columns:
+            array, encoding = _columnArray(table[column])
+            np.save(os.path.join(out, f'{column}.npy'), array)
+            meta['columns'][column] = {'dtype': array.dtype.str, 'encoding': encoding}
+
+        seasons, starts, counts = np.unique(table['season'].to_numpy(), return_index=True,
+                                            return_counts=True)
+        meta['partitions'] = {str(season): [int(start), int(start + count)]
+                              for season, start, count in zip(seasons, starts, counts)}
+
+        with open(os.path.join(out, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+
+def loadStats(kind='skater_stats', columns=None, seasons=None, player_ids=None,
+              path='data/stats-columnar', as_frame=True):
+    """
+    Loads (part of) a stats table from the columnar store.
+
+    Only the requested columns are opened, and each is memory-mapped, so only
+    the rows of the requested seasons are ever read from disk.
+
+    Parameters
+    ----------
+        kind : str (default: 'skater_stats')
+            'skater_stats' or 'goalie_stats'.
+
+        columns : list(str) (default: None)
+            Columns to load; if None, all columns are loaded.
+
+        seasons : tuple(int, int) or list(int) (default: None)
+            Either an inclusive (first, last) range of season start years, e.g.
+            (2000, 2010), or a list of season keys such as [20002001, 20012002].
+            If None, every season is loaded.
+
+        player_ids : list(int) (default: None)
+            If given, only rows for these players are returned.
+
+        path : str (default: 'data/stats-columnar')
+            Location of the store (see `convertStats`).
+
+        as_frame : bool (default: True)
+            If True, return a DataFrame indexed by player_id (with a 'season'
+            column); otherwise return a dict of column name -> ndarray.
+
+    Returns
+    -------
+        stats : DataFrame or dict(str, ndarray)
+            Requested columns for the matching rows. Time columns (timeOnIce,
+            etc.) are in integer seconds.
+    """
+    table = os.path.join(path, kind)
+    with open(os.path.join(table, 'meta.json')) as f:
+        meta = json.load(f)
+
+    if columns is None:
+        columns = [col for col in meta['columns'] if col not in ('player_id', 'season')]
+    unknown = set(columns) - set(meta['columns'])
+    if unknown:
+        raise KeyError(f'unknown columns: {sorted(unknown)}')
+
+    # season predicate -> list of contiguous row slices
+    partitions = {int(season): bounds for season, bounds in meta['partitions'].items()}
+    if seasons is None:
+        keys = sorted(partitions)
+    elif isinstance(seasons, tuple):
+        first, last = seasons
+        keys = [key for key in sorted(partitions) if first <= key // 10000 <= last]
+    else:
+        keys = [int(key) for key in seasons if int(key) in partitions]
+    slices = [slice(*partitions[key]) for key in keys]
+
+    def read(column):
+        array = np.load(os.path.join(table, f'{column}.npy'), mmap_mode='r')
+        if not slices:
+            return np.asarray(array[:0])
+        return np.concatenate([array[s] for s in slices])
+
+    data = {'season': read('season'), 'player_id': read('player_id')}
+    if player_ids is not None:
+        mask = np.isin(data['player_id'], np.asarray(player_ids))
+        data = {key: values[mask] for key, values in data.items()}
+        data.update({column: read(column)[mask] for column in columns})
+    else:
+        data.update({column: read(column) for column in columns})
+
+    if not as_frame:
+        return data
+
+    frame = pd.DataFrame({column: data[column] for column in ['season'] + list(columns)},
+                         index=pd.Index(data['player_id'], name='player_id'))
+    return frame
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Convert the pickled per-season stats into the columnar store.')
+    parser.add_argument('--src', default='data/stats')
+    parser.add_argument('--dst', default='data/stats-columnar')
+    args = parser.parse_args()
+
+    convertStats(args.src, args.dst)
@@ -0,0 +1,317 @@
+# transport.py
+"""
+Transports send the HTTP requests of an `NHLClient`; swapping them lets the
+same extraction code run against the live API, a recording of it, or a local
+stand-in.
+
+    HTTPTransport       the live API, through a pooled `requests.Session`
+    RecordingTransport  another transport whose responses are appended to an archive
+    ReplayTransport     responses served from an archive, in memory
+    ReplayServer        an archive served over HTTP on localhost
+
+Archives are gzip files holding one record per response: a json header line
+({"url": ..., "status": ..., "length": ...}) followed by the raw body. Each
+recording session appends a new gzip member, so an archive can be extended by
+recording again; when a url is recorded more than once the last record wins.
+Records are keyed by the url's path and sorted query string. The host is
+ignored, so an archive recorded from the live API can be replayed from any
+host, but the base path is part of the key: replay under a base url ending in
+the recorded one's path (/api/v1, as `ReplayServer.base_url` does).
+
+    client = NHLClient(transport=RecordingTransport('season.nhl.gz'))
+    ...
+    client = NHLClient(transport=ReplayTransport('season.nhl.gz', latency=0.01))
+
+or, for the functions in nhlAPI, set NHL_API_RECORD / NHL_API_REPLAY (see
+`api_client.getClient`). The archive can also be served to other processes:
+
+    python transport.py season.nhl.gz --port 8000 --latency 0.01
+"""
+import argparse
+import gzip
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+
+# transient statuses are not recorded, so a replay never reproduces a throttled run
+_TRANSIENT = {429, 500, 502, 503, 504}
+
+_NOT_FOUND = json.dumps({'messageNumber': 10, 'message': 'Object not found'}).encode()
+
+
+class ReplayMiss(KeyError):
+    """
+    Raised by `ReplayTransport` for a url that is not in the archive.
+
+    Subclasses KeyError so that callers which already skip games with missing
+    data treat it the same way (as with `response_cache.CacheMiss`).
+    """
+
+
+def archiveKey(url):
+    """
+    Returns the archive key of `url`: its path and sorted query string, e.g.
+    'https://statsapi.web.nhl.com/api/v1/schedule?teamId=1&season=20192020'
+    -> '/api/v1/schedule?season=20192020&teamId=1'.
+    """
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query)))
+    return parts.path + ('?' + query if query else '')
+
+
+def readArchive(path):
+    """
+    Reads an archive into a dictionary {key: (status, body)}. A record cut
+    short (e.g. by an interrupted recording) ends the archive.
+    """
+    records = {}
+    with gzip.open(path, 'rb') as f:
+        try:
+            for header in f:
+                header = json.loads(header)
+                body = f.read(header['length'])
+                if len(body) < header['length']:
+                    break
+                records[header['url']] = (header['status'], body)
+        except (EOFError, ValueError):
+            pass
+    return records
+
+
+def _response(url, status, body):
+    response = requests.Response()
+    response.url = url
+    response.status_code = status
+    response.reason = 'OK' if status == 200 else ''
+    response.headers = CaseInsensitiveDict({'Content-Type': 'application/json',
+                                            'Content-Length': str(len(body))})
+    response.encoding = 'utf-8'
+    response._content = body
+    return response
+
+
+class HTTPTransport:
+    """
+    Sends requests over the network with a connection-pooled `requests.Session`.
+
+    Parameters
+    ----------
+        pool_size : int (default: 32)
+            Maximum number of connections kept open to the API host.
+    """
+
+    # requests go to the real API, so they need rate limiting
+    local = False
+
+    def __init__(self, pool_size=32):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def get(self, url, timeout=None):
+        return self.session.get(url, timeout=timeout)
+
+    def close(self):
+        self.session.close()
+
+
+class RecordingTransport:
+    """
+    Passes requests on to `transport` and appends every response (except
+    transient 429/5xx errors) to the archive at `path`.
+
+    Parameters
+    ----------
+        path : str
+            Archive to append to; created if needed.
+
+        transport : transport (default: None)
+            Transport that makes the requests; a new `HTTPTransport` if None.
+    """
+
+    def __init__(self, path, transport=None):
+        self.path = path
+        self.transport = transport if transport is not None else HTTPTransport()
+        self.local = self.transport.local
+        self.recorded = 0
+
+        self._lock = threading.Lock()
+        self._file = None
+
+    def get(self, url, timeout=None):
+        response = self.transport.get(url, timeout=timeout)
+        if response.status_code not in _TRANSIENT:
+            self.record(url, response.status_code, response.content)
+        return response
+
+    def record(self, url, status, body):
+        """
+        Appends a response to the archive.
+        """
+        header = json.dumps({'url': archiveKey(url), 'status': status, 'length': len(body)})
+        with self._lock:
+            if self._file is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._file = gzip.open(self.path, 'ab')
+            self._file.write(header.encode() + b'\n' + body)
+            self.recorded += 1
+
+    def flush(self):
+        """
+        Writes buffered records to disk; the archive stays open for appending.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def close(self):
+        self.flush()
+        self.transport.close()
+
+
+class ReplayTransport:
+    """
+    Serves responses from an archive held in memory, without touching the
+    network.
+
+    Parameters
+    ----------
+        path : str
+            Archive to replay.
+
+        latency : float (default: 0)
+            Seconds added to every response, to simulate the network.
+
+    Attributes
+    ----------
+        hits, misses : int
+            Number of requests found / not found in the archive.
+    """
+
+    local = True
+
+    def __init__(self, path, latency=0.0):
+        self.path = path
+        self.latency = latency
+        self.records = readArchive(path)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, url, timeout=None):
+        if self.latency:
+            time.sleep(self.latency)
+        record = self.records.get(archiveKey(url))
+        with self._lock:
+            if record is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if record is None:
+            raise ReplayMiss(url)
+        return _response(url, *record)
+
+    def close(self):
+        pass
+
+
+class ReplayServer:
+    """
+    Threaded HTTP server on localhost serving the responses of an archive, for
+    processes that cannot be handed a transport (notebooks, load tests). Urls
+    that are not in the archive get the API's 404 response.
+
+    Parameters
+    ----------
+        path : str
+            Archive to serve.
+
+        latency : float (default: 0)
+            Seconds added to every response.
+
+        port : int (default: 0)
+            Port to listen on; any free port if 0.
+
+    Attributes
+    ----------
+        base_url : str
+            Base url to pass to nhlAPI/time_series functions (set by `start`).
+    """
+
+    def __init__(self, path, latency=0.0, port=0):
+        self.replay = ReplayTransport(path)
+        self.latency = latency
+        self.port = port
+        self.base_url = None
+        self._server = None
+
+    def start(self):
+        records, latency = self.replay.records, self.latency
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep connections open, as the real API does
+            protocol_version = 'HTTP/1.1'
+            # headers and body go out in separate writes; with Nagle's algorithm
+            # the body waits for the client's delayed ack (~40 ms per request)
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                status, body = records.get(archiveKey(self.path), (404, _NOT_FOUND))
+                if latency:
+                    time.sleep(latency)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self._server.server_address[1]}/api/v1'
+        return self.base_url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a recorded archive of NHL API responses.')
+    parser.add_argument('archive')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds added to every response')
+    args = parser.parse_args()
+
+    server = ReplayServer(args.archive, latency=args.latency, port=args.port)
+    print(f'serving {len(server.replay.records)} responses at {server.start()}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,192 @@
+# events.py
+
+import json
+import time
+
+import numpy as np
+
+
+# eventTypeId of each event code; code 0 is used for event types not listed here
+EVENT_TYPES = ('OTHER', 'GAME_SCHEDULED', 'PERIOD_READY', 'PERIOD_START', 'FACEOFF',
+               'HIT', 'SHOT', 'MISSED_SHOT', 'BLOCKED_SHOT', 'GOAL', 'PENALTY', 'STOP',
+               'GIVEAWAY', 'TAKEAWAY', 'PERIOD_END', 'PERIOD_OFFICIAL', 'GAME_END',
+               'GAME_OFFICIAL', 'CHALLENGE', 'SHOOTOUT_COMPLETE', 'EARLY_INT_START',
+               'EARLY_INT_END', 'EMERGENCY_GOALTENDER', 'FAILED_SHOT_ATTEMPT')
+
+# playerType of each player role code; code 0 means no player in that slot
+PLAYER_ROLES = ('NONE', 'Winner', 'Loser', 'Shooter', 'Goalie', 'Hitter', 'Hittee',
+                'Scorer', 'Assist', 'Blocker', 'PenaltyOn', 'DrewBy', 'ServedBy',
+                'PlayerID', 'Unknown')
+
+# maximum number of players recorded per event (goals have up to four:
+# the scorer, two assists and the goalie)
+MAX_PLAYERS = 4
+
+_EVENT_CODES = {name: code for code, name in enumerate(EVENT_TYPES)}
+_ROLE_CODES = {name: code for code, name in enumerate(PLAYER_ROLES)}
+
+
+def eventDtype(max_players=MAX_PLAYERS):
+    """
+    Returns the structured dtype of an event table row.
+
+        event           -   event code (see EVENT_TYPES)
+        period          -   period number (4+ for overtime/shootout)
+        period_seconds  -   seconds elapsed in the period
+        x, y            -   location of the event; NaN if it has none
+        team_id         -   id of the team credited with the event; -1 if none
+        players         -   ids of the players involved; 0 for empty slots
+        roles           -   role code of each player (see PLAYER_ROLES)
+        home_goals      -   home team's score after the event
+        away_goals      -   away team's score after the event
+        penalty_minutes -   length of a penalty; 0 for other events
+        empty_net       -   whether a goal was scored into an empty net
+    """
+    return np.dtype([('event', np.int8), ('period', np.int8), ('period_seconds', np.int16),
+                     ('x', np.float32), ('y', np.float32), ('team_id', np.int32),
+                     ('players', np.int32, (max_players,)), ('roles', np.int8, (max_players,)),
+                     ('home_goals', np.int8), ('away_goals', np.int8),
+                     ('penalty_minutes', np.int8), ('empty_net', np.bool_)])
+
+
+class EventTable:
+    """
+    Play-by-play events of one game as a structured NumPy array.
+
+    Attributes
+    ----------
+        events : ndarray (structured; see `eventDtype`)
+            One row per entry of live_data['plays']['allPlays'], in order.
+
+        scoring : ndarray (int32)
+            Row indices of the goals (live_data['plays']['scoringPlays']).
+
+        penalties : ndarray (int32)
+            Row indices of the penalties (live_data['plays']['penaltyPlays']).
+    """
+
+    def __init__(self, events, scoring, penalties):
+        self.events = events
+        self.scoring = np.asarray(scoring, dtype=np.int32)
+        self.penalties = np.asarray(penalties, dtype=np.int32)
+
+    def __len__(self):
+        return self.events.size
+
+    def __getitem__(self, column):
+        return self.events[column]
+
+    def mask(self, *event_types):
+        """
+        Returns a boolean mask of the rows whose event type is one of
+        `event_types` (e.g. mask('SHOT', 'GOAL')).
+        """
+        return np.isin(self.events['event'], [_EVENT_CODES[name] for name in event_types])
+
+
+def _seconds(period_time):
+    # 'MM:SS' -> seconds
+    minutes, _, seconds = period_time.partition(':')
+    return int(minutes) * 60 + int(seconds)
+
+
+def parseEvents(live_data, max_players=MAX_PLAYERS):
+    """
+    Parses the play-by-play of a game feed into an `EventTable`.
+
+    Parameters
+    ----------
+        live_data : dict (json-like)
+            Either the live data of a game (as described in `nhlAPI.getLiveData`)
+            or the full feed containing it under 'liveData'.
+
+        max_players : int (default: 4)
+            Number of player slots per event; extra players are dropped.
+
+    Returns
+    -------
+        table : EventTable
+            The game's events.
+    """
+    if 'liveData' in live_data:
+        live_data = live_data['liveData']
+    plays = live_data['plays']
+
+    nan = float('nan')
+    empty_players = (0,) * max_players
+    rows = []
+    for play in plays['allPlays']:
+        about, result = play['about'], play['result']
+        coordinates = play.get('coordinates', {})
+
+        players, roles = empty_players, empty_players
+        if 'players' in play:
+            involved = play['players'][:max_players]
+            pad = (0,) * (max_players - len(involved))
+            players = tuple(player['player']['id'] for player in involved) + pad
+            roles = tuple(_ROLE_CODES.get(player['playerType'], _ROLE_CODES['Unknown'])
+                          for player in involved) + pad
+
+        rows.append((_EVENT_CODES.get(result['eventTypeId'], 0), about['period'],
+                     _seconds(about['periodTime']),
+                     coordinates.get('x', nan), coordinates.get('y', nan),
+                     play['team']['id'] if 'team' in play else -1,
+                     players, roles,
+                     about['goals']['home'], about['goals']['away'],
+                     result.get('penaltyMinutes', 0), result.get('emptyNet', False)))
+
+    events = np.array(rows, dtype=eventDtype(max_players))
+    return EventTable(events, plays.get('scoringPlays', []), plays.get('penaltyPlays', []))
+
+
+def benchmark(filename='liveData.json', games=1270, repeat=5):
+    """
+    Benchmarks the event table on the fixture feed `filename`.
+
+    Times parsing one feed into an EventTable, then compares a typical
+    season-level query (shots on goal per team and period) answered by walking
+    the play dictionaries of `games` copies of the feed against the same query
+    on the columns of their concatenated tables.
+
+    Returns
+    -------
+        timings : dict
+            Mean seconds per run of each step.
+    """
+    with open(filename) as f:
+        live_data = json.load(f)
+
+    def timed(func):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = func()
+        return (time.perf_counter() - start) / repeat, result
+
+    parse_time, table = timed(lambda: parseEvents(live_data))
+
+    season_plays = live_data['plays']['allPlays'] * games
+    season_events = np.concatenate([table.events] * games)
+
+    def dict_query():
+        counts = {}
+        for play in season_plays:
+            if play['result']['eventTypeId'] in ('SHOT', 'GOAL'):
+                key = (play['team']['id'], play['about']['period'])
+                counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def column_query():
+        shots = np.isin(season_events['event'], [_EVENT_CODES['SHOT'], _EVENT_CODES['GOAL']])
+        keys = season_events['team_id'][shots].astype(np.int64) * 16 + season_events['period'][shots]
+        return np.unique(keys, return_counts=True)
+
+    dict_time, _ = timed(dict_query)
+    column_time, _ = timed(column_query)
+
+    return {'events_per_game': len(table), 'parse_per_game': parse_time,
+            'season_dict_query': dict_time, 'season_column_query': column_time}
+
+
+if __name__ == '__main__':
+    for step, value in benchmark().items():
+        print(f'{step:>20}: {value}')
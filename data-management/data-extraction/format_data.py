@@ -1,38 +1,225 @@
 # format_data.py
 
+import numpy as np
+import pandas as pd
 
+import os
+os.chdir('../data-collection')
+from api_client import getClient
+from stats_store import toiToSeconds
+os.chdir('../data-extraction')
 
-def getPlayerGameStats(game_id, player_id=None):
-
-    # get box score of completed game via
-        # /game/{game_id}/boxscore
-
-    # find stats via
-    # ['teams']
-    #     ['home'] / ['away']
-    #         ['players']
-    #             ['player_id']
-    #                 ['stats']['skaterStats']
-    #                     ['timeOnIce']
-    #                     ['assists']
-    #                     ['goals']
-    #                     ['shots']
-    #                     ['hits']
-    #                     ['powerPlayGoals']
-    #                     ['powerPlayAssists']
-    #                     ['penaltyMinutes']
-    #                     ['faceOffPct']
-    #                     ['faceOffWins']
-    #                     ['faceoffTaken']
-    #                     ['takeaways']
-    #                     ['giveaways']
-    #                     ['shortHandedGoals']
-    #                     ['shortHandedAssists']
-    #                     ['blocked']
-    #                     ['plusMinus']
-    #                     ['evenTimeOnIce']
-    #                     ['powerPlayTimeOnIce']
-    #                     ['shortHandedTimeOnIce']
-
-
-    pass
+
+# skaterStats fields, with the dtype of their column; time on ice fields are
+# 'MM:SS' strings in the API and are converted to integer seconds
+SKATER_STATS = {
+    'timeOnIce': np.int32,
+    'assists': np.int16,
+    'goals': np.int16,
+    'shots': np.int16,
+    'hits': np.int16,
+    'powerPlayGoals': np.int16,
+    'powerPlayAssists': np.int16,
+    'penaltyMinutes': np.int16,
+    'faceOffPct': np.float32,
+    'faceOffWins': np.int16,
+    'faceoffTaken': np.int16,
+    'takeaways': np.int16,
+    'giveaways': np.int16,
+    'shortHandedGoals': np.int16,
+    'shortHandedAssists': np.int16,
+    'blocked': np.int16,
+    'plusMinus': np.int16,
+    'evenTimeOnIce': np.int32,
+    'powerPlayTimeOnIce': np.int32,
+    'shortHandedTimeOnIce': np.int32,
+}
+
+# goalieStats fields, as above; 'decision' is 'W', 'L', 'O' or '' (no decision)
+GOALIE_STATS = {
+    'timeOnIce': np.int32,
+    'assists': np.int16,
+    'goals': np.int16,
+    'pim': np.int16,
+    'shots': np.int16,
+    'saves': np.int16,
+    'powerPlaySaves': np.int16,
+    'shortHandedSaves': np.int16,
+    'evenSaves': np.int16,
+    'shortHandedShotsAgainst': np.int16,
+    'evenShotsAgainst': np.int16,
+    'powerPlayShotsAgainst': np.int16,
+    'decision': str,
+    'savePercentage': np.float32,
+    'powerPlaySavePercentage': np.float32,
+    'shortHandedSavePercentage': np.float32,
+    'evenStrengthSavePercentage': np.float32,
+}
+
+_KEYS = ('game_id', 'team_id', 'player_id', 'home')
+
+
+def _missing(dtype):
+    # value used when a field is absent (e.g. faceOffPct for a player with no faceoffs)
+    if dtype is str:
+        return ''
+    return np.nan if np.dtype(dtype).kind == 'f' else 0
+
+
+def _table(rows, fields):
+    """
+    Builds a typed DataFrame from rows of (game_id, team_id, player_id, home, *fields).
+    """
+    columns = list(zip(*rows)) if rows else [()] * (len(_KEYS) + len(fields))
+    data = {'game_id': np.array(columns[0], dtype=np.int64),
+            'team_id': np.array(columns[1], dtype=np.int32),
+            'player_id': np.array(columns[2], dtype=np.int32),
+            'home': np.array(columns[3], dtype=bool)}
+
+    for values, (field, dtype) in zip(columns[len(_KEYS):], fields.items()):
+        if field.endswith('imeOnIce'):
+            data[field] = toiToSeconds(values).astype(dtype)
+        else:
+            data[field] = np.array(values, dtype=dtype)
+
+    return pd.DataFrame(data)
+
+
+def parseBoxScorePlayers(game_id, boxscore):
+    """
+    Extracts every player's stats from one game's boxscore.
+
+    Parameters
+    ----------
+        game_id : int
+            NHL API game_id of the game.
+
+        boxscore : dict (json-like)
+            Response of /game/{game_id}/boxscore (or liveData['boxscore']).
+
+    Returns
+    -------
+        skaters : list(tuples)
+            One row per skater that played: (game_id, team_id, player_id, home,
+            *SKATER_STATS fields).
+
+        goalies : list(tuples)
+            One row per goalie that played, with the GOALIE_STATS fields.
+    """
+    skaters, goalies = [], []
+    for side in ('home', 'away'):
+        team = boxscore['teams'][side]
+        team_id = team['team']['id']
+        for player in team['players'].values():
+            stats = player['stats']
+            key = (game_id, team_id, player['person']['id'], side == 'home')
+            # scratched players have no stats
+            if 'skaterStats' in stats:
+                stats = stats['skaterStats']
+                skaters.append(key + tuple(stats.get(field, _missing(dtype))
+                                           for field, dtype in SKATER_STATS.items()))
+            elif 'goalieStats' in stats:
+                stats = stats['goalieStats']
+                goalies.append(key + tuple(stats.get(field, _missing(dtype))
+                                           for field, dtype in GOALIE_STATS.items()))
+
+    return skaters, goalies
+
+
+def iterPlayerGameStats(game_ids, chunk_size=100, max_workers=8,
+                        base_url='https://statsapi.web.nhl.com/api/v1'):
+    """
+    Streams player game stats for many games, `chunk_size` games at a time.
+
+    Boxscores for each chunk are requested concurrently and discarded once the
+    chunk is parsed, so memory use is bounded by the chunk size rather than by
+    the number of games.
+
+    Parameters
+    ----------
+        game_ids : iterable
+            NHL API game_ids of the (completed) games.
+
+        chunk_size : int (default: 100)
+            Number of games per yielded chunk.
+
+        max_workers : int (default: 8)
+            Number of boxscores requested at once.
+
+        base_url : str
+            URL to the NHL API base.
+
+    Yields
+    ------
+        skaters : DataFrame
+            One row per (game, skater); see `getPlayerGameStats`.
+
+        goalies : DataFrame
+            One row per (game, goalie).
+    """
+    client = getClient(base_url)
+    game_ids = list(game_ids)
+
+    for start in range(0, len(game_ids), chunk_size):
+        chunk = game_ids[start:start + chunk_size]
+        boxscores = client.get_many([f'/game/{game_id}/boxscore' for game_id in chunk],
+                                    max_workers=max_workers)
+
+        skaters, goalies = [], []
+        for game_id, boxscore in zip(chunk, boxscores):
+            try:
+                game_skaters, game_goalies = parseBoxScorePlayers(game_id, boxscore)
+            except KeyError:
+                print(f'game_id: {game_id} failed')
+                continue
+            skaters.extend(game_skaters)
+            goalies.extend(game_goalies)
+
+        yield _table(skaters, SKATER_STATS), _table(goalies, GOALIE_STATS)
+
+
+def getPlayerGameStats(game_ids, player_id=None, chunk_size=100, max_workers=8,
+                       base_url='https://statsapi.web.nhl.com/api/v1'):
+    """
+    Gathers per-game player stats from the boxscores of completed games.
+
+    Parameters
+    ----------
+        game_ids : int or iterable
+            NHL API game_id(s) of the games.
+
+        player_id : int or list(int) (default: None)
+            If given, only rows for these player(s) are kept.
+
+        chunk_size, max_workers, base_url
+            See `iterPlayerGameStats`.
+
+    Returns
+    -------
+        skaters : DataFrame
+            Long-format table with one row per (game, skater): game_id, team_id,
+            player_id, home, followed by the SKATER_STATS fields. Time on ice
+            fields are in seconds.
+
+        goalies : DataFrame
+            Same, with one row per (game, goalie) and the GOALIE_STATS fields.
+    """
+    if np.isscalar(game_ids):
+        game_ids = [game_ids]
+
+    skaters, goalies = [], []
+    for chunk_skaters, chunk_goalies in iterPlayerGameStats(game_ids, chunk_size=chunk_size,
+                                                            max_workers=max_workers,
+                                                            base_url=base_url):
+        if player_id is not None:
+            players = np.atleast_1d(player_id)
+            chunk_skaters = chunk_skaters[chunk_skaters['player_id'].isin(players)]
+            chunk_goalies = chunk_goalies[chunk_goalies['player_id'].isin(players)]
+        skaters.append(chunk_skaters)
+        goalies.append(chunk_goalies)
+
+    if not skaters:
+        return _table([], SKATER_STATS), _table([], GOALIE_STATS)
+
+    return (pd.concat(skaters, ignore_index=True),
+            pd.concat(goalies, ignore_index=True))
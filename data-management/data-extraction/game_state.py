@@ -0,0 +1,369 @@
+# game_state.py
+"""
+Second-by-second game state (score, manpower strength and empty nets)
+reconstructed from play-by-play event tables.
+
+Every game's timeline has one entry per second of game time, up to and
+including its last event (period p starts at (p - 1) * 1200 s; shootouts are
+left out), and the timelines of all games are concatenated with per-game
+offsets, as the events are in a `season_events.SeasonEvents` table.
+Everything is computed as interval arithmetic over the event columns of all
+games at once: goals and penalties become [start, end) intervals that are
+painted onto the timelines with difference arrays.
+
+Penalties:
+
+    2 min   minor; ended early by a power-play goal against the team
+    4 min   double minor (two minors back to back); a power-play goal ends
+            the current one
+    5 min   major; served in full. Majors given to both teams at the same
+            time offset each other and do not change the strength.
+    other   misconducts (10) and penalty shots (0) do not change the strength
+
+A team never has fewer than three skaters: penalties that would take it below
+three give the other team an extra skater instead, as in overtime (so a minor
+turns 3-on-3 into 4-on-3). Penalties that would take a team below three
+skaters in regulation are not delayed until an earlier one expires.
+
+Power-play goals are resolved in rounds. Each round handles the earliest
+not-yet-handled power-play goal of every game at once, so the number of
+rounds is the largest number of power-play goals in any one game.
+
+The feeds do not record goalie pulls. Empty-net spells are inferred from
+empty-net goals: the net counts as empty from the later of the last faceoff
+and the last shot the goalie faced before the goal (within the period) until
+the goal. The team with the empty net gets an extra skater over that spell.
+Pulls that do not end in an empty-net goal are not seen.
+
+    season = seasonEvents(season='20192020', archives=[...])
+    states = gameStates(season)
+    states.strength()[states.atEvents(season)]      # strength at every event
+"""
+import numpy as np
+
+from events import PLAYER_ROLES, _EVENT_CODES
+
+
+PERIOD_SECONDS = 1200
+
+_GOAL = _EVENT_CODES['GOAL']
+_SHOT = _EVENT_CODES['SHOT']
+_PENALTY = _EVENT_CODES['PENALTY']
+_FACEOFF = _EVENT_CODES['FACEOFF']
+_GOALIE = PLAYER_ROLES.index('Goalie')
+
+# seconds per game in the flat keys used to search events of many games at once
+_KEY = 1 << 20
+
+
+def overtimeSkaters(game_pk):
+    """
+    Returns the skaters per side at even strength in regular season overtime
+    for each game: 3 since 2015-2016, 4 from 1999-2000, 5 before.
+    """
+    year = np.asarray(game_pk, dtype=np.int64) // 1000000
+    return np.select([year >= 2015, year >= 1999], [3, 4], 5)
+
+
+class GameStates:
+    """
+    Per-second game state of many games.
+
+    Attributes
+    ----------
+        game_pk : ndarray (int64)
+            Game ids, in the order of the events table the states were built
+            from.
+
+        offsets : ndarray (int64)
+            Second s of game i is entry offsets[i] + s of the arrays below.
+
+        home_goals, away_goals : ndarray (int16)
+            Score at each second.
+
+        home_skaters, away_skaters : ndarray (int8)
+            Skaters on the ice (an extra attacker included) at each second.
+
+        home_empty_net, away_empty_net : ndarray (bool)
+            Whether the team's net is empty at each second.
+    """
+
+    def __init__(self, game_pk, offsets, home_goals, away_goals, home_skaters, away_skaters,
+                 home_empty_net, away_empty_net):
+        self.game_pk = game_pk
+        self.offsets = offsets
+        self.home_goals = home_goals
+        self.away_goals = away_goals
+        self.home_skaters = home_skaters
+        self.away_skaters = away_skaters
+        self.home_empty_net = home_empty_net
+        self.away_empty_net = away_empty_net
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def gameIndex(self):
+        """
+        Returns the game (row of `game_pk`) of each second.
+        """
+        return np.repeat(np.arange(self.game_pk.size), np.diff(self.offsets))
+
+    def scoreDiff(self):
+        """
+        Returns the home team's lead at each second.
+        """
+        return self.home_goals.astype(np.int16) - self.away_goals
+
+    def strength(self):
+        """
+        Returns the strength at each second from the home team's point of view,
+        e.g. '5v5', '5v4' (home power play), '6v5' (home extra attacker).
+        """
+        labels = np.array([f'{home}v{away}' for home in range(10) for away in range(10)])
+        return labels[self.home_skaters.astype(np.intp) * 10 + self.away_skaters]
+
+    def atEvents(self, season):
+        """
+        Returns the index (into the per-second arrays) of the state every event
+        of `season`, the `SeasonEvents` the states were built from, happened
+        in: the second before the event, as the state at a goal's own second
+        already counts the goal (and not the minor a power-play goal ended).
+        Events at the first second of a period get that second.
+        """
+        game = season.gameIndex()
+        period_seconds = season.columns['period_seconds']
+        seconds = _gameSeconds(season.columns['period'], period_seconds)
+        seconds = np.where(period_seconds > 0, seconds - 1, seconds)
+        length = np.diff(self.offsets)
+        return self.offsets[game] + np.clip(seconds, 0, np.maximum(length[game] - 1, 0))
+
+    def game(self, game_pk):
+        """
+        Returns the states of game `game_pk` as a dictionary of per-second arrays.
+        """
+        i = np.flatnonzero(self.game_pk == int(game_pk))
+        if not i.size:
+            raise KeyError(game_pk)
+        start, stop = self.offsets[i[0]], self.offsets[i[0] + 1]
+        return {name: getattr(self, name)[start:stop]
+                for name in ('home_goals', 'away_goals', 'home_skaters', 'away_skaters',
+                             'home_empty_net', 'away_empty_net')}
+
+
+def _gameSeconds(period, period_seconds):
+    return (period.astype(np.int64) - 1) * PERIOD_SECONDS + period_seconds
+
+
+def _paint(game, start, end, value, offsets, dtype=np.int16):
+    # sums `value` over [start, end) of each game's timeline (clipped to the game)
+    length = np.diff(offsets)
+    start = np.clip(start, 0, length[game])
+    end = np.clip(end, start, length[game])
+    diff = np.zeros(int(offsets[-1]) + 1, dtype=np.int64)
+    np.add.at(diff, offsets[game] + start, value)
+    np.add.at(diff, offsets[game] + end, -np.asarray(value))
+    return np.cumsum(diff[:-1]).astype(dtype)
+
+
+def _skaters(base, home_penalties, away_penalties):
+    # skaters per side from the penalties being served, never below three
+    home = base - home_penalties
+    away = base - away_penalties
+    home_short = np.clip(3 - home, 0, None)
+    away_short = np.clip(3 - away, 0, None)
+    return (np.minimum(np.maximum(home, 3) + away_short, 5),
+            np.minimum(np.maximum(away, 3) + home_short, 5))
+
+
+def _lastBefore(keys, targets, strict):
+    # position of the last entry of the sorted `keys` before (or at) each target; -1 if none
+    return np.searchsorted(keys, targets, side='left' if strict else 'right') - 1
+
+
+def gameStates(season):
+    """
+    Reconstructs the per-second game state of every game in `season`.
+
+    Parameters
+    ----------
+        season : SeasonEvents
+            Events of the games (see season_events.py); a single game's
+            `EventTable` can be wrapped with `SeasonEvents.fromTables`.
+
+    Returns
+    -------
+        states : GameStates
+            Score, skaters and empty nets at every second of every game.
+    """
+    columns = season.columns
+    n_games = season.n_games
+    game = season.gameIndex()
+    playoff = (season.game_pk // 10000) % 100 == 3
+
+    period = columns['period'].astype(np.int64)
+    seconds = _gameSeconds(period, columns['period_seconds'])
+    event = columns['event']
+    home = columns['team_id'] == season.home_id[game]
+
+    # shootouts (period 5 of a regular season game) are not game time
+    keep = playoff[game] | (period < 5)
+
+    # a game's timeline runs up to and including its last event (the final
+    # whistle, or an overtime winner)
+    length = np.zeros(n_games, dtype=np.int64)
+    np.maximum.at(length, game[keep], seconds[keep] + 1)
+    offsets = np.concatenate([[0], np.cumsum(length)]).astype(np.int64)
+    timeline_game = np.repeat(np.arange(n_games), length)
+    timeline_seconds = np.arange(offsets[-1]) - offsets[timeline_game]
+
+    # even strength skaters: five, fewer in regular season overtime
+    last_period = np.zeros(n_games, dtype=np.int64)
+    np.maximum.at(last_period, game[keep], period[keep])
+    overtime = ((timeline_seconds >= 3 * PERIOD_SECONDS) & (last_period[timeline_game] > 3)
+                & ~playoff[timeline_game])
+    base = np.where(overtime, overtimeSkaters(season.game_pk)[timeline_game], 5).astype(np.int16)
+
+    # score
+    goals = np.flatnonzero(keep & (event == _GOAL))
+    goal_game, goal_seconds, goal_home = game[goals], seconds[goals], home[goals]
+    end = length[goal_game]
+    home_goals = _paint(goal_game, goal_seconds, end, goal_home.astype(np.int64), offsets)
+    away_goals = _paint(goal_game, goal_seconds, end, (~goal_home).astype(np.int64), offsets)
+
+    # penalties as [start, end) segments; a double minor is two segments, the
+    # second one starting when the first ends (`follow`)
+    minutes = columns['penalty_minutes']
+    penalties = np.flatnonzero(keep & (event == _PENALTY) & np.isin(minutes, (2, 4, 5)))
+    penalties = penalties[~_offsetting(game[penalties], seconds[penalties], home[penalties],
+                                       minutes[penalties])]
+    double = minutes[penalties] == 4
+    n_first = penalties.size
+    seg_game = np.concatenate([game[penalties], game[penalties[double]]])
+    seg_home = np.concatenate([home[penalties], home[penalties[double]]])
+    seg_start = np.concatenate([seconds[penalties], seconds[penalties[double]] + 120])
+    seg_minor = np.concatenate([minutes[penalties] != 5, np.ones(double.sum(), dtype=bool)])
+    seg_end = seg_start + np.where(seg_minor, 120, 300)
+    follow = np.full(seg_game.size, -1)
+    follow[np.flatnonzero(double)] = n_first + np.arange(double.sum())
+
+    order = np.argsort(seg_game, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(order.size)
+    seg_game, seg_home, seg_start, seg_end, seg_minor = (
+        seg_game[order], seg_home[order], seg_start[order], seg_end[order], seg_minor[order])
+    follow = np.where(follow[order] >= 0, rank[np.maximum(follow[order], 0)], -1)
+    seg_ptr = np.searchsorted(seg_game, np.arange(n_games + 1))
+
+    # power-play goals end minors; each round settles the earliest unsettled
+    # power-play goal of every game
+    settled = np.full(n_games, -1, dtype=np.int64)
+    while True:
+        home_penalties = _paint(seg_game, seg_start, seg_end, seg_home.astype(np.int64), offsets)
+        away_penalties = _paint(seg_game, seg_start, seg_end, (~seg_home).astype(np.int64), offsets)
+        home_skaters, away_skaters = _skaters(base, home_penalties, away_penalties)
+
+        at = offsets[goal_game] + np.minimum(goal_seconds, np.maximum(length[goal_game] - 1, 0))
+        scorer = np.where(goal_home, home_skaters[at], away_skaters[at]) if at.size else at
+        other = np.where(goal_home, away_skaters[at], home_skaters[at]) if at.size else at
+        pending = np.flatnonzero((scorer > other) & (goal_seconds > settled[goal_game]))
+        if not pending.size:
+            break
+
+        # goals are in game order, so the first pending goal of each game comes first
+        _, first = np.unique(goal_game[pending], return_index=True)
+        chosen = pending[first]
+        g, t, scoring_home = goal_game[chosen], goal_seconds[chosen], goal_home[chosen]
+        settled[g] = t
+
+        # pair each chosen goal with the penalty segments of its game
+        counts = seg_ptr[g + 1] - seg_ptr[g]
+        pair_goal = np.repeat(np.arange(chosen.size), counts)
+        pair_segment = (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+                        + np.repeat(seg_ptr[g], counts))
+        t_pair = t[pair_goal]
+        valid = (seg_minor[pair_segment] & (seg_home[pair_segment] != scoring_home[pair_goal])
+                 & (seg_start[pair_segment] <= t_pair) & (t_pair < seg_end[pair_segment]))
+        pair_goal, pair_segment, t_pair = pair_goal[valid], pair_segment[valid], t_pair[valid]
+
+        # the minor closest to expiring is the one that ends
+        by_remaining = np.lexsort((seg_end[pair_segment] - t_pair, pair_goal))
+        _, first = np.unique(pair_goal[by_remaining], return_index=True)
+        ended, t_ended = pair_segment[by_remaining[first]], t_pair[by_remaining[first]]
+        seg_end[ended] = t_ended
+        following = follow[ended]
+        restart = following >= 0
+        seg_start[following[restart]] = t_ended[restart]
+        seg_end[following[restart]] = t_ended[restart] + 120
+
+    # empty nets, inferred from empty-net goals
+    home_empty_net = np.zeros(int(offsets[-1]), dtype=bool)
+    away_empty_net = np.zeros(int(offsets[-1]), dtype=bool)
+    empty = np.flatnonzero(keep & (event == _GOAL) & columns['empty_net'])
+    if empty.size:
+        start = _pullTimes(season, game, seconds, home, keep, empty)
+        empty_game, empty_seconds = game[empty], seconds[empty]
+        # the net that was empty is the one the goal went into
+        pulled_home = ~home[empty]
+        home_empty_net = _paint(empty_game[pulled_home], start[pulled_home],
+                                empty_seconds[pulled_home], 1, offsets) > 0
+        away_empty_net = _paint(empty_game[~pulled_home], start[~pulled_home],
+                                empty_seconds[~pulled_home], 1, offsets) > 0
+
+    return GameStates(season.game_pk, offsets, home_goals, away_goals,
+                      (home_skaters + home_empty_net).astype(np.int8),
+                      (away_skaters + away_empty_net).astype(np.int8),
+                      home_empty_net, away_empty_net)
+
+
+def _offsetting(game, seconds, home, minutes):
+    """
+    Marks majors given to both teams at the same time that offset each other
+    (as many per team as the other team got).
+    """
+    majors = np.flatnonzero(minutes == 5)
+    offset = np.zeros(game.size, dtype=bool)
+    if not majors.size:
+        return offset
+
+    key = (game[majors].astype(np.int64) * _KEY + seconds[majors]) * 2 + home[majors]
+    order = np.argsort(key, kind='stable')
+    key = key[order]
+    # rank of each major among the majors of its team at that time
+    group_start = np.searchsorted(key, key, side='left')
+    rank = np.arange(key.size) - group_start
+    same_time = key // 2
+    other_count = (np.searchsorted(key, (same_time * 2) + (1 - key % 2), side='right')
+                   - np.searchsorted(key, (same_time * 2) + (1 - key % 2), side='left'))
+    offset[majors[order]] = rank < other_count
+    return offset
+
+
+def _pullTimes(season, game, seconds, home, keep, goals):
+    """
+    Start of the empty-net spell ending at each empty-net goal in `goals`: the
+    later of the last faceoff and the last shot faced by the conceding team's
+    goalie before the goal, but not before the start of the period.
+    """
+    columns = season.columns
+    event = columns['event']
+    goal_key = game[goals].astype(np.int64) * _KEY + seconds[goals]
+    period_start = (columns['period'][goals].astype(np.int64) - 1) * PERIOD_SECONDS
+    start = period_start.copy()
+
+    faceoffs = np.flatnonzero(keep & (event == _FACEOFF))
+    faceoff_key = np.sort(game[faceoffs].astype(np.int64) * _KEY + seconds[faceoffs])
+    if faceoff_key.size:
+        i = _lastBefore(faceoff_key, goal_key, strict=False)
+        found = (i >= 0) & (faceoff_key[np.maximum(i, 0)] // _KEY == game[goals])
+        start = np.where(found, np.maximum(start, faceoff_key[np.maximum(i, 0)] % _KEY), start)
+
+    # shots on goal by the scoring team with a goalie recorded: the net was not empty yet
+    saves = np.flatnonzero(keep & (event == _SHOT) & (columns['roles'] == _GOALIE).any(axis=1))
+    save_key = np.sort((game[saves].astype(np.int64) * 2 + home[saves]) * _KEY + seconds[saves])
+    target = (game[goals].astype(np.int64) * 2 + home[goals]) * _KEY + seconds[goals]
+    if save_key.size:
+        i = _lastBefore(save_key, target, strict=True)
+        found = (i >= 0) & (save_key[np.maximum(i, 0)] // _KEY == target // _KEY)
+        start = np.where(found, np.maximum(start, save_key[np.maximum(i, 0)] % _KEY), start)
+
+    return np.minimum(start, seconds[goals])
@@ -0,0 +1,262 @@
+# rolling.py
+"""
+Vectorized rolling-window and EWMA operators for league-wide stat arrays.
+
+Every function works on arrays shaped (teams x games x stats), such as the one
+returned by `time_series.getLeagueBoxScores`, and operates along the games
+axis for all teams and stats at once. A team's row is padded with NaN after
+its last game; padded entries stay NaN in every result.
+"""
+import numpy as np
+
+
+def _valid(stats):
+    return ~np.isnan(stats)
+
+
+def rolling(stats, window, func='mean', min_periods=1):
+    """
+    Rolling-window statistic over the last `window` games (including the
+    current one).
+
+    Parameters
+    ----------
+        stats : ndarray (teams x games x stats)
+            Per-game stats; NaN marks games a team has not played.
+
+        window : int
+            Number of games in the window.
+
+        func : str (default: 'mean')
+            One of 'sum', 'mean' or 'std' (population standard deviation).
+
+        min_periods : int (default: 1)
+            Entries with fewer than this many games in their window are NaN.
+
+    Returns
+    -------
+        rolled : ndarray (teams x games x stats)
+    """
+    valid = _valid(stats)
+    values = np.where(valid, stats, 0.0)
+
+    def window_sum(x):
+        # sum over the trailing window from a cumulative sum along the games axis
+        total = np.cumsum(x, axis=1)
+        shifted = np.zeros_like(total)
+        shifted[:, window:] = total[:, :-window]
+        return total - shifted
+
+    count = window_sum(valid.astype(float))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if func == 'sum':
+            rolled = window_sum(values)
+        elif func == 'mean':
+            rolled = window_sum(values) / count
+        elif func == 'std':
+            mean = window_sum(values) / count
+            rolled = np.sqrt(np.maximum(window_sum(values**2) / count - mean**2, 0))
+        else:
+            raise ValueError(f"unknown func {func!r}; expected 'sum', 'mean' or 'std'")
+
+    return np.where(valid & (count >= min_periods), rolled, np.nan)
+
+
+def ewma(stats, alpha=None, span=None):
+    """
+    Exponentially weighted moving average along the games axis, i.e.
+
+        ewma[t] = (1 - alpha) * ewma[t-1] + alpha * stats[t]
+
+    starting from ewma[0] = stats[0]. Give either `alpha` (0 < alpha <= 1) or
+    `span` (alpha = 2 / (span + 1)).
+
+    The recursion steps through the games once, updating every team and stat
+    in each step.
+    """
+    if alpha is None:
+        if span is None:
+            raise ValueError('one of alpha or span must be given')
+        alpha = 2 / (span + 1)
+
+    valid = _valid(stats)
+    result = np.full(stats.shape, np.nan)
+    if stats.shape[1] == 0:
+        return result
+
+    current = stats[:, 0]
+    result[:, 0] = current
+    for game in range(1, stats.shape[1]):
+        step = (1 - alpha) * current + alpha * stats[:, game]
+        current = np.where(valid[:, game], step, current)
+        result[:, game] = np.where(valid[:, game], current, np.nan)
+
+    return result
+
+
+def splitRolling(stats, home, window, func='mean', min_periods=1):
+    """
+    Home/away split rolling statistics.
+
+    Parameters
+    ----------
+        stats : ndarray (teams x games x stats)
+            Per-game stats, as for `rolling`.
+
+        home : ndarray (bool, teams x games)
+            Whether the team was at home in each game.
+
+        window, func, min_periods
+            See `rolling`; the window counts games of the split only.
+
+    Returns
+    -------
+        home_rolled, away_rolled : ndarray (teams x games x stats)
+            At each game, the rolling statistic over the team's last `window`
+            home (away) games up to and including that game. Entries before a
+            team's first home (away) game are NaN.
+    """
+    valid = _valid(stats).any(axis=2)
+    results = []
+    for split in (home & valid, ~home & valid):
+        # move each team's games of this split to the front of its row, keeping
+        # their order, and roll over that compressed row
+        order = np.argsort(~split, axis=1, kind='stable')
+        compressed = np.take_along_axis(stats, order[:, :, None], axis=1)
+        compressed[~np.take_along_axis(split, order, axis=1)] = np.nan
+        rolled = rolling(compressed, window, func=func, min_periods=min_periods)
+
+        # map back: game t sees the value after the split's n(t)-th game
+        seen = np.cumsum(split, axis=1)
+        result = np.take_along_axis(rolled, np.maximum(seen - 1, 0)[:, :, None], axis=1)
+        result[(seen == 0) | ~valid] = np.nan
+        results.append(result)
+
+    return tuple(results)
+
+
+class RollingEngine:
+    """
+    Computes a fixed set of rolling features for the whole league and keeps
+    them up to date as games are added.
+
+    Parameters
+    ----------
+        team_ids : array-like
+            Team id of each row of the stat arrays.
+
+        columns : list(str)
+            Name of each stat (last axis).
+
+        windows : tuple(int) (default: (5, 10))
+            Windows for the rolling means (overall and home/away split).
+
+        alphas : tuple(float) (default: (0.1, 0.3))
+            Smoothing factors of the EWMAs.
+
+    Attributes
+    ----------
+        features : dict
+            Maps ('mean', window), ('home_mean', window), ('away_mean', window)
+            and ('ewma', alpha) to (teams x games x stats) arrays.
+    """
+
+    def __init__(self, team_ids, columns, windows=(5, 10), alphas=(0.1, 0.3)):
+        self.team_ids = np.asarray(team_ids)
+        self.columns = list(columns)
+        self.windows = tuple(windows)
+        self.alphas = tuple(alphas)
+
+        shape = (self.team_ids.size, 0, len(self.columns))
+        self.stats = np.full(shape, np.nan)
+        self.home = np.zeros(shape[:2], dtype=bool)
+        self.n_games = np.zeros(self.team_ids.size, dtype=int)
+        self.features = {}
+
+    def fit(self, stats, home):
+        """
+        Computes every feature for the (teams x games x stats) array `stats`,
+        with home/away flags `home` (teams x games).
+        """
+        self.stats = np.array(stats, dtype=float)
+        self.home = np.array(home, dtype=bool)
+        self.n_games = _valid(self.stats).any(axis=2).sum(axis=1)
+
+        self.features = {}
+        for window in self.windows:
+            self.features['mean', window] = rolling(self.stats, window)
+            self.features['home_mean', window], self.features['away_mean', window] = \
+                splitRolling(self.stats, self.home, window)
+        for alpha in self.alphas:
+            self.features['ewma', alpha] = ewma(self.stats, alpha=alpha)
+
+        return self
+
+    def update(self, team_id, stats, home):
+        """
+        Appends one new game for team `team_id` and computes only that game's
+        features, from the team's last few games (and last EWMA value).
+
+        Parameters
+        ----------
+            team_id : int
+                Team that played the game.
+
+            stats : array-like
+                The team's stats for the game, ordered as `columns`.
+
+            home : bool
+                Whether the team was at home.
+
+        Returns
+        -------
+            latest : dict
+                The team's feature values (arrays of length len(columns)) after
+                the new game, keyed as `features`.
+        """
+        row = int(np.flatnonzero(self.team_ids == int(team_id))[0])
+        game = self.n_games[row]
+
+        if game == self.stats.shape[1]:
+            self._grow()
+
+        self.stats[row, game] = stats
+        self.home[row, game] = home
+        self.n_games[row] += 1
+        history = self.stats[row, :game + 1]
+        at_home = self.home[row, :game + 1]
+
+        latest = {}
+        for window in self.windows:
+            latest['mean', window] = history[-window:].mean(axis=0)
+            for key, split in (('home_mean', at_home), ('away_mean', ~at_home)):
+                split_history = history[split][-window:]
+                if split_history.size:
+                    latest[key, window] = split_history.mean(axis=0)
+                else:
+                    latest[key, window] = np.full(len(self.columns), np.nan)
+        for alpha in self.alphas:
+            previous = self.features['ewma', alpha][row, game - 1] if game else history[0]
+            latest['ewma', alpha] = (1 - alpha) * previous + alpha * history[-1]
+
+        for key, value in latest.items():
+            self.features[key][row, game] = value
+
+        return latest
+
+    def _grow(self):
+        # double the games axis (at least by one) of the stats and every feature
+        extra = max(1, self.stats.shape[1])
+        pad = ((0, 0), (0, extra), (0, 0))
+        self.stats = np.pad(self.stats, pad, constant_values=np.nan)
+        self.home = np.pad(self.home, pad[:2], constant_values=False)
+
+        if not self.features:
+            for window in self.windows:
+                for name in ('mean', 'home_mean', 'away_mean'):
+                    self.features[name, window] = np.full(self.stats.shape, np.nan)
+            for alpha in self.alphas:
+                self.features['ewma', alpha] = np.full(self.stats.shape, np.nan)
+        else:
+            for key, value in self.features.items():
+                self.features[key] = np.pad(value, pad, constant_values=np.nan)
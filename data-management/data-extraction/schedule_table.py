@@ -0,0 +1,210 @@
+# schedule_table.py
+
+import numpy as np
+
+
+class GameTable:
+    """
+    Columnar table of scheduled games, built from a schedule request.
+
+    Each game appears exactly once (deduplicated on gamePk), and games are
+    ordered by date and then gamePk. Building the table from a single
+    league-wide `/schedule?season=...` request replaces one schedule request
+    (and parse) per team; the per-team series are then index views into the
+    columns below.
+
+    Attributes
+    ----------
+        game_pk : ndarray (int64)
+            NHL API game id of each game.
+
+        date : ndarray (datetime64[D])
+            Date of each game (from the schedule's 'date' field).
+
+        game_type : ndarray (str)
+            'PR' (preseason), 'R' (regular season), 'P' (postseason), etc.
+
+        home_id, away_id : ndarray (int64)
+            Team ids of the home and away teams.
+
+        home_score, away_score : ndarray (int64)
+            Goals scored by the home and away teams.
+
+        status : ndarray (str)
+            The game's detailedState ('Final', 'Scheduled', 'Postponed', ...).
+    """
+
+    columns = ('game_pk', 'date', 'game_type', 'home_id', 'away_id',
+               'home_score', 'away_score', 'status')
+
+    def __init__(self, game_pk, date, game_type, home_id, away_id,
+                 home_score, away_score, status):
+        self.game_pk = np.asarray(game_pk, dtype=np.int64)
+        self.date = np.asarray(date, dtype='datetime64[D]')
+        self.game_type = np.asarray(game_type, dtype=str)
+        self.home_id = np.asarray(home_id, dtype=np.int64)
+        self.away_id = np.asarray(away_id, dtype=np.int64)
+        self.home_score = np.asarray(home_score, dtype=np.int64)
+        self.away_score = np.asarray(away_score, dtype=np.int64)
+        self.status = np.asarray(status, dtype=str)
+
+    @classmethod
+    def fromSchedule(cls, dates):
+        """
+        Builds a table from the 'dates' list of a schedule request (as returned
+        by `nhlAPI.getSchedule` or `nhlAPI.getLeagueSchedule`).
+        """
+        rows = [(game['gamePk'], date['date'], game['gameType'],
+                 game['teams']['home']['team']['id'], game['teams']['away']['team']['id'],
+                 game['teams']['home'].get('score', 0), game['teams']['away'].get('score', 0),
+                 game['status']['detailedState'])
+                for date in dates for game in date['games']]
+
+        if not rows:
+            return cls(*([] for _ in cls.columns))
+
+        table = cls(*zip(*rows))
+
+        # a game can be listed more than once (e.g. under its original and its
+        # rescheduled date); keep the last listing of each gamePk
+        _, last = np.unique(table.game_pk[::-1], return_index=True)
+        keep = table.game_pk.size - 1 - last
+        order = np.lexsort((table.game_pk[keep], table.date[keep]))
+        return table.take(keep[order])
+
+    def __len__(self):
+        return self.game_pk.size
+
+    def take(self, index):
+        """
+        Returns a new table containing only the rows `index` (an integer or
+        boolean index array).
+        """
+        return GameTable(*(getattr(self, col)[index] for col in self.columns))
+
+    def teams(self):
+        """
+        Returns a sorted array of every team id appearing in the table.
+        """
+        return np.union1d(self.home_id, self.away_id)
+
+    def teamGames(self, team_id, include_pre=False, include_post=False):
+        """
+        Returns the row indices of team `team_id`'s completed games, in order.
+
+        As in `time_series.getGoals`, a team's series stops at its first game
+        that is not Final. Postponed games are skipped rather than ending the
+        series; once rescheduled, they are listed again at their new date.
+
+        Parameters
+        ----------
+            team_id : str or int
+                NHL API teamId.
+
+            include_pre : bool (default: False)
+                Whether to include preseason games.
+
+            include_post : bool (default: False)
+                Whether to include postseason games.
+
+        Returns
+        -------
+            index : ndarray (int64)
+                Row indices into the table's columns.
+        """
+        team_id = int(team_id)
+        index = np.flatnonzero(((self.home_id == team_id) | (self.away_id == team_id))
+                               & (self.status != 'Postponed'))
+
+        # stop if we have reached games that have not been completed
+        not_final = np.flatnonzero(self.status[index] != 'Final')
+        if not_final.size:
+            index = index[:not_final[0]]
+
+        keep = np.ones(index.size, dtype=bool)
+        if not include_pre:
+            keep &= self.game_type[index] != 'PR'
+        if not include_post:
+            keep &= self.game_type[index] != 'P'
+
+        return index[keep]
+
+    def teamGoals(self, team_id, include_pre=False, include_post=False):
+        """
+        Goals for/against time series for team `team_id`.
+
+        Returns
+        -------
+            goals_for : ndarray
+                Goals for time series.
+
+            goals_against : ndarray
+                Goals against time series.
+        """
+        index = self.teamGames(team_id, include_pre=include_pre, include_post=include_post)
+        home = self.home_id[index] == int(team_id)
+
+        goals_for = np.where(home, self.home_score[index], self.away_score[index])
+        goals_against = np.where(home, self.away_score[index], self.home_score[index])
+
+        return goals_for, goals_against
+
+    def leagueGoals(self, include_pre=False, include_post=False):
+        """
+        Goals for/against time series for every team at once.
+
+        Equivalent to calling `teamGoals` for each team in `teams()`, but done in
+        a single vectorized pass over the table.
+
+        Returns
+        -------
+            team_ids : ndarray (int64)
+                Team id of each row of the matrices below.
+
+            goals_for : ndarray (float, teams x games)
+                Goals for time series of each team; rows are padded with NaN
+                after a team's last game.
+
+            goals_against : ndarray (float, teams x games)
+                Goals against time series, laid out like `goals_for`.
+        """
+        team_ids = self.teams()
+        n = len(self)
+
+        # look at each game from both teams' points of view
+        rows = np.concatenate([np.arange(n), np.arange(n)])
+        team = np.searchsorted(team_ids, np.concatenate([self.home_id, self.away_id]))
+        goals_for = np.concatenate([self.home_score, self.away_score])
+        goals_against = np.concatenate([self.away_score, self.home_score])
+
+        # each team's series stops at its first game that is not Final
+        # (postponed games are skipped instead)
+        first_open = np.full(team_ids.size, n)
+        status = np.concatenate([self.status, self.status])
+        not_final = (status != 'Final') & (status != 'Postponed')
+        np.minimum.at(first_open, team[not_final], rows[not_final])
+        keep = (rows < first_open[team]) & (status != 'Postponed')
+
+        game_type = np.concatenate([self.game_type, self.game_type])
+        if not include_pre:
+            keep &= game_type != 'PR'
+        if not include_post:
+            keep &= game_type != 'P'
+
+        rows, team = rows[keep], team[keep]
+        goals_for, goals_against = goals_for[keep], goals_against[keep]
+
+        # position of each game within its team's series
+        order = np.lexsort((rows, team))
+        team, goals_for, goals_against = team[order], goals_for[order], goals_against[order]
+        counts = np.bincount(team, minlength=team_ids.size)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        position = np.arange(team.size) - starts[team]
+
+        shape = (team_ids.size, counts.max() if counts.size else 0)
+        gf_matrix = np.full(shape, np.nan)
+        ga_matrix = np.full(shape, np.nan)
+        gf_matrix[team, position] = goals_for
+        ga_matrix[team, position] = goals_against
+
+        return team_ids, gf_matrix, ga_matrix
@@ -0,0 +1,356 @@
+# season_events.py
+"""
+Season-scale play-by-play processing.
+
+`seasonEvents` parses the play-by-play of every game of a season (see
+events.py) on a process pool. Before starting, the parent allocates one
+shared-memory buffer per event column (the fields of `events.eventDtype`),
+with room for `rows_per_game` events per game, and gives each task its own
+region of the buffers. Workers write their games' events straight into their
+regions, so only small per-game summaries (event counts, team ids, rink sides,
+timings) are pickled back. The parent then packs the regions into one season
+`SeasonEvents` table with per-game offsets.
+
+Feeds are read with `nhlAPI.getGameFeed`, so games in a feed archive (see
+feed_archive.py) are read from disk, by every worker mapping the archive
+itself, and the rest are requested from the API.
+
+    season = seasonEvents(season='20192020', archives=['../data-collection/data/feeds/20192020.feeds'])
+    shots = season.mask('SHOT', 'GOAL')
+    season.stats['parse']['events_per_second']
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from events import EventTable, MAX_PLAYERS, _EVENT_CODES, eventDtype, parseEvents
+os.chdir('../data-collection')
+import api_client
+import metrics
+from feed_archive import FeedArchive, addArchive
+from nhlAPI import getGameFeed, getLeagueSchedule
+from rate_limit import RateLimiter
+os.chdir('../data-extraction')
+
+
+# periods recorded in SeasonEvents.home_direction (regulation, overtimes, shootout)
+MAX_PERIODS = 16
+
+# parts of each feed that are decoded
+_FEED_PATHS = ['gameData.teams', 'liveData.plays', 'liveData.linescore.periods']
+
+
+class SeasonEvents:
+    """
+    Play-by-play events of many games in one columnar table.
+
+    Attributes
+    ----------
+        columns : dict(str: ndarray)
+            One array per field of `events.eventDtype` (e.g. columns['x']),
+            with the events of every game concatenated in game order.
+
+        offsets : ndarray (int64)
+            The events of game i are rows offsets[i]:offsets[i + 1].
+
+        game_pk, home_id, away_id : ndarray (int64)
+            Game id and home/away team ids of each game; team ids are -1 for
+            games whose feed could not be read.
+
+        home_direction : ndarray (int8, (n_games, MAX_PERIODS))
+            Direction the home team attacks in each period: +1 towards +x, -1
+            towards -x, 0 if unknown (from the linescore's rinkSide).
+
+        stats : dict
+            Seconds spent and games/events per second for each stage ('load',
+            'parse', 'write' summed over workers, 'pack' and 'wall' in the
+            parent).
+    """
+
+    def __init__(self, columns, offsets, game_pk, home_id, away_id, home_direction, stats=None):
+        self.columns = columns
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.game_pk = np.asarray(game_pk, dtype=np.int64)
+        self.home_id = np.asarray(home_id, dtype=np.int64)
+        self.away_id = np.asarray(away_id, dtype=np.int64)
+        self.home_direction = np.asarray(home_direction, dtype=np.int8)
+        self.stats = stats or {}
+
+    @classmethod
+    def fromTables(cls, tables, game_pk, home_id, away_id, home_direction=None):
+        """
+        Builds a table from per-game `EventTable`s (see `events.parseEvents`).
+        """
+        tables = list(tables)
+        events = np.concatenate([table.events for table in tables]) if tables \
+            else np.zeros(0, dtype=eventDtype())
+        offsets = np.concatenate([[0], np.cumsum([len(table) for table in tables])])
+        if home_direction is None:
+            home_direction = np.zeros((len(tables), MAX_PERIODS), dtype=np.int8)
+        return cls({name: events[name] for name in events.dtype.names}, offsets,
+                   game_pk, home_id, away_id, home_direction)
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    @property
+    def n_games(self):
+        return self.game_pk.size
+
+    def gameIndex(self):
+        """
+        Returns the game (row of `game_pk`) of each event.
+        """
+        return np.repeat(np.arange(self.n_games), np.diff(self.offsets))
+
+    def mask(self, *event_types):
+        """
+        Returns a boolean mask of the events whose type is one of `event_types`
+        (e.g. mask('SHOT', 'GOAL')).
+        """
+        return np.isin(self.columns['event'], [_EVENT_CODES[name] for name in event_types])
+
+    def game(self, game_pk):
+        """
+        Returns the events of game `game_pk` as an `EventTable`.
+        """
+        i = np.flatnonzero(self.game_pk == int(game_pk))
+        if not i.size:
+            raise KeyError(game_pk)
+        start, stop = self.offsets[i[0]], self.offsets[i[0] + 1]
+
+        events = np.empty(stop - start, dtype=eventDtype(self.columns['players'].shape[1]))
+        for name in events.dtype.names:
+            events[name] = self.columns[name][start:stop]
+        return EventTable(events, np.flatnonzero(events['event'] == _EVENT_CODES['GOAL']),
+                          np.flatnonzero(events['event'] == _EVENT_CODES['PENALTY']))
+
+
+def _attach(spec):
+    # maps the shared column buffers described by `spec` into arrays
+    blocks, columns = [], {}
+    for name, (shm_name, dtype, shape) in spec.items():
+        block = shared_memory.SharedMemory(name=shm_name)
+        blocks.append(block)
+        columns[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    return blocks, columns
+
+
+def _direction(side):
+    # rinkSide is the side a team defends, so it attacks the other way
+    return {'left': 1, 'right': -1}.get(side, 0)
+
+
+def _parseGames(game_pks, start, capacity, spec, max_players, base_url):
+    """
+    Worker task: parses `game_pks` into rows start:start + capacity of the
+    shared columns. Events that do not fit are returned as an array.
+    """
+    timings = {'load': 0.0, 'parse': 0.0, 'write': 0.0}
+    counts = np.zeros(len(game_pks), dtype=np.int64)
+    home_id = np.full(len(game_pks), -1, dtype=np.int64)
+    away_id = np.full(len(game_pks), -1, dtype=np.int64)
+    home_direction = np.zeros((len(game_pks), MAX_PERIODS), dtype=np.int8)
+
+    blocks, columns = _attach(spec)
+    try:
+        row, stop, overflow = start, start + capacity, []
+        for i, game_pk in enumerate(game_pks):
+            clock = time.perf_counter()
+            try:
+                teams, plays, periods = getGameFeed(game_pk, path=_FEED_PATHS,
+                                                    base_url=base_url, final=True)
+            except KeyError:
+                print(f'game_id: {game_pk} failed')
+                continue
+            timings['load'] += time.perf_counter() - clock
+
+            clock = time.perf_counter()
+            events = parseEvents({'plays': plays}, max_players=max_players).events
+            home_id[i], away_id[i] = teams['home']['id'], teams['away']['id']
+            for period in periods[:MAX_PERIODS]:
+                home_direction[i, period['num'] - 1] = _direction(period['home'].get('rinkSide'))
+            counts[i] = events.size
+            timings['parse'] += time.perf_counter() - clock
+
+            clock = time.perf_counter()
+            # once a game does not fit, it and every later game go to `overflow`
+            if overflow or row + events.size > stop:
+                overflow.append(events)
+            else:
+                for name in events.dtype.names:
+                    columns[name][row:row + events.size] = events[name]
+                row += events.size
+            timings['write'] += time.perf_counter() - clock
+    finally:
+        del columns
+        for block in blocks:
+            block.close()
+
+    overflow = np.concatenate(overflow) if overflow else None
+    return counts, home_id, away_id, home_direction, row - start, overflow, timings
+
+
+def _initWorker(archives, base_url, limits):
+    # forked workers inherit the parent's clients and their keep-alive
+    # connections; sharing one socket would interleave the responses
+    api_client._clients.clear()
+    # each worker gets its share of the parent's request rate
+    rate, max_rate, min_rate, retries, backoff, max_backoff = limits
+    api_client.getClient(base_url).limiter = RateLimiter(rate, max_rate, min_rate, retries,
+                                                         backoff, max_backoff)
+    for path in archives:
+        addArchive(path)
+
+
+def seasonEvents(game_pks=None, season=None, archives=(), base_url='https://statsapi.web.nhl.com/api/v1',
+                 max_workers=None, chunk_size=16, rows_per_game=512, max_players=MAX_PLAYERS):
+    """
+    Parses the play-by-play of many games into one `SeasonEvents` table, on a
+    process pool writing into shared memory.
+
+    Parameters
+    ----------
+        game_pks : iterable(int) (default: None)
+            Games to parse. If None, every Final regular season and playoff
+            game of `season`, or every game in `archives` when no season is
+            given.
+
+        season : str ('YYYYYYYY', default: None)
+            Season whose games to parse when `game_pks` is None.
+
+        archives : list(str) (default: ())
+            Feed archives (see feed_archive.py) to read games from; games that
+            are not in them are requested from the API.
+
+        base_url : str
+            URL to the NHL API base.
+
+        max_workers : int (default: None)
+            Number of worker processes; the number of CPUs if None. Games
+            requested from the API are spread over the workers at the rate of
+            the parent's client (see api_client.getClient) in total.
+
+        chunk_size : int (default: 16)
+            Games per task.
+
+        rows_per_game : int (default: 512)
+            Rows of shared buffer reserved per game. Games with more events
+            (rare; a regulation game has 300-400) are still kept, but are
+            pickled back to the parent.
+
+        max_players : int (default: 4)
+            Player slots per event; see `events.parseEvents`.
+
+    Returns
+    -------
+        season : SeasonEvents
+            The events of every game, in the order of `game_pks`.
+    """
+    wall = time.perf_counter()
+    archives = list(archives)
+    if game_pks is None:
+        if season is not None:
+            game_pks = [game['gamePk'] for date in getLeagueSchedule(season, base_url=base_url)
+                        for game in date['games']
+                        if game['status']['detailedState'] == 'Final'
+                        and game['gameType'] in ('R', 'P')]
+        else:
+            game_pks = []
+            for path in archives:
+                with FeedArchive(path) as archive:
+                    game_pks.extend(archive.game_pks.tolist())
+    game_pks = [int(game_pk) for game_pk in game_pks]
+    max_workers = max_workers or os.cpu_count() or 1
+
+    dtype = eventDtype(max_players)
+    capacity = max(1, len(game_pks) * rows_per_game)
+    blocks, spec, shared = [], {}, {}
+    try:
+        for name in dtype.names:
+            field, shape = dtype[name].base, (capacity,) + dtype[name].shape
+            block = shared_memory.SharedMemory(create=True,
+                                               size=max(1, field.itemsize * int(np.prod(shape))))
+            blocks.append(block)
+            spec[name] = (block.name, field, shape)
+            shared[name] = np.ndarray(shape, dtype=field, buffer=block.buf)
+
+        chunks = [(start, game_pks[start:start + chunk_size])
+                  for start in range(0, len(game_pks), chunk_size)]
+        workers = max(1, min(max_workers, len(chunks)))
+        limiter = api_client.getClient(base_url).limiter
+        limits = (limiter.rate / workers, limiter.max_rate / workers, limiter.min_rate / workers,
+                  limiter.retries, limiter.backoff, limiter.max_backoff)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_initWorker,
+                                 initargs=(archives, base_url, limits)) as pool:
+            futures = [pool.submit(_parseGames, chunk, start * rows_per_game,
+                                   len(chunk) * rows_per_game, spec, max_players, base_url)
+                       for start, chunk in chunks]
+            results = [future.result() for future in futures]
+
+        clock = time.perf_counter()
+        counts = np.concatenate([result[0] for result in results]) if results else np.zeros(0, np.int64)
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        # pack each task's region (and its overflow) into the season columns
+        columns = {name: np.empty((offsets[-1],) + dtype[name].shape, dtype=dtype[name].base)
+                   for name in dtype.names}
+        row = 0
+        for (start, _), (_, _, _, _, written, overflow, _) in zip(chunks, results):
+            region = start * rows_per_game
+            for name in dtype.names:
+                columns[name][row:row + written] = shared[name][region:region + written]
+            row += written
+            if overflow is not None:
+                for name in dtype.names:
+                    columns[name][row:row + overflow.size] = overflow[name]
+                row += overflow.size
+        pack = time.perf_counter() - clock
+    finally:
+        # the arrays over the buffers have to go before the buffers can be closed
+        shared.clear()
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    n_events = int(offsets[-1])
+    stats = {}
+    for stage in ('load', 'parse', 'write'):
+        seconds = sum(result[6][stage] for result in results)
+        stats[stage] = {'seconds': seconds}
+        if metrics.ENABLED:
+            for result in results:
+                metrics.REGISTRY.stage(f'season_events.{stage}', result[6][stage])
+    stats['pack'] = {'seconds': pack}
+    stats['wall'] = {'seconds': time.perf_counter() - wall, 'workers': max_workers}
+    for stage in stats.values():
+        stage['games_per_second'] = len(game_pks) / stage['seconds'] if stage['seconds'] else None
+        stage['events_per_second'] = n_events / stage['seconds'] if stage['seconds'] else None
+
+    def gather(i, empty):
+        return np.concatenate([result[i] for result in results]) if results else empty
+
+    return SeasonEvents(columns, offsets, game_pks,
+                        gather(1, np.zeros(0, np.int64)), gather(2, np.zeros(0, np.int64)),
+                        gather(3, np.zeros((0, MAX_PERIODS), np.int8)), stats)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Parse a season's play-by-play on a process pool.")
+    parser.add_argument('--season', help="e.g. '20192020'")
+    parser.add_argument('--archives', nargs='*', default=[], help='feed archives to read games from')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    season = seasonEvents(season=args.season, archives=args.archives, max_workers=args.workers)
+    print(f'{season.n_games} games, {len(season)} events')
+    for stage, values in season.stats.items():
+        rate = values['events_per_second']
+        print(f'{stage:>6}: {values["seconds"]:8.3f} s' + (f'  {rate:12,.0f} events/s' if rate else ''))
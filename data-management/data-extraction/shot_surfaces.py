@@ -0,0 +1,354 @@
+# shot_surfaces.py
+"""
+Binned shot-location surfaces per team, player and season.
+
+Shot coordinates are normalized so that the shooting team always attacks
+towards +x: the direction of each team in each period comes from the
+linescore's rinkSide (`SeasonEvents.home_direction`), or, where that is
+missing, from the side of the rink the team's shots in that period were taken
+on. Shots are then binned on a grid over the rink (x in [-100, 100], y in
+[-42.5, 42.5] feet) in three layers:
+
+    attempts    unblocked shot attempts (shots on goal, missed shots, goals)
+    shots       shots on goal (including goals)
+    goals       goals
+
+Blocked shots are left out (their coordinates are where the block happened).
+
+Histograms are kept sparse, as sorted (key, count) pairs where the key packs
+(team or player id, layer, bin), so merging two sets of games is a
+concatenation plus a `np.unique`. `updateSurfaces` caches each season's
+histograms in `cache_dir` together with the games they cover, and on later
+calls only parses the games that have been played since. A league surface
+over many seasons is built from the cached histograms alone (seasons are
+given as '1980-1981', 19801981 or the start year 1980):
+
+    surfaces, missing = loadSurfaces(range(1980, 2020))
+    league = surfaces.league('goals', sigma=4)          # 2-D array (x, y)
+    team = surfaces.team(10, 'shots')
+"""
+import os
+import tempfile
+
+import numpy as np
+
+from events import PLAYER_ROLES, _EVENT_CODES
+from season_events import seasonEvents
+os.chdir('../data-collection')
+from nhlAPI import getLeagueSchedule
+from player_index import seasonKey
+os.chdir('../data-extraction')
+
+
+LAYERS = ('attempts', 'shots', 'goals')
+X_RANGE = (-100.0, 100.0)
+Y_RANGE = (-42.5, 42.5)
+
+_SHOT = _EVENT_CODES['SHOT']
+_MISSED = _EVENT_CODES['MISSED_SHOT']
+_GOAL = _EVENT_CODES['GOAL']
+_SHOOTERS = [PLAYER_ROLES.index('Shooter'), PLAYER_ROLES.index('Scorer')]
+
+# event types counted in each layer
+_LAYER_EVENTS = ((_SHOT, _MISSED, _GOAL), (_SHOT, _GOAL), (_GOAL,))
+
+
+def _seasonId(season):
+    # 1980, '1980-1981' or 19801981 -> 19801981
+    key = seasonKey(season)
+    return key * 10001 + 1 if key < 10000 else key
+
+
+def gridShape(bin_size):
+    """
+    Returns the number of (x, y) bins of the grid with `bin_size` ft bins.
+    """
+    return (int(np.ceil((X_RANGE[1] - X_RANGE[0]) / bin_size)),
+            int(np.ceil((Y_RANGE[1] - Y_RANGE[0]) / bin_size)))
+
+
+def normalizedShots(season):
+    """
+    Extracts the unblocked shot attempts of a `SeasonEvents` table with their
+    coordinates normalized so that the shooting team attacks towards +x.
+
+    Returns
+    -------
+        shots : dict(str: ndarray)
+            'game' (row of season.game_pk), 'event', 'team_id', 'player_id'
+            (the shooter or scorer; 0 if not recorded), 'x' and 'y'.
+    """
+    columns = season.columns
+    game = season.gameIndex()
+    period = columns['period'].astype(np.int64)
+    playoff = (season.game_pk // 10000) % 100 == 3
+
+    # shootout attempts (period 5 of a regular season game) are not game play
+    shots = np.flatnonzero(np.isin(columns['event'], _LAYER_EVENTS[0])
+                           & ~np.isnan(columns['x']) & ~np.isnan(columns['y'])
+                           & (playoff[game] | (period < 5)))
+    game, period = game[shots], period[shots]
+    team_id = columns['team_id'][shots].astype(np.int64)
+    x = columns['x'][shots].astype(np.float64)
+    y = columns['y'][shots].astype(np.float64)
+    home = team_id == season.home_id[game]
+
+    periods = season.home_direction.shape[1]
+    in_table = period <= periods
+    direction = np.zeros(shots.size, dtype=np.int64)
+    direction[in_table] = season.home_direction[game[in_table], period[in_table] - 1]
+    direction = np.where(home, direction, -direction)
+
+    # without a rinkSide, a team attacks towards the end it shot from on average
+    unknown = direction == 0
+    if unknown.any():
+        group = (game * (periods + 64) + period) * 2 + home
+        keys, inverse = np.unique(group, return_inverse=True)
+        side = np.sign(np.bincount(inverse, weights=x, minlength=keys.size))
+        direction = np.where(unknown, np.where(side[inverse] < 0, -1, 1), direction)
+
+    roles = columns['roles'][shots]
+    is_shooter = np.isin(roles, _SHOOTERS)
+    player_id = np.where(is_shooter.any(axis=1),
+                         columns['players'][shots][np.arange(shots.size), is_shooter.argmax(axis=1)],
+                         0).astype(np.int64)
+
+    return {'game': game, 'event': columns['event'][shots], 'team_id': team_id,
+            'player_id': player_id, 'x': x * direction, 'y': y * direction}
+
+
+def _sparse(keys, counts=None):
+    # sums the counts of equal keys; the result is sorted by key
+    if counts is None:
+        keys, counts = np.unique(keys, return_counts=True)
+        return keys.astype(np.int64), counts.astype(np.int64)
+    keys, inverse = np.unique(keys, return_inverse=True)
+    return keys.astype(np.int64), np.bincount(inverse, weights=counts,
+                                              minlength=keys.size).astype(np.int64)
+
+
+def _kernel(n, sigma):
+    # gaussian smoothing matrix; each column sums to one so counts are kept
+    index = np.arange(n)
+    kernel = np.exp(-0.5 * ((index[:, None] - index[None, :]) / sigma) ** 2)
+    return kernel / kernel.sum(axis=0)
+
+
+class Surfaces:
+    """
+    Sparse shot-location histograms per team and per player over a set of
+    games.
+
+    Parameters
+    ----------
+        bin_size : float
+            Bin width (ft).
+
+        game_pks : ndarray (int64)
+            Games the histograms cover.
+
+        team_keys, team_counts, player_keys, player_counts : ndarray (int64)
+            Sorted keys (id, layer, bin packed into one integer) and counts.
+    """
+
+    def __init__(self, bin_size, game_pks, team_keys, team_counts, player_keys, player_counts):
+        self.bin_size = float(bin_size)
+        self.shape = gridShape(self.bin_size)
+        self.game_pks = np.asarray(game_pks, dtype=np.int64)
+        self.team_keys, self.team_counts = team_keys, team_counts
+        self.player_keys, self.player_counts = player_keys, player_counts
+
+    @property
+    def n_bins(self):
+        return self.shape[0] * self.shape[1]
+
+    @classmethod
+    def empty(cls, bin_size=2.0):
+        nothing = np.zeros(0, dtype=np.int64)
+        return cls(bin_size, nothing, nothing, nothing, nothing, nothing)
+
+    @classmethod
+    def fromEvents(cls, season, bin_size=2.0):
+        """
+        Bins the shots of a `SeasonEvents` table.
+        """
+        shots = normalizedShots(season)
+        nx, ny = gridShape(bin_size)
+        ix = np.clip(((shots['x'] - X_RANGE[0]) / bin_size).astype(np.int64), 0, nx - 1)
+        iy = np.clip(((shots['y'] - Y_RANGE[0]) / bin_size).astype(np.int64), 0, ny - 1)
+        cell = ix * ny + iy
+
+        team_keys, player_keys = [], []
+        for layer, events in enumerate(_LAYER_EVENTS):
+            selected = np.isin(shots['event'], events)
+            team_keys.append((shots['team_id'][selected] * len(LAYERS) + layer) * nx * ny
+                             + cell[selected])
+            selected &= shots['player_id'] > 0
+            player_keys.append((shots['player_id'][selected] * len(LAYERS) + layer) * nx * ny
+                               + cell[selected])
+
+        return cls(bin_size, season.game_pk, *_sparse(np.concatenate(team_keys)),
+                   *_sparse(np.concatenate(player_keys)))
+
+    def merge(self, other):
+        """
+        Returns the histograms of the games of both `self` and `other`, which
+        must not share any game.
+        """
+        if other.bin_size != self.bin_size:
+            raise ValueError(f'cannot merge {self.bin_size} ft bins with {other.bin_size} ft bins')
+        if np.intersect1d(self.game_pks, other.game_pks).size:
+            raise ValueError('surfaces share games; merging them would count those games twice')
+        return Surfaces(self.bin_size, np.concatenate([self.game_pks, other.game_pks]),
+                        *_sparse(np.concatenate([self.team_keys, other.team_keys]),
+                                 np.concatenate([self.team_counts, other.team_counts])),
+                        *_sparse(np.concatenate([self.player_keys, other.player_keys]),
+                                 np.concatenate([self.player_counts, other.player_counts])))
+
+    def _surface(self, keys, counts, group, layer, sigma):
+        start = (int(group) * len(LAYERS) + LAYERS.index(layer)) * self.n_bins
+        lo, hi = np.searchsorted(keys, [start, start + self.n_bins])
+        surface = np.zeros(self.n_bins)
+        surface[keys[lo:hi] - start] = counts[lo:hi]
+        return self.smooth(surface.reshape(self.shape), sigma)
+
+    def team(self, team_id, layer='shots', sigma=None):
+        """
+        Returns the (x, y) histogram of team `team_id`'s shots in `layer`,
+        smoothed with a gaussian kernel of `sigma` ft if given.
+        """
+        return self._surface(self.team_keys, self.team_counts, team_id, layer, sigma)
+
+    def player(self, player_id, layer='shots', sigma=None):
+        """
+        Returns the (x, y) histogram of player `player_id`'s shots; see `team`.
+        """
+        return self._surface(self.player_keys, self.player_counts, player_id, layer, sigma)
+
+    def teams(self):
+        """
+        Returns the ids of the teams with at least one shot.
+        """
+        return np.unique(self.team_keys // (len(LAYERS) * self.n_bins))
+
+    def league(self, layer='shots', sigma=None):
+        """
+        Returns the (x, y) histogram of every team's shots in `layer`.
+        """
+        team_layer = (self.team_keys // self.n_bins) % len(LAYERS)
+        selected = team_layer == LAYERS.index(layer)
+        surface = np.bincount(self.team_keys[selected] % self.n_bins,
+                              weights=self.team_counts[selected], minlength=self.n_bins)
+        return self.smooth(surface.reshape(self.shape), sigma)
+
+    def smooth(self, surfaces, sigma):
+        """
+        Smooths one (x, y) surface or a stack of them with a gaussian kernel of
+        `sigma` ft; the total count is kept. Returns `surfaces` if `sigma` is
+        None.
+        """
+        if not sigma:
+            return surfaces
+        kx = _kernel(self.shape[0], sigma / self.bin_size)
+        ky = _kernel(self.shape[1], sigma / self.bin_size)
+        return np.einsum('ij,...jk,lk->...il', kx, surfaces, ky)
+
+    def save(self, path):
+        """
+        Writes the histograms to `path` (.npz), replacing it atomically.
+        """
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.npz')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, bin_size=self.bin_size, game_pks=self.game_pks,
+                     team_keys=self.team_keys, team_counts=self.team_counts,
+                     player_keys=self.player_keys, player_counts=self.player_counts)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls(float(f['bin_size']), f['game_pks'], f['team_keys'], f['team_counts'],
+                       f['player_keys'], f['player_counts'])
+
+
+def updateSurfaces(season, cache_dir='surfaces', archives=(), bin_size=2.0,
+                   base_url='https://statsapi.web.nhl.com/api/v1', max_workers=None):
+    """
+    Brings the cached surfaces of `season` up to date: every Final regular
+    season and playoff game that is not in the cache yet is parsed (see
+    `season_events.seasonEvents`) and merged in.
+
+    Parameters
+    ----------
+        season : str or int
+            Season ('YYYYYYYY', 'YYYY-YYYY' or its start year).
+
+        cache_dir : str (default: 'surfaces')
+            Directory holding one <season>.npz of histograms per season.
+
+        archives : list(str) (default: ())
+            Feed archives to read games from (see feed_archive.py).
+
+        bin_size : float (default: 2.0)
+            Bin width (ft). A cache built with another bin size is rebuilt.
+
+        base_url : str
+            URL to the NHL API base.
+
+        max_workers : int (default: None)
+            Worker processes for parsing the new games.
+
+    Returns
+    -------
+        surfaces : Surfaces
+            The season's histograms.
+    """
+    key = str(_seasonId(season))
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f'{key}.npz')
+
+    surfaces = Surfaces.empty(bin_size)
+    if os.path.exists(path):
+        cached = Surfaces.load(path)
+        if cached.bin_size == float(bin_size):
+            surfaces = cached
+
+    game_pks = [game['gamePk'] for date in getLeagueSchedule(key, base_url=base_url)
+                for game in date['games']
+                if game['status']['detailedState'] == 'Final' and game['gameType'] in ('R', 'P')]
+    new = np.setdiff1d(np.array(game_pks, dtype=np.int64), surfaces.game_pks)
+    if new.size:
+        events = seasonEvents(game_pks=new, archives=archives, base_url=base_url,
+                              max_workers=max_workers)
+        added = Surfaces.fromEvents(events, bin_size)
+        # games whose feed could not be read are left for the next update
+        added.game_pks = events.game_pk[events.home_id >= 0]
+        surfaces = surfaces.merge(added)
+        surfaces.save(path)
+
+    return surfaces
+
+
+def loadSurfaces(seasons, cache_dir='surfaces'):
+    """
+    Merges the cached surfaces of `seasons` (see `updateSurfaces` for the
+    accepted forms) without parsing any game.
+
+    Returns
+    -------
+        surfaces : Surfaces
+            The merged histograms.
+
+        missing : list(int)
+            Seasons that are not cached (and are left out of `surfaces`).
+    """
+    surfaces, missing = None, []
+    for season in seasons:
+        key = _seasonId(season)
+        path = os.path.join(cache_dir, f'{key}.npz')
+        if not os.path.exists(path):
+            missing.append(key)
+            continue
+        cached = Surfaces.load(path)
+        surfaces = cached if surfaces is None else surfaces.merge(cached)
+    return (surfaces if surfaces is not None else Surfaces.empty()), missing
@@ -0,0 +1,316 @@
+# subset_selection.py
+"""
+Best-subset and stepwise selection of OLS models (with an intercept).
+
+Every model is evaluated from the centered Gram matrix of [X, y] with the
+sweep operator, so moving between neighbouring subsets (adding or dropping one
+predictor) is a single O(p^2) update instead of a new fit. Best-subset search
+walks the tree of subsets obtained by dropping predictors from the full model
+and prunes whole branches whose smallest possible RSS cannot reach the current
+top k of any subset size they contain (the "leaps and bounds" algorithm of
+Furnival and Wilson, 1974). The tree is split into independent branches that
+are searched on a process pool.
+
+Within a subset size AIC, BIC and adjusted R^2 all rank models by their RSS,
+so the top k models per size are the same under all three criteria.
+
+    import pandas as pd
+    data = pd.read_csv('RegressionData.csv')
+    X = data.drop(columns=['Rk', 'Team', 'Playoffs', 'GP', 'L', 'OL', 'PTS',
+                           'PTSper', 'W', 'SRS'])
+    models = bestSubsets(X, data['W'], k=5)
+    models.sort_values('bic').head()
+"""
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+
+def _sweep(A, k, reverse=False):
+    """
+    Sweeps (or reverse sweeps) the symmetric matrix `A` on pivot `k`, in place.
+
+    After sweeping the predictors S of the Gram matrix [[X'X, X'y], [y'X, y'y]],
+    the last diagonal entry is the RSS of regressing y on S, and the S block
+    holds -(X_S'X_S)^-1. Reverse sweeping a pivot undoes its sweep.
+    """
+    d = A[k, k]
+    col = A[:, k].copy()
+    A -= np.outer(col, col) / d
+    A[:, k] = A[k, :] = (-col if reverse else col) / d
+    A[k, k] = -1 / d
+
+
+def gramMatrix(X, y):
+    """
+    Returns the cross-product matrix of the centered (and scaled) columns of
+    [X, y]; the last row/column belongs to y. Scaling the predictors does not
+    change any RSS, but keeps the sweeps well conditioned.
+    """
+    Z = np.column_stack([np.asarray(X, dtype=float), np.asarray(y, dtype=float)])
+    Z = Z - Z.mean(axis=0)
+    scale = np.sqrt((Z**2).sum(axis=0))
+    scale[-1] = 1
+    scale[scale == 0] = 1
+    Z /= scale
+    return Z.T @ Z
+
+
+def _criteria(rss, size, n, tss):
+    # statsmodels' definitions, counting the intercept as a parameter
+    llf = -n / 2 * (np.log(2 * np.pi) + np.log(rss / n) + 1)
+    return {'rss': rss,
+            'r2': 1 - rss / tss,
+            'adj_r2': 1 - (n - 1) / (n - size - 1) * rss / tss,
+            'aic': -2 * llf + 2 * (size + 1),
+            'bic': -2 * llf + np.log(n) * (size + 1)}
+
+
+class _Search:
+    """
+    State of a branch-and-bound search: the best `k` subsets found so far for
+    each size, and the RSS a new subset of each size has to beat.
+    """
+
+    def __init__(self, k, max_size, best=None):
+        self.k = k
+        self.max_size = max_size
+        self.best = best if best is not None else [{} for _ in range(max_size + 1)]
+        self.threshold = np.full(max_size + 1, np.inf)
+        for size, best in enumerate(self.best):
+            if len(best) == k:
+                self.threshold[size] = max(best.values())
+
+    def record(self, subset, rss):
+        size = len(subset)
+        if size > self.max_size or rss >= self.threshold[size]:
+            return
+        best = self.best[size]
+        key = tuple(sorted(subset))
+        if key in best:
+            return
+        best[key] = rss
+        if len(best) > self.k:
+            del best[max(best, key=best.get)]
+        if len(best) == self.k:
+            self.threshold[size] = max(best.values())
+
+    def pruned(self, rss, smallest, largest):
+        # can any subset with between `smallest` and `largest` predictors (and
+        # RSS >= `rss`) still make it into the top k?
+        largest = min(largest, self.max_size)
+        return smallest > largest or rss >= self.threshold[smallest:largest + 1].max()
+
+    def expand(self, A, subset, fixed):
+        """
+        Visits the node (`subset`, `fixed`): records the subset (swept in `A`)
+        and returns its children as (dropped, child, child_fixed, child_rss).
+
+        The first `fixed` predictors of a node are kept in its whole branch; the
+        children drop one of the others each. The droppable predictors are
+        ordered from the most to the least important, so the largest branches
+        lose the most important predictor and have the highest bounds.
+        """
+        rss = A[-1, -1]
+        self.record(subset, rss)
+
+        free = np.array(subset[fixed:], dtype=int)
+        if not free.size:
+            return []
+        cost = A[free, -1]**2 / -A[free, free]
+        order = np.argsort(-cost, kind='stable')
+        free, cost = free[order], cost[order]
+
+        subset = subset[:fixed] + free.tolist()
+        return [(subset[i], subset[:i] + subset[i + 1:], i, rss + cost[i - fixed])
+                for i in range(fixed, len(subset))]
+
+    def children(self, A, subset, fixed):
+        # unpruned children that still need a swept matrix; leaves are recorded
+        for dropped, child, child_fixed, rss in self.expand(A, subset, fixed):
+            if self.pruned(rss, child_fixed, len(child)):
+                continue
+            if child_fixed == len(child):
+                self.record(child, rss)
+                continue
+            B = A.copy()
+            _sweep(B, dropped, reverse=True)
+            yield B, child, child_fixed
+
+    def search(self, A, subset, fixed):
+        for node in self.children(A, subset, fixed):
+            self.search(*node)
+
+
+def _searchBranch(args):
+    # process pool task: search one branch, starting from the best subsets
+    # already known to the parent
+    A, subset, fixed, k, max_size, best = args
+    search = _Search(k, max_size, best)
+    search.search(A, subset, fixed)
+    return search.best
+
+
+def bestSubsets(X, y, k=5, max_size=None, max_workers=None):
+    """
+    Finds the `k` best OLS models (with an intercept) of every size.
+
+    Parameters
+    ----------
+        X : DataFrame or ndarray (n x p)
+            Predictors. Columns must be linearly independent (and not constant).
+
+        y : array-like (n)
+            Response.
+
+        k : int (default: 5)
+            Number of models kept per subset size.
+
+        max_size : int (default: None)
+            Largest number of predictors in a model; defaults to p.
+
+        max_workers : int (default: None)
+            Number of processes the search is split over; defaults to the number
+            of CPUs. With 1, everything runs in this process.
+
+    Returns
+    -------
+        models : DataFrame
+            One row per model, sorted by size and then RSS, with columns size,
+            variables (tuple of predictor names), rss, r2, adj_r2, aic and bic.
+            Use e.g. `models.sort_values('bic')` to rank models across sizes.
+    """
+    names = list(X.columns) if isinstance(X, pd.DataFrame) else \
+        [f'x{i}' for i in range(np.shape(X)[1])]
+    n, p = len(y), len(names)
+    max_size = p if max_size is None else min(max_size, p)
+
+    A = gramMatrix(X, y)
+    tss = A[-1, -1]
+
+    # sweep in the full model, checking for dependent predictors on the way
+    for j in range(p):
+        if A[j, j] <= 1e-10:
+            raise ValueError(f'predictor {names[j]!r} is constant or a linear '
+                             f'combination of the predictors before it')
+        _sweep(A, j)
+
+    # expand the top of the tree here, then search the branches in parallel
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    search = _Search(k, max_size)
+    frontier = deque([(A, list(range(p)), 0)])
+    while frontier and (max_workers == 1 or len(frontier) < 4 * max_workers):
+        node = frontier.popleft()
+        if max_workers == 1:
+            search.search(*node)
+        else:
+            frontier.extend(search.children(*node))
+
+    if frontier:
+        tasks = [(A, subset, fixed, k, max_size, search.best)
+                 for A, subset, fixed in frontier]
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for best in pool.map(_searchBranch, tasks):
+                for size, models in enumerate(best):
+                    for key, rss in models.items():
+                        search.record(key, rss)
+
+    rows = [(size, key, rss) for size, models in enumerate(search.best)
+            for key, rss in sorted(models.items(), key=lambda item: item[1])]
+    size = np.array([row[0] for row in rows])
+    rss = np.array([row[2] for row in rows], dtype=float)
+
+    models = pd.DataFrame({'size': size,
+                           'variables': [tuple(names[j] for j in row[1]) for row in rows]})
+    for column, values in _criteria(rss, size, n, tss).items():
+        models[column] = values
+    return models
+
+
+def stepwise(X, y, criterion='aic', direction='both'):
+    """
+    Stepwise selection of an OLS model (with an intercept).
+
+    Starting from the intercept-only model ('forward', 'both') or the full
+    model ('backward'), each step makes the single addition or removal of a
+    predictor that improves `criterion` the most, until no step improves it.
+
+    Parameters
+    ----------
+        X, y
+            See `bestSubsets`.
+
+        criterion : str (default: 'aic')
+            'aic', 'bic' or 'adj_r2'.
+
+        direction : str (default: 'both')
+            'forward', 'backward' or 'both'.
+
+    Returns
+    -------
+        path : DataFrame
+            One row per step (the first is the starting model), with the same
+            columns as `bestSubsets`; the last row is the selected model.
+    """
+    if criterion not in ('aic', 'bic', 'adj_r2'):
+        raise ValueError(f"unknown criterion {criterion!r}; expected 'aic', 'bic' or 'adj_r2'")
+    if direction not in ('forward', 'backward', 'both'):
+        raise ValueError(f"unknown direction {direction!r}; "
+                         f"expected 'forward', 'backward' or 'both'")
+
+    names = list(X.columns) if isinstance(X, pd.DataFrame) else \
+        [f'x{i}' for i in range(np.shape(X)[1])]
+    n, p = len(y), len(names)
+    A = gramMatrix(X, y)
+    tss = A[-1, -1]
+    sign = -1 if criterion == 'adj_r2' else 1
+
+    def score(rss, size):
+        return sign * _criteria(rss, size, n, tss)[criterion]
+
+    swept = np.zeros(p, dtype=bool)
+    if direction == 'backward':
+        for j in range(p):
+            if A[j, j] <= 1e-10:
+                raise ValueError(f'predictor {names[j]!r} is constant or a linear '
+                                 f'combination of the predictors before it')
+            _sweep(A, j)
+        swept[:] = True
+
+    path = [(swept.copy(), A[-1, -1])]
+    while True:
+        # change in RSS from sweeping (adding) or reverse sweeping (dropping) each predictor
+        diag = np.diag(A)[:p]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta = -A[:p, -1]**2 / diag
+        allowed = np.where(swept, direction != 'forward', direction != 'backward')
+        # predictors that are (nearly) dependent on the current model cannot be added
+        allowed &= swept | (diag > 1e-10)
+
+        size = swept.sum()
+        current = score(A[-1, -1], size)
+        candidates = np.flatnonzero(allowed)
+        if not candidates.size:
+            break
+        scores = score(A[-1, -1] + delta[candidates],
+                       size + np.where(swept[candidates], -1, 1))
+        best = np.argmin(scores)
+        if scores[best] >= current:
+            break
+
+        j = candidates[best]
+        _sweep(A, j, reverse=swept[j])
+        swept[j] = ~swept[j]
+        path.append((swept.copy(), A[-1, -1]))
+
+    size = np.array([mask.sum() for mask, _ in path])
+    rss = np.array([rss for _, rss in path])
+    steps = pd.DataFrame({'size': size,
+                          'variables': [tuple(np.array(names)[mask]) for mask, _ in path]})
+    for column, values in _criteria(rss, size, n, tss).items():
+        steps[column] = values
+    return steps
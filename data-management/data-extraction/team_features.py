@@ -0,0 +1,373 @@
+# team_features.py
+"""
+Team-season feature matrix, built from stored data instead of a hand-made csv.
+
+One row per (season, team), with columns named as in
+RoughDraftStuff/RegressionData.csv where the feature exists there:
+
+    schedule        GP, W, L, GF, GA, GoalsperGame, SRS, SOS
+    boxscores       S, SA, Sper, Svper, PP, PPO, Pppercent, PPA, PPOA,
+                    Pkpercent, PIMperG, oPIMperG
+    player stats    EVGF, SH, SO
+
+The schedule features come from the season's `GameTable`, the boxscore
+features from `time_series.getLeagueBoxScores` (served from the response cache
+when one is configured, see api_client.py), and the player features from the
+columnar stats store and player index (see stats_store.py and player_index.py).
+Only completed regular-season games are counted.
+
+Each season's rows are cached on disk together with a hash of its completed
+games and their scores and of the modification times of the stored player
+stats and index; the boxscores are only fetched, and the season recomputed,
+when one of those changes. The assembled matrix is saved in column-major order
+and returned memory-mapped, so each feature column (and a DataFrame over the
+matrix) is a view, not a copy.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from time_series import getLeagueBoxScores, getLeagueGames
+os.chdir('../data-collection')
+from player_index import PlayerIndex, seasonKey
+from stats_store import loadStats
+os.chdir('../data-extraction')
+
+
+FEATURES = {
+    'GP':           'games played',
+    'W':            'wins (including overtime and shootout wins)',
+    'L':            'losses (including overtime and shootout losses)',
+    'GF':           'goals for',
+    'GA':           'goals against',
+    'GoalsperGame': 'goals for plus goals against, per game',
+    'SRS':          'simple rating system: goal differential per game plus SOS',
+    'SOS':          'strength of schedule: average SRS of the opponents faced',
+    'S':            'shots on goal',
+    'SA':           'shots on goal against',
+    'Sper':         'shooting percentage (100 * GF / S)',
+    'Svper':        'save percentage (1 - GA / SA)',
+    'PP':           'power play goals',
+    'PPO':          'power play opportunities',
+    'Pppercent':    'power play percentage (100 * PP / PPO)',
+    'PPA':          'power play goals against',
+    'PPOA':         'power play opportunities against',
+    'Pkpercent':    'penalty kill percentage (100 * (1 - PPA / PPOA))',
+    'PIMperG':      'penalty minutes per game',
+    'oPIMperG':     'opponents\' penalty minutes per game',
+    'EVGF':         'even strength goals for (skater goals minus PP and SH goals)',
+    'SH':           'short handed goals for',
+    'SO':           'shutouts (goalie stats)',
+}
+
+# boxscore (teamSkaterStats) fields used
+_BOX = ('shots', 'powerPlayGoals', 'powerPlayOpportunities', 'pim')
+
+
+class FeatureMatrix:
+    """
+    Team-season features returned by `buildFeatures`.
+
+    Attributes
+    ----------
+        matrix : ndarray (rows x features, column-major, read-only memmap)
+            Feature values; NaN where a feature could not be computed.
+
+        columns : list(str)
+            Name of each column (see FEATURES for descriptions).
+
+        season : ndarray (int64)
+            Season key (e.g. 20192020) of each row.
+
+        team_id : ndarray (int64)
+            NHL API team id of each row.
+    """
+
+    def __init__(self, matrix, columns, season, team_id):
+        self.matrix = matrix
+        self.columns = list(columns)
+        self.season = season
+        self.team_id = team_id
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def column(self, name):
+        """
+        Returns the (contiguous) column of feature `name`, without copying.
+        """
+        return self.matrix[:, self.columns.index(name)]
+
+    def frame(self):
+        """
+        Returns the features as a DataFrame indexed by (season, team_id). The
+        frame shares its data with `matrix`.
+        """
+        index = pd.MultiIndex.from_arrays([self.season, self.team_id],
+                                          names=['season', 'team_id'])
+        return pd.DataFrame(self.matrix, index=index, columns=self.columns, copy=False)
+
+
+def _scheduleInputs(games):
+    # the completed regular-season games of a season's GameTable
+    keep = (games.status == 'Final') & (games.game_type == 'R')
+    return {name: getattr(games, name)[keep]
+            for name in ('game_pk', 'home_id', 'away_id', 'home_score', 'away_score')}
+
+
+def _fileStamps(directories):
+    # (path, mtime, size) of every file in `directories`; the stats store and
+    # the index replace their files when rebuilt
+    stamps = []
+    for directory in directories:
+        if os.path.isdir(directory):
+            for name in sorted(os.listdir(directory)):
+                stat = os.stat(os.path.join(directory, name))
+                stamps.append([os.path.join(directory, name), stat.st_mtime_ns, stat.st_size])
+    return stamps
+
+
+def _cacheInputs(games, stats_path, index_path):
+    """
+    What the cache key of a season is computed from: its completed games and
+    their scores (boxscores of completed games do not change), and the
+    modification times of the stored player stats and index. None of it needs
+    the boxscores to be fetched.
+    """
+    inputs = _scheduleInputs(games)
+    stamps = _fileStamps([os.path.join(stats_path, kind) for kind in ('skater_stats', 'goalie_stats')]
+                         + [index_path])
+    inputs['files'] = np.frombuffer(json.dumps(stamps).encode(), dtype=np.uint8)
+    return inputs
+
+
+def _loadInputs(season, games, base_url, stats_path, index_path, max_workers):
+    """
+    Collects everything a season's features are computed from, as a dict of
+    arrays.
+    """
+    inputs = _scheduleInputs(games)
+
+    # per game, the home team's and the away team's boxscore stats
+    team_ids, stats, home, cols = getLeagueBoxScores(season=season, games=games,
+                                                     base_url=base_url, max_workers=max_workers)
+    box = {side: np.full((inputs['game_pk'].size, len(_BOX)), np.nan)
+           for side in ('home', 'away')}
+    if set(_BOX) <= set(cols):
+        stats = stats[:, :, [cols.index(stat) for stat in _BOX]]
+        position = {pk: i for i, pk in enumerate(inputs['game_pk'])}
+        for row, team_id in enumerate(team_ids):
+            index = games.teamGames(team_id)
+            for slot, pk in enumerate(games.game_pk[index]):
+                if pk in position:
+                    side = 'home' if home[row, slot] else 'away'
+                    box[side][position[pk]] = stats[row, slot]
+    inputs['box_home'], inputs['box_away'] = box['home'], box['away']
+
+    # season totals of the players, by team
+    key = seasonKey(season)
+    try:
+        index = PlayerIndex(index_path)
+        skaters = loadStats('skater_stats', ['goals', 'powerPlayGoals', 'shortHandedGoals'],
+                            seasons=[key], path=stats_path, as_frame=False)
+        goalies = loadStats('goalie_stats', ['shutouts'], seasons=[key], path=stats_path,
+                            as_frame=False)
+        inputs['skater_team'] = index.playerTeams(skaters['player_id'], key)
+        inputs['skater_goals'] = np.column_stack([skaters['goals'], skaters['powerPlayGoals'],
+                                                  skaters['shortHandedGoals']])
+        inputs['goalie_team'] = index.playerTeams(goalies['player_id'], key)
+        inputs['goalie_shutouts'] = goalies['shutouts']
+    except (FileNotFoundError, KeyError):
+        # no stored player stats (or index) for this season
+        pass
+
+    return inputs
+
+
+def _inputHash(inputs):
+    digest = hashlib.sha256(json.dumps(list(FEATURES)).encode())
+    for name in sorted(inputs):
+        array = np.ascontiguousarray(inputs[name])
+        digest.update(name.encode())
+        digest.update(str((array.dtype.str, array.shape)).encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def _srs(home, away, margin, n_teams):
+    """
+    Solves SRS_i = MOV_i + mean(SRS of i's opponents) for every team, with
+    ratings normalized to average 0.
+    """
+    gp = np.bincount(home, minlength=n_teams) + np.bincount(away, minlength=n_teams)
+    mov = (np.bincount(home, margin, n_teams) - np.bincount(away, margin, n_teams)) / gp
+
+    # opponents[i, j] = number of games between i and j, as a share of i's games
+    opponents = np.zeros((n_teams, n_teams))
+    np.add.at(opponents, (home, away), 1)
+    opponents = (opponents + opponents.T) / gp[:, None]
+
+    system = np.vstack([np.eye(n_teams) - opponents, np.ones(n_teams)])
+    srs = np.linalg.lstsq(system, np.append(mov, 0), rcond=None)[0]
+    return srs, srs - mov
+
+
+def seasonFeatures(inputs):
+    """
+    Computes the FEATURES of every team from one season's inputs.
+
+    Returns
+    -------
+        team_ids : ndarray (int64)
+            Team id of each row.
+
+        features : ndarray (teams x features)
+    """
+    team_ids = np.union1d(inputs['home_id'], inputs['away_id'])
+    n = team_ids.size
+    home = np.searchsorted(team_ids, inputs['home_id'])
+    away = np.searchsorted(team_ids, inputs['away_id'])
+
+    def total(for_home, for_away):
+        # sum of a per-game quantity over each team's games, as home and away team
+        return np.bincount(home, for_home, n) + np.bincount(away, for_away, n)
+
+    hs, aws = inputs['home_score'].astype(float), inputs['away_score'].astype(float)
+    box_home, box_away = inputs['box_home'], inputs['box_away']
+    ones = np.ones(home.size)
+
+    f = {}
+    f['GP'] = total(ones, ones)
+    f['W'] = total(hs > aws, aws > hs)
+    f['L'] = total(hs < aws, aws < hs)
+    f['GF'] = total(hs, aws)
+    f['GA'] = total(aws, hs)
+    f['GoalsperGame'] = (f['GF'] + f['GA']) / f['GP']
+    f['SRS'], f['SOS'] = _srs(home, away, hs - aws, n) if n else (np.zeros(0),) * 2
+
+    shots, ppg, ppo, pim = range(len(_BOX))
+    f['S'] = total(box_home[:, shots], box_away[:, shots])
+    f['SA'] = total(box_away[:, shots], box_home[:, shots])
+    f['PP'] = total(box_home[:, ppg], box_away[:, ppg])
+    f['PPO'] = total(box_home[:, ppo], box_away[:, ppo])
+    f['PPA'] = total(box_away[:, ppg], box_home[:, ppg])
+    f['PPOA'] = total(box_away[:, ppo], box_home[:, ppo])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        f['Sper'] = 100 * f['GF'] / f['S']
+        f['Svper'] = 1 - f['GA'] / f['SA']
+        f['Pppercent'] = 100 * f['PP'] / f['PPO']
+        f['Pkpercent'] = 100 * (1 - f['PPA'] / f['PPOA'])
+    f['PIMperG'] = total(box_home[:, pim], box_away[:, pim]) / f['GP']
+    f['oPIMperG'] = total(box_away[:, pim], box_home[:, pim]) / f['GP']
+
+    if 'skater_team' in inputs:
+        # players are counted for the team they are listed on for the season
+        skater = np.searchsorted(team_ids, inputs['skater_team'])
+        on_team = np.isin(inputs['skater_team'], team_ids)
+        goals = inputs['skater_goals'][on_team].astype(float)
+        skater = skater[on_team]
+        f['EVGF'] = np.bincount(skater, goals[:, 0] - goals[:, 1] - goals[:, 2], n)
+        f['SH'] = np.bincount(skater, goals[:, 2], n)
+
+        goalie = np.searchsorted(team_ids, inputs['goalie_team'])
+        on_team = np.isin(inputs['goalie_team'], team_ids)
+        f['SO'] = np.bincount(goalie[on_team], inputs['goalie_shutouts'][on_team].astype(float), n)
+    else:
+        f['EVGF'] = f['SH'] = f['SO'] = np.full(n, np.nan)
+
+    if not n:
+        return team_ids, np.zeros((0, len(FEATURES)))
+    return team_ids, np.column_stack([f[name] for name in FEATURES])
+
+
+def _atomicSave(path, array):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.npy')
+    with os.fdopen(fd, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+def buildFeatures(seasons, cache_dir='features', base_url='https://statsapi.web.nhl.com/api/v1',
+                  stats_path='../data-collection/data/stats-columnar',
+                  index_path='../data-collection/data/index', max_workers=8):
+    """
+    Builds (or loads from the cache) the team-season feature matrix.
+
+    Parameters
+    ----------
+        seasons : list(str)
+            Seasons to include ('YYYYYYYY' or 'YYYY-YYYY').
+
+        cache_dir : str (default: 'features')
+            Directory holding the cached per-season rows and the assembled matrix.
+
+        base_url : str
+            URL to the NHL API base.
+
+        stats_path : str (default: '../data-collection/data/stats-columnar')
+            Location of the columnar stats store; the player features are NaN
+            for seasons it does not cover.
+
+        index_path : str (default: '../data-collection/data/index')
+            Location of the player index.
+
+        max_workers : int (default: 8)
+            Maximum number of concurrent boxscore requests.
+
+    Returns
+    -------
+        features : FeatureMatrix
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    catalog_path = os.path.join(cache_dir, 'catalog.json')
+    try:
+        with open(catalog_path) as f:
+            catalog = json.load(f)
+    except FileNotFoundError:
+        catalog = {}
+
+    hashes = []
+    for season in seasons:
+        key = str(seasonKey(season))
+        games = getLeagueGames(season=key, base_url=base_url)
+        digest = _inputHash(_cacheInputs(games, stats_path, index_path))
+        rows = os.path.join(cache_dir, f'{key}.npy')
+        teams = os.path.join(cache_dir, f'{key}.teams.npy')
+
+        if catalog.get(key) != digest or not (os.path.exists(rows) and os.path.exists(teams)):
+            # the boxscores are only fetched for seasons that are recomputed
+            inputs = _loadInputs(key, games, base_url, stats_path, index_path, max_workers)
+            team_ids, features = seasonFeatures(inputs)
+            _atomicSave(teams, team_ids)
+            _atomicSave(rows, features)
+            catalog[key] = digest
+        hashes.append(digest)
+
+    # the assembled matrix is only rewritten if its seasons (or their rows) changed
+    assembled = hashlib.sha256(json.dumps(hashes).encode()).hexdigest()
+    matrix_path = os.path.join(cache_dir, 'matrix.npy')
+    if catalog.get('matrix') != assembled or not os.path.exists(matrix_path):
+        keys = [str(seasonKey(season)) for season in seasons]
+        blocks = [np.load(os.path.join(cache_dir, f'{key}.npy')) for key in keys]
+        teams = [np.load(os.path.join(cache_dir, f'{key}.teams.npy')) for key in keys]
+        matrix = np.asfortranarray(np.concatenate(blocks) if blocks else
+                                   np.zeros((0, len(FEATURES))))
+        _atomicSave(matrix_path, matrix)
+        _atomicSave(os.path.join(cache_dir, 'matrix.season.npy'),
+                    np.repeat(np.array(keys, dtype=np.int64), [len(t) for t in teams]))
+        _atomicSave(os.path.join(cache_dir, 'matrix.team_id.npy'),
+                    np.concatenate(teams).astype(np.int64) if teams else np.zeros(0, np.int64))
+        catalog['matrix'] = assembled
+
+    fd, tmp = tempfile.mkstemp(dir=cache_dir)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(catalog, f, indent=2)
+    os.replace(tmp, catalog_path)
+
+    return FeatureMatrix(np.load(matrix_path, mmap_mode='r'), FEATURES,
+                         np.load(os.path.join(cache_dir, 'matrix.season.npy')),
+                         np.load(os.path.join(cache_dir, 'matrix.team_id.npy')))
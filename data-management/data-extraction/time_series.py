@@ -1,19 +1,56 @@
 # time-series.py
 
 from pymongo import MongoClient
-import requests
 import pandas as pd
 import numpy as np
+import pickle
+import tempfile
 import time
 
 import os
 os.chdir('../data-collection')
-from nhlAPI import getSchedule, getBoxScore
+from nhlAPI import getSchedule, getLeagueSchedule, getBoxScore
+from api_client import getClient
+from metrics import stage
 os.chdir('../data-extraction')
+from schedule_table import GameTable
 
 
+# teamSkaterStats fields that a linescore-hydrated schedule also provides,
+# mapped to their names in the linescore
+LINESCORE_STATS = {'goals': 'goals', 'shots': 'shotsOnGoal'}
+
+
+@stage('time_series.getLeagueGames')
+def getLeagueGames(season=None, base_url='https://statsapi.web.nhl.com/api/v1'):
+    """
+    Builds a table of every game in season `season` from a single league-wide
+    schedule request.
+
+    Pass the result as the `games` argument of `getGoals`, `getTeamBoxScores`,
+    `goalsFor`, etc. to build series for many teams without requesting (and
+    parsing) each team's schedule separately.
+
+    Parameters
+    ----------
+        season : str (YYYYYYYY; default: None)
+            Specifies which season to get games for.
+            When season=None, this defaults to the current season.
+
+        base_url : str
+            URL to the NHL API base.
+
+    Returns
+    -------
+        games : GameTable
+            Columnar table of the season's games; see schedule_table.GameTable.
+    """
+    return GameTable.fromSchedule(getLeagueSchedule(season=season, base_url=base_url))
+
+
+@stage('time_series.getGoals')
 def getGoals(team_id, season=None, include_pre=False, include_post=False,
-             base_url='https://statsapi.web.nhl.com/api/v1'):
+             base_url='https://statsapi.web.nhl.com/api/v1', games=None, mongodb=False):
     """
     Gathers a goals for/against time series for team `team_id` and season `season`.
 
@@ -35,6 +72,14 @@ def getGoals(team_id, season=None, include_pre=False, include_post=False,
         base_url : str
             URL to the NHL API base; used only if season is not specified.
 
+        games : GameTable (default: None)
+            Table of games to take the series from (see `getLeagueGames`).
+            If None, the team's schedule is requested.
+
+        mongodb : bool (default: False)
+            If True (and `games` is None), read the team's schedule from the
+            nhl.schedule MongoDB collection instead of the API.
+
     Returns
     -------
         goals_for : ndarray
@@ -43,58 +88,301 @@ def getGoals(team_id, season=None, include_pre=False, include_post=False,
         goals_against : ndarray
             Goals against time series.
     """
-    if type(team_id) is int:
-        team_id = str(team_id)
+    if games is None:
+        games = GameTable.fromSchedule(getSchedule(team_id, season=season, base_url=base_url,
+                                                   mongodb=mongodb))
+
+    return games.teamGoals(team_id, include_pre=include_pre, include_post=include_post)
 
-    # if season is not specified, assume it is the current season
-    if season is None:
-        season = requests.get(base_url + '/seasons/current').json()['seasons']
-        season = season[0]['seasonId']
 
-    games = getSchedule(team_id, season=season, mongodb=False)
-    games = games[team_id][season]
+@stage('time_series.getTeamBoxScores')
+def getTeamBoxScores(team_id, season=None, include_pre=False, include_post=False,
+                     return_np=False, base_url='https://statsapi.web.nhl.com/api/v1',
+                     wait=0, games=None, bulk=False, stats=None, max_workers=8):
+    """
+    Note, this will take some time to run.
+    Constructs time series for each
+
+    Parameters
+    ----------
+        team_id : str or int
+            NHL API teamId of the desired team.
 
-    goals_for = []
-    goals_against = []
+        season : str (YYYYYYYY; default: None)
+            Specifies which season to construct the time series for.
+            When season=None, this defaults to the current season.
 
-    for game in games:
-        # drill down to the level we care about
-        game = game['games'][0]
+        include_pre : bool (default: False)
+            Whether to include preseason games in the time series.
 
-        # stop if we have reached games that have not been completed
-        if game['status']['detailedState'] != 'Final':
-            break
+        include_post : bool (default: False)
+            Whether to include postseason games in the time series.
 
-        # if include_pre is False, skip preseason games
-        if not include_pre:
-            if game['gameType'] == 'PR':
-                continue
+        return_np : bool (default: False)
+            If False, returns a pandas dataframe; otherwise, returns an ndarray.
 
-        # if include_post is False, skip preseason games
-        if not include_post:
-            if game['gameType'] == 'P':
+        base_url : str
+            URL to the NHL API base.
+
+        wait : float (nonnegative, defalut: 0)
+            Deprecated. Seconds to sleep between requests; requests are already
+            paced and retried by the client's `rate_limit.RateLimiter`.
+
+        games : GameTable (default: None)
+            Table of games to take the team's games from (see `getLeagueGames`).
+            If None, the team's schedule is requested.
+
+        bulk : bool (default: False)
+            If True, request the team's schedule hydrated with linescores, which
+            covers the 'goals' and 'shots' stats for every game at once. Boxscores
+            are then only requested if other stats are needed, and are fetched
+            concurrently (`max_workers` at a time) rather than one by one.
+            `wait` is ignored in this mode.
+
+        stats : list(str) (default: None)
+            teamSkaterStats fields to return (e.g. ['goals', 'shots']); if None,
+            all of them are returned.
+
+        max_workers : int (default: 8)
+            Maximum number of concurrent boxscore requests when `bulk` is True.
+
+    Returns
+    -------
+
+    """
+    team_id = str(team_id)
+
+    dates = None
+    if games is None:
+        # request raw schedule
+        with stage('time_series.getTeamBoxScores.schedule'):
+            expand = ['schedule.linescore'] if bulk else None
+            dates = getSchedule(team_id, season=season, base_url=base_url, expand=expand)
+            games = GameTable.fromSchedule(dates)
+
+    index = games.teamGames(team_id, include_pre=include_pre, include_post=include_post)
+
+    with stage('time_series.getTeamBoxScores.boxscores'):
+        if bulk:
+            if dates is None and index.size:
+                # one hydrated request covering the date range of the team's games
+                dates = getSchedule(team_id, base_url=base_url, expand=['schedule.linescore'],
+                                    start_date=str(games.date[index].min()),
+                                    end_date=str(games.date[index].max()))
+            team_stats, other_stats, cols = _bulkBoxScores(team_id, games.game_pk[index],
+                                                           dates or [], stats, base_url,
+                                                           max_workers)
+        else:
+            team_stats, other_stats, cols = [], [], None
+
+            for game_id in games.game_pk[index]:
+                if wait:
+                    time.sleep(wait)
+
+                # get boxscore data
+                try:
+                    team, other = getBoxScore(game_id, base_url=base_url, final=True)
+                except KeyError:
+                    print(f'game_id: {game_id} failed')
+                    continue
+
+                if cols is None:
+                    # save column labels for future
+                    cols = stats or list(team['teamStats']['teamSkaterStats'].keys())
+
+                team, other = _teamSkaterRows(team_id, team, other, cols)
+                team_stats.append(team)
+                other_stats.append(other)
+
+    with stage('time_series.getTeamBoxScores.dataframe'):
+        team_stats = np.array(team_stats)
+        other_stats = np.array(other_stats)
+
+        if return_np:
+            return team_stats, other_stats
+
+        team_stats = pd.DataFrame(team_stats[:, 1:], index=team_stats[:, 0], columns=cols)
+        other_stats = pd.DataFrame(other_stats[:, 1:], index=other_stats[:, 0], columns=cols)
+
+    return team_stats, other_stats
+
+
+@stage('time_series.getLeagueBoxScores')
+def getLeagueBoxScores(season=None, include_pre=False, include_post=False,
+                       base_url='https://statsapi.web.nhl.com/api/v1', games=None,
+                       max_workers=8):
+    """
+    Gathers the teamSkaterStats of every team's games in a season as a single
+    (teams x games x stats) array, requesting each game's boxscore once.
+
+    Parameters
+    ----------
+        season : str (YYYYYYYY; default: None)
+            Specifies which season to construct the array for.
+            When season=None, this defaults to the current season.
+
+        include_pre : bool (default: False)
+            Whether to include preseason games.
+
+        include_post : bool (default: False)
+            Whether to include postseason games.
+
+        base_url : str
+            URL to the NHL API base.
+
+        games : GameTable (default: None)
+            Table of the season's games. If None, the league schedule is
+            requested (see `getLeagueGames`).
+
+        max_workers : int (default: 8)
+            Maximum number of concurrent boxscore requests.
+
+    Returns
+    -------
+        team_ids : ndarray
+            Team id of each row.
+
+        stats : ndarray (teams x games x stats)
+            Each team's stats in each of its games, in order; rows are padded
+            with NaN after a team's last game. See rolling.py for operators
+            on this array.
+
+        home : ndarray (bool, teams x games)
+            Whether the team was at home in each game.
+
+        cols : list(str)
+            Name of each stat.
+    """
+    if games is None:
+        games = getLeagueGames(season=season, base_url=base_url)
+
+    team_ids = games.teams()
+    slots = {}
+    for row, team_id in enumerate(team_ids):
+        index = games.teamGames(team_id, include_pre=include_pre, include_post=include_post)
+        for position, game_id in enumerate(games.game_pk[index]):
+            slots.setdefault(game_id, []).append((row, position))
+
+    n_games = max((position + 1 for entries in slots.values() for _, position in entries),
+                  default=0)
+    stats, home, cols = None, np.zeros((team_ids.size, n_games), dtype=bool), None
+
+    client = getClient(base_url)
+    game_ids = list(slots)
+    chunk = 4 * max_workers
+    for start in range(0, len(game_ids), chunk):
+        endpoints = [f'/game/{game_id}/boxscore' for game_id in game_ids[start:start + chunk]]
+        for game_id, boxscore in zip(game_ids[start:start + chunk],
+                                     client.get_many(endpoints, max_workers=max_workers,
+                                                     immutable=True, path='teams')):
+            try:
+                sides = {side: boxscore[side] for side in ('home', 'away')}
+            except KeyError:
+                print(f'game_id: {game_id} failed')
                 continue
 
-        # check for home/away
-        if str(game['teams']['home']['team']['id']) == team_id:
-            goals_for.append(game['teams']['home']['score'])
-            goals_against.append(game['teams']['away']['score'])
+            if cols is None:
+                cols = list(sides['home']['teamStats']['teamSkaterStats'].keys())
+                stats = np.full((team_ids.size, n_games, len(cols)), np.nan)
+
+            for row, position in slots[game_id]:
+                is_home = sides['home']['team']['id'] == team_ids[row]
+                team = sides['home' if is_home else 'away']['teamStats']['teamSkaterStats']
+                stats[row, position] = [float(team[stat]) for stat in cols]
+                home[row, position] = is_home
+
+    if stats is None:
+        stats = np.full((team_ids.size, n_games, 0), np.nan)
+
+    return team_ids, stats, home, cols or []
+
+
+def _teamSkaterRows(team_id, team, other, cols):
+    """
+    Turns the home (`team`) and away (`other`) boxscore dictionaries into the
+    team's and opponent's rows of `getTeamBoxScores`; the first entry of each
+    row is the row label.
+    """
+    # grab team ids and find which is team_id
+    home_id, away_id = str(team['team']['id']), str(other['team']['id'])
+    if home_id != team_id:
+        team, other = other, team
+
+    team = team['teamStats']['teamSkaterStats']
+    other = other['teamStats']['teamSkaterStats']
+
+    return ([float(team_id)] + [float(team[stat]) for stat in cols],
+            [float(away_id)] + [float(other[stat]) for stat in cols])
+
+
+def _bulkBoxScores(team_id, game_ids, dates, stats, base_url, max_workers):
+    """
+    Builds the rows of `getTeamBoxScores` for `game_ids` from a linescore-hydrated
+    schedule (`dates`), requesting boxscores only when `stats` needs fields the
+    linescores do not have.
+    """
+    linescores = {game['gamePk']: game.get('linescore')
+                  for date in dates for game in date['games']}
+
+    if stats is not None and set(stats) <= set(LINESCORE_STATS):
+        missing = [game_id for game_id in game_ids if not linescores.get(game_id)]
+    else:
+        missing = list(game_ids)
+
+    # prefetch the boxscores we still need, in order and in bounded chunks so
+    # that only a chunk's worth of raw responses is held at once
+    boxscores = {}
+    client = getClient(base_url)
+    chunk = 4 * max_workers
+    for start in range(0, len(missing), chunk):
+        endpoints = [f'/game/{game_id}/boxscore' for game_id in missing[start:start + chunk]]
+        for game_id, boxscore in zip(missing[start:start + chunk],
+                                     client.get_many(endpoints, max_workers=max_workers,
+                                                     immutable=True, path='teams')):
+            try:
+                boxscores[game_id] = boxscore['home'], boxscore['away']
+            except KeyError:
+                print(f'game_id: {game_id} failed')
+
+    team_stats, other_stats, cols = [], [], stats
+    missing = set(missing)
+    for game_id in game_ids:
+        if game_id in boxscores:
+            team, other = boxscores[game_id]
+        elif game_id not in missing:
+            # wrap the linescore entries so they look like boxscore teams
+            team, other = ({'team': side['team'],
+                            'teamStats': {'teamSkaterStats': {stat: side[field]
+                                          for stat, field in LINESCORE_STATS.items()}}}
+                           for side in (linescores[game_id]['teams']['home'],
+                                        linescores[game_id]['teams']['away']))
         else:
-            goals_for.append(game['teams']['away']['score'])
-            goals_against.append(game['teams']['home']['score'])
+            continue
 
-    # convert to numpy because that is better
-    goals_for, goals_against = np.array(goals_for), np.array(goals_against)
+        if cols is None:
+            cols = list(team['teamStats']['teamSkaterStats'].keys())
 
-    return goals_for, goals_against
+        team, other = _teamSkaterRows(team_id, team, other, cols)
+        team_stats.append(team)
+        other_stats.append(other)
 
+    return team_stats, other_stats, cols
 
-def getTeamBoxScores(team_id, season=None, include_pre=False, include_post=False,
-                     return_np=False, base_url='https://statsapi.web.nhl.com/api/v1',
-                     wait=0):
+
+@stage('time_series.refreshTeamSeason')
+def refreshTeamSeason(team_id, season=None, include_pre=False, include_post=False,
+                      boxscores=True, checkpoint_dir='checkpoints', max_workers=8,
+                      base_url='https://statsapi.web.nhl.com/api/v1'):
     """
-    Note, this will take some time to run.
-    Constructs time series for each
+    Incrementally updates a team-season's goal and boxscore time series.
+
+    The series built so far are kept in a checkpoint file (one per team,
+    season and set of options) together with the games they cover. On each
+    call only the part of the schedule since the last checkpointed game is
+    requested, and only boxscores of games completed since then are
+    downloaded, so a daily refresh costs a few requests regardless of how far
+    into the season it is. Postponed games are skipped until they are played
+    at their rescheduled date.
 
     Parameters
     ----------
@@ -111,87 +399,287 @@ def getTeamBoxScores(team_id, season=None, include_pre=False, include_post=False
         include_post : bool (default: False)
             Whether to include postseason games in the time series.
 
-        return_np : bool (default: False)
-            If False, returns a pandas dataframe; otherwise, returns an ndarray.
+        boxscores : bool (default: True)
+            Whether to also keep the teamSkaterStats series of
+            `getTeamBoxScores`; if False, only goals are tracked (and no
+            boxscores are requested).
+
+        checkpoint_dir : str (default: 'checkpoints')
+            Directory the checkpoint files are kept in.
+
+        max_workers : int (default: 8)
+            Maximum number of concurrent boxscore requests.
 
         base_url : str
             URL to the NHL API base.
 
-        wait : float (nonnegative, defalut: 0)
-            Specifies a wait time between requests to the API. Not needed unless
-            you are making 1000+ requests per second (I think...?)
-
     Returns
     -------
+        goals_for, goals_against : ndarray
+            As returned by `getGoals`.
 
+        team_stats, other_stats : DataFrame
+            As returned by `getTeamBoxScores` (None if `boxscores` is False).
     """
-    # if season is not specified, assume it is the current season
+    team_id = str(team_id)
     if season is None:
-        season = requests.get(base_url + '/seasons/current').json()['seasons']
-        season = season[0]['seasonId']
+        season = getClient(base_url).current_season()
+
+    options = (include_pre, include_post, boxscores)
+    path = os.path.join(checkpoint_dir, f'{season}-{team_id}-{int(include_pre)}'
+                                        f'{int(include_post)}{int(boxscores)}.pkl')
+
+    checkpoint = None
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            checkpoint = pickle.load(f)
+        if checkpoint['options'] != options:
+            checkpoint = None
+
+    if checkpoint is None:
+        checkpoint = {'options': options, 'last_date': None, 'game_pks': np.zeros(0, dtype=np.int64),
+                      'goals_for': np.zeros(0, dtype=np.int64),
+                      'goals_against': np.zeros(0, dtype=np.int64),
+                      'team_stats': [], 'other_stats': [], 'cols': None}
+        dates = getSchedule(team_id, season=season, base_url=base_url)
+    else:
+        # only the schedule since the last completed game; seasons end by
+        # September, and games from the next season are filtered out below
+        dates = getSchedule(team_id, base_url=base_url, start_date=checkpoint['last_date'],
+                            end_date=f'{season[4:]}-09-30')
+
+    dates = [{'date': date['date'],
+              'games': [game for game in date['games'] if game['season'] == season]}
+             for date in dates]
+    games = GameTable.fromSchedule(dates)
+
+    index = games.teamGames(team_id, include_pre=include_pre, include_post=include_post)
+    index = index[~np.isin(games.game_pk[index], checkpoint['game_pks'])]
+
+    if index.size:
+        home = games.home_id[index] == int(team_id)
+        goals_for = np.where(home, games.home_score[index], games.away_score[index])
+        goals_against = np.where(home, games.away_score[index], games.home_score[index])
+
+        game_pks = games.game_pk[index]
+        if boxscores:
+            endpoints = [f'/game/{game_id}/boxscore' for game_id in game_pks]
+            responses = getClient(base_url).get_many(endpoints, max_workers=max_workers,
+                                                     immutable=True, path='teams')
+            n_done = 0
+            for game_id, boxscore in zip(game_pks, responses):
+                try:
+                    team, other = boxscore['home'], boxscore['away']
+                except KeyError:
+                    # stop at the first game that failed, so that it (and the
+                    # games after it) are requested again on the next refresh
+                    print(f'game_id: {game_id} failed')
+                    break
+
+                if checkpoint['cols'] is None:
+                    checkpoint['cols'] = list(team['teamStats']['teamSkaterStats'].keys())
+
+                team, other = _teamSkaterRows(team_id, team, other, checkpoint['cols'])
+                checkpoint['team_stats'].append(team)
+                checkpoint['other_stats'].append(other)
+                n_done += 1
+
+            index, game_pks = index[:n_done], game_pks[:n_done]
+            goals_for, goals_against = goals_for[:n_done], goals_against[:n_done]
+
+        checkpoint['game_pks'] = np.concatenate([checkpoint['game_pks'], game_pks])
+        checkpoint['goals_for'] = np.concatenate([checkpoint['goals_for'], goals_for])
+        checkpoint['goals_against'] = np.concatenate([checkpoint['goals_against'], goals_against])
+        if index.size:
+            checkpoint['last_date'] = str(games.date[index].max())
+
+        # write to a temporary file first so an interrupted refresh never
+        # leaves a corrupt checkpoint behind
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=checkpoint_dir)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(checkpoint, f)
+        os.replace(tmp, path)
+
+    team_stats = other_stats = None
+    if boxscores:
+        team_stats = np.array(checkpoint['team_stats']).reshape(-1, len(checkpoint['cols'] or []) + 1)
+        other_stats = np.array(checkpoint['other_stats']).reshape(team_stats.shape)
+        team_stats = pd.DataFrame(team_stats[:, 1:], index=team_stats[:, 0], columns=checkpoint['cols'])
+        other_stats = pd.DataFrame(other_stats[:, 1:], index=other_stats[:, 0],
+                                   columns=checkpoint['cols'])
+
+    return checkpoint['goals_for'], checkpoint['goals_against'], team_stats, other_stats
+
+
+class SeasonSeries:
+    """
+    Goals for/against time series of one team-season, loaded once.
 
-    # request raw schedule
-    games = getSchedule(team_id, season=season, base_url=base_url)
+    The team's games are requested (or taken from `games`) when the object is
+    created; every series is then computed from them on first access and
+    cached, so asking for e.g. goals for, goals against and goal differential
+    does not request the schedule three times.
 
-    team_stats = []
-    other_stats = []
-    cols = None
+    Parameters
+    ----------
+        team_id : str or int
+            NHL API teamId of the desired team.
 
-    for game in games:
-        if wait:
-            time.sleep(wait)
-        # grab the actual game dictionary
-        game = game['games'][0]
+        season : str (YYYYYYYY; default: None)
+            Specifies which season to construct the time series for.
+            When season=None, this defaults to the current season.
 
-        # stop if we have reached games that have not been completed
-        if game['status']['detailedState'] != 'Final':
-            break
+        include_pre : bool (default: False)
+            Whether to include preseason games in the time series.
 
-        # if include_pre is False, skip preseason games
-        if not include_pre and game['gameType'] == 'PR':
-            continue
+        include_post : bool (default: False)
+            Whether to include postseason games in the time series.
 
-        # if include_post is False, skip postseason games
-        if not include_post and game['gameType'] == 'P':
-            continue
+        base_url : str
+            URL to the NHL API base.
 
-        # get boxscore data
-        game_id = game['gamePk']    # game id
-        try:
-            team, other = getBoxScore(game_id)
-        except KeyError:
-            print(f'game_id: {game_id} failed')
-            continue
+        games : GameTable (default: None)
+            Table of games to take the series from (see `getLeagueGames`).
+            If None, the team's schedule is requested.
 
-        # grab team ids and find which is team_id
-        home_id, away_id = str(team['team']['id']), str(other['team']['id'])
-        if home_id != team_id:
-            team, other = other, team
+    Examples
+    --------
+        >>> leafs = SeasonSeries(10, season='20192020')
+        >>> leafs.goals_for, leafs.goal_diff
+        >>> leafs.series('goal_diff', average=True)
+    """
 
-        team = team['teamStats']['teamSkaterStats']
-        other = other['teamStats']['teamSkaterStats']
+    names = ('goals_for', 'goals_against', 'goal_diff')
+
+    def __init__(self, team_id, season=None, include_pre=False, include_post=False,
+                 base_url='https://statsapi.web.nhl.com/api/v1', games=None):
+        self.team_id = str(team_id)
+        self._cache = {}
+        self._cache['goals_for', False, False], self._cache['goals_against', False, False] = \
+            getGoals(team_id, season=season, include_pre=include_pre,
+                     include_post=include_post, base_url=base_url, games=games)
+
+    @property
+    def goals_for(self):
+        return self.series('goals_for')
+
+    @property
+    def goals_against(self):
+        return self.series('goals_against')
+
+    @property
+    def goal_diff(self):
+        return self.series('goal_diff')
+
+    def series(self, name, average=False, cumulative=False):
+        """
+        Returns the time series `name` ('goals_for', 'goals_against' or
+        'goal_diff').
+
+        Parameters
+        ----------
+            average : bool (default: False)
+                If True, the ith element of the resulting time series will be
+                the *average* of the series, averaged up through the ith game.
+
+            cumulative : bool (default: False)
+                If True, the time series will be cumulative. Ignored if
+                `average` is True.
+
+        Returns
+        -------
+            series : ndarray
+                The requested series; the array is cached and shared between
+                calls, so copy it before modifying it in place.
+        """
+        if name not in self.names:
+            raise ValueError(f'unknown series {name!r}; expected one of {self.names}')
+
+        cumulative = cumulative and not average
+        key = (name, average, cumulative)
+
+        if key not in self._cache:
+            if average or cumulative:
+                self._cache[key] = _accumulate(self.series(name), average)
+            elif name == 'goal_diff':
+                self._cache[key] = self.goals_for - self.goals_against
+
+        return self._cache[key]
+
+
+class LeagueSeries(SeasonSeries):
+    """
+    Goals for/against time series of every team in a season, as
+    (teams x games) matrices computed in a single vectorized pass.
 
-        if cols is None:
-            # save column labels for future
-            cols = list(team.keys())
+    Rows follow `team_ids`; a team's row is padded with NaN after its last
+    game. `series` and the `goals_for`, `goals_against` and `goal_diff`
+    attributes behave as for `SeasonSeries`, but return matrices.
+
+    Parameters
+    ----------
+        season : str (YYYYYYYY; default: None)
+            Specifies which season to construct the time series for.
+            When season=None, this defaults to the current season.
 
-        team_stats.append([float(team_id)] + [float(team[stat]) for stat in team.keys()])
-        other_stats.append([float(away_id)] + [float(other[stat]) for stat in other.keys()])
+        include_pre : bool (default: False)
+            Whether to include preseason games in the time series.
 
-    team_stats = np.array(team_stats)
-    other_stats = np.array(other_stats)
+        include_post : bool (default: False)
+            Whether to include postseason games in the time series.
 
-    if return_np:
-        return team_stats, other_stats
+        base_url : str
+            URL to the NHL API base.
 
-    team_stats = pd.DataFrame(team_stats[:, 1:], index=team_stats[:, 0], columns=cols)
-    other_stats = pd.DataFrame(other_stats[:, 1:], index=other_stats[:, 0], columns=cols)
+        games : GameTable (default: None)
+            Table of games to take the series from. If None, the league
+            schedule is requested (see `getLeagueGames`).
+    """
 
-    return team_stats, other_stats
+    def __init__(self, season=None, include_pre=False, include_post=False,
+                 base_url='https://statsapi.web.nhl.com/api/v1', games=None):
+        if games is None:
+            games = getLeagueGames(season=season, base_url=base_url)
+
+        self._cache = {}
+        self.team_ids, self._cache['goals_for', False, False], \
+            self._cache['goals_against', False, False] = \
+            games.leagueGoals(include_pre=include_pre, include_post=include_post)
+
+    def team(self, team_id, name='goal_diff', average=False, cumulative=False):
+        """
+        Returns team `team_id`'s series `name` (see `series`) as a 1-D array,
+        without the NaN padding.
+        """
+        row = np.searchsorted(self.team_ids, int(team_id))
+        if row == self.team_ids.size or self.team_ids[row] != int(team_id):
+            raise KeyError(team_id)
+
+        series = self.series(name, average=average, cumulative=cumulative)[row]
+        return series[~np.isnan(series)]
+
+
+def _accumulate(series, average):
+    """
+    Cumulative sum (or, if `average`, running mean) of `series` along its last
+    axis; NaN padding is preserved.
+    """
+    valid = ~np.isnan(series) if series.dtype.kind == 'f' else np.ones(series.shape, dtype=bool)
+    total = np.cumsum(np.where(valid, series, 0), axis=-1)
+
+    if average:
+        total = total / np.maximum(np.cumsum(valid, axis=-1), 1)
+
+    if not valid.all():
+        total = np.where(valid, total, np.nan)
+
+    return total
 
 
 def goalsFor(team_id, season=None, include_pre=False, include_post=False,
-             average=False, cumulative=False, base_url='https://statsapi.web.nhl.com/api/v1'):
+             average=False, cumulative=False, base_url='https://statsapi.web.nhl.com/api/v1',
+             games=None):
     """
     Creates a goals for time series for the given team.
 
@@ -220,6 +708,10 @@ def goalsFor(team_id, season=None, include_pre=False, include_post=False,
         base_url : str
             URL to the NHL API base; used only if season is not specified.
 
+        games : GameTable (default: None)
+            Table of games to take the series from (see `getLeagueGames`).
+            If None, the team's schedule is requested.
+
     Returns
     -------
         goals_for : ndarray
@@ -228,20 +720,15 @@ def goalsFor(team_id, season=None, include_pre=False, include_post=False,
     if type(team_id) is int:
         team_id = str(team_id)
 
-    goals_for, _ = getGoals(team_id, season=season, include_pre=include_pre,
-                            include_post=include_post, base_url=base_url)
-
-    # if average/cumulative is requested
-    if average:
-        goals_for = np.cumsum(goals_for)/np.arange(1, goals_for.size+1)
-    elif cumulative:
-        goals_for = np.cumsum(goals_for)
+    series = SeasonSeries(team_id, season=season, include_pre=include_pre,
+                          include_post=include_post, base_url=base_url, games=games)
 
-    return goals_for
+    return series.series('goals_for', average=average, cumulative=cumulative)
 
 
 def goalsAgainst(team_id, season=None, include_pre=False, include_post=False,
-                 average=False, cumulative=False, base_url='https://statsapi.web.nhl.com/api/v1'):
+                 average=False, cumulative=False, base_url='https://statsapi.web.nhl.com/api/v1',
+                 games=None):
     """
     Creates a goals against time series for the given team.
 
@@ -270,6 +757,10 @@ def goalsAgainst(team_id, season=None, include_pre=False, include_post=False,
         base_url : str
             URL to the NHL API base; used only if season is not specified.
 
+        games : GameTable (default: None)
+            Table of games to take the series from (see `getLeagueGames`).
+            If None, the team's schedule is requested.
+
     Returns
     -------
         goals_against : ndarray
@@ -278,20 +769,15 @@ def goalsAgainst(team_id, season=None, include_pre=False, include_post=False,
     if type(team_id) is int:
         team_id = str(team_id)
 
-    _, goals_against = getGoals(team_id, season=season, include_pre=include_pre,
-                                include_post=include_post, base_url=base_url)
-
-    # if average/cumulative is requested
-    if average:
-        goals_against = np.cumsum(goals_against)/np.arange(1, goals_against.size+1)
-    elif cumulative:
-        goals_against = np.cumsum(goals_against)
+    series = SeasonSeries(team_id, season=season, include_pre=include_pre,
+                          include_post=include_post, base_url=base_url, games=games)
 
-    return goals_against
+    return series.series('goals_against', average=average, cumulative=cumulative)
 
 
 def goalDiff(team_id, season=None, include_pre=False, include_post=False,
-             average=False, cumulative=False, base_url='https://statsapi.web.nhl.com/api/v1'):
+             average=False, cumulative=False, base_url='https://statsapi.web.nhl.com/api/v1',
+             games=None):
     """
     Creates a goals against time series for the given team.
 
@@ -320,6 +806,10 @@ def goalDiff(team_id, season=None, include_pre=False, include_post=False,
         base_url : str
             URL to the NHL API base; used only if season is not specified.
 
+        games : GameTable (default: None)
+            Table of games to take the series from (see `getLeagueGames`).
+            If None, the team's schedule is requested.
+
     Returns
     -------
         goal_diff : ndarray
@@ -328,16 +818,7 @@ def goalDiff(team_id, season=None, include_pre=False, include_post=False,
     if type(team_id) is int:
         team_id = str(team_id)
 
-    goals_for, goals_against = getGoals(team_id, season=season, include_pre=include_pre,
-                                        include_post=include_post, base_url=base_url)
-
-    # calculate the goal differential
-    goal_diff = goals_for - goals_against
-
-    # if average/cumulative is requested
-    if average:
-        goal_diff = np.cumsum(goal_diff)/np.arange(1, goal_diff.size+1)
-    elif cumulative:
-        goal_diff = np.cumsum(goal_diff)
+    series = SeasonSeries(team_id, season=season, include_pre=include_pre,
+                          include_post=include_post, base_url=base_url, games=games)
 
-    return goal_diff
+    return series.series('goal_diff', average=average, cumulative=cumulative)
@@ -0,0 +1,13 @@
+# conftest.py
+"""
+The data-collection and data-extraction modules import each other by changing
+into their directories, so the tests run from data-extraction with both (and
+the benchmarks' stand-in API) on the path.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ('data-collection', 'data-extraction', 'benchmarks'):
+    sys.path.insert(0, os.path.join(ROOT, directory))
+os.chdir(os.path.join(ROOT, 'data-extraction'))
@@ -0,0 +1,47 @@
+# test_feed_archive.py
+import os
+
+import pytest
+
+from feed_archive import FeedArchive, FeedWriter, _FOOTER
+
+
+def _feed(game_pk):
+    return {'gamePk': game_pk, 'liveData': {'plays': {'allPlays': [{'about': {'eventIdx': i}}
+                                                                   for i in range(50)]}}}
+
+
+def _write(path, game_pks):
+    with FeedWriter(path, codec='zlib') as writer:
+        for game_pk in game_pks:
+            writer.add(game_pk, _feed(game_pk))
+
+
+def test_interrupted_append(tmp_path):
+    path = str(tmp_path / 'games.feeds')
+    _write(path, range(100, 120))
+    writer = FeedWriter(path)
+    writer.add(120, _feed(120))
+    writer._file.close()
+    writer._file = None
+    # killed halfway through the new block, before the index was rewritten
+    os.truncate(path, os.path.getsize(path) - 20)
+
+    with pytest.raises(ValueError):
+        FeedArchive(path)
+    FeedWriter(path).close()
+    archive = FeedArchive(path)
+    assert sorted(archive.game_pks) == list(range(100, 120))
+    assert all(archive.get(game_pk) == _feed(game_pk) for game_pk in range(100, 120))
+
+
+def test_interrupted_close(tmp_path):
+    path = str(tmp_path / 'games.feeds')
+    _write(path, range(100, 120))
+    # killed after the index was written but before the footer
+    os.truncate(path, os.path.getsize(path) - _FOOTER.size)
+
+    FeedWriter(path).close()
+    archive = FeedArchive(path)
+    assert sorted(archive.game_pks) == list(range(100, 120))
+    assert all(archive.get(game_pk) == _feed(game_pk) for game_pk in range(100, 120))
@@ -0,0 +1,48 @@
+# test_game_state.py
+import json
+
+import numpy as np
+
+from events import _EVENT_CODES, parseEvents
+from game_state import gameStates
+from season_events import SeasonEvents
+
+
+def test_goal_strength_matches_feed():
+    with open('liveData.json') as f:
+        live_data = json.load(f)
+    goals = [play for play in live_data['plays']['allPlays']
+             if play['result']['eventTypeId'] == 'GOAL']
+
+    # 2019020970: TOR (10) at TBL (14)
+    season = SeasonEvents.fromTables([parseEvents(live_data)], [2019020970], [14], [10])
+    states = gameStates(season)
+    at = states.atEvents(season)[season.columns['event'] == _EVENT_CODES['GOAL']]
+    home_goal = season.columns['team_id'][season.columns['event'] == _EVENT_CODES['GOAL']] == 14
+    assert at.size == len(goals)
+
+    # the feed's strength ignores extra attackers
+    home = states.home_skaters[at] - states.home_empty_net[at]
+    away = states.away_skaters[at] - states.away_empty_net[at]
+    scorer, other = np.where(home_goal, home, away), np.where(home_goal, away, home)
+    expected = {'EVEN': 0, 'PPG': 1, 'SHG': -1}
+    for play, difference in zip(goals, np.sign(scorer - other)):
+        assert difference == expected[play['result']['strength']['code']], play['about']
+
+    # the goal is not part of the score it was scored at
+    assert states.home_goals[at].tolist() == np.cumsum(np.r_[0, home_goal[:-1]]).tolist()
+
+
+def test_empty_net_goal_without_faceoffs_or_saves():
+    with open('liveData.json') as f:
+        events = parseEvents(json.load(f)).events
+    goals = events[events['event'] == _EVENT_CODES['GOAL']].copy()
+    goals['empty_net'][-1] = True
+    season = SeasonEvents({name: goals[name] for name in goals.dtype.names}, [0, goals.size],
+                          [2019020970], [14], [10], np.zeros((1, 16), dtype=np.int8))
+    states = gameStates(season)
+    # no faceoff or save to start the spell from: the net was empty all period
+    period = int(goals['period'][-1])
+    goal = (period - 1) * 1200 + int(goals['period_seconds'][-1])
+    empty = states.home_empty_net if goals['team_id'][-1] == 10 else states.away_empty_net
+    assert empty[(period - 1) * 1200:goal].all() and empty.sum() == goal - (period - 1) * 1200
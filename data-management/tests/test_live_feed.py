@@ -0,0 +1,48 @@
+# test_live_feed.py
+import asyncio
+import json
+
+import pytest
+
+from stand_in import StandIn
+from nhlAPI import LiveFeed, _applyPatch, getLiveData
+
+
+def test_stream_game_to_final():
+    with open('liveData.json') as f:
+        plays = json.load(f)['plays']['allPlays']
+
+    async def stream(base_url, game_pk):
+        return [batch async for batch in getLiveData(game_pk, interval=0, base_url=base_url)]
+
+    with StandIn(n_teams=2, games_per_team=1) as api:
+        game_pk = next(iter(api.games))
+        api.goLive(game_pk, played=10, step=100)
+        batches = asyncio.run(stream(api.base_url, game_pk))
+
+        assert [len(batch) for batch in batches] == [10, 100, 100, len(plays) - 210]
+        assert [play for batch in batches for play in batch] == plays
+
+        # a finished game is up to date
+        feed = LiveFeed(game_pk, base_url=api.base_url)
+        asyncio.run(feed.load())
+        assert feed.final and asyncio.run(feed.update()) == []
+
+
+def test_apply_patch():
+    document = {'a': [1, 2], 'b': {'c': 3}}
+    _applyPatch(document, [{'op': 'test', 'path': '/b/c', 'value': 3},
+                           {'op': 'move', 'from': '/b/c', 'path': '/a/0'},
+                           {'op': 'copy', 'from': '/a', 'path': '/d'},
+                           {'op': 'remove', 'path': '/a/2'}])
+    assert document == {'a': [3, 1], 'b': {}, 'd': [3, 1, 2]}
+
+    _applyPatch(document, [{'op': 'replace', 'path': '', 'value': {'e': 1}}])
+    assert document == {'e': 1}
+
+    with pytest.raises(ValueError):
+        _applyPatch(document, [{'op': 'test', 'path': '/e', 'value': 2}])
+    with pytest.raises(ValueError):
+        _applyPatch(document, [{'op': 'merge', 'path': '/e', 'value': 2}])
+    with pytest.raises(ValueError):
+        _applyPatch(document, [{'op': 'remove', 'path': ''}])
@@ -0,0 +1,36 @@
+# test_season_events.py
+import time
+
+import numpy as np
+
+from stand_in import StandIn
+from api_client import getClient
+from nhlAPI import getLeagueSchedule
+from rate_limit import RateLimiter
+from season_events import seasonEvents
+
+
+def test_pool_after_parent_request():
+    # the parent's client holds a keep-alive connection to the API when the
+    # workers are forked; each worker must open its own
+    with StandIn(n_teams=4, games_per_team=6) as api:
+        getLeagueSchedule('20192020', base_url=api.base_url)
+        season = seasonEvents(season='20192020', base_url=api.base_url,
+                              max_workers=4, chunk_size=2)
+        assert season.n_games == len(api.games)
+        assert (season.home_id >= 0).all()
+        reference = season.game(season.game_pk[0]).events
+        for game_pk in season.game_pk[1:]:
+            assert np.array_equal(season.game(game_pk).events['event'], reference['event'])
+
+
+def test_workers_share_the_rate_limit():
+    # 24 games at 10 requests/s in total take over a second, however many
+    # workers fetch them
+    with StandIn(n_teams=4, games_per_team=12) as api:
+        getClient(api.base_url).limiter = RateLimiter(rate=10, max_rate=10)
+        start = time.perf_counter()
+        season = seasonEvents(game_pks=sorted(api.games), base_url=api.base_url,
+                              max_workers=4, chunk_size=2)
+        assert time.perf_counter() - start > 1
+        assert season.n_games == 24 and (season.home_id >= 0).all()
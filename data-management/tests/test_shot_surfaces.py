@@ -0,0 +1,33 @@
+# test_shot_surfaces.py
+import numpy as np
+
+from stand_in import StandIn
+from shot_surfaces import Surfaces, loadSurfaces, updateSurfaces
+from season_events import seasonEvents
+
+
+def test_incremental_update_and_load(tmp_path):
+    cache_dir = str(tmp_path)
+    with StandIn(n_teams=4, games_per_team=6, final_days=3) as api:
+        partial = updateSurfaces('20192020', cache_dir=cache_dir, base_url=api.base_url,
+                                 max_workers=2)
+        assert partial.game_pks.size == 6
+
+    with StandIn(n_teams=4, games_per_team=6) as api:
+        before = api.requests
+        updated = updateSurfaces('2019-2020', cache_dir=cache_dir, base_url=api.base_url,
+                                 max_workers=2)
+        # the schedule, and the feeds of the six new games only
+        assert api.requests - before == 7
+        assert updated.game_pks.size == 12
+        full = Surfaces.fromEvents(seasonEvents(game_pks=sorted(api.games), base_url=api.base_url,
+                                                max_workers=1))
+
+    for name in ('team_keys', 'team_counts', 'player_keys', 'player_counts'):
+        assert np.array_equal(getattr(updated, name), getattr(full, name))
+
+    loaded, missing = loadSurfaces(range(2018, 2020), cache_dir=cache_dir)
+    assert missing == [20182019]
+    assert sorted(loaded.game_pks) == sorted(full.game_pks)
+    assert loaded.league('goals').sum() == full.league('goals').sum() > 0
+    assert np.isclose(loaded.league('goals', sigma=4).sum(), full.league('goals').sum())